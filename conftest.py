@@ -1,5 +1,10 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
 from django.contrib.auth.models import User
 
 from gameapp.models import Game, ExchangeOffer
@@ -7,6 +12,26 @@ from gameapp.models import Game, ExchangeOffer
 User = get_user_model()
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """ Starts every test with empty caches. """
+    for alias in caches:
+        caches[alias].clear()
+    yield
+    for alias in caches:
+        caches[alias].clear()
+
+
+@pytest.fixture
+def shared_auth_cache(settings, tmp_path):
+    """ Points the cache of sessions and users at a file-based cache, which the workers share like Redis,
+    turning the authentication fast path on. Returns its location. """
+    location = str(tmp_path / "auth-cache")
+    settings.CACHES = {**settings.CACHES, settings.SESSION_CACHE_ALIAS: {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+    return location
+
+
 @pytest.fixture
 def user(client):
     """Create a test user and log them in."""
@@ -21,3 +46,41 @@ def exchange_offer(user):
     game = Game.objects.create(name="Game 1", description="text")
     offer = ExchangeOffer.objects.create(owner=user, offer_type='S', game=game, price=10.0, description='text')
     return offer
+
+
+class FakeMailchimpHandler(BaseHTTPRequestHandler):
+    """ Answers Mailchimp batch-members requests, rejecting addresses listed in server.rejected. """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append((self.path, body))
+        emails = [member['email_address'] for member in body['members']]
+        response = {
+            'new_members': [{'email_address': email} for email in emails if email not in self.server.rejected],
+            'errors': [{'email_address': email, 'error': 'Invalid address', 'error_code': 'ERROR_GENERIC'}
+                       for email in emails if email in self.server.rejected],
+        }
+        payload = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def fake_mailchimp(settings):
+    """ Runs a local fake Mailchimp API and points the Mailchimp settings at it. """
+    server = HTTPServer(('127.0.0.1', 0), FakeMailchimpHandler)
+    server.requests = []
+    server.rejected = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings.MAILCHIMP_HOST = f"http://127.0.0.1:{server.server_port}/3.0"
+    settings.MAILCHIMP_EMAIL_LIST_ID = "list123"
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,130 @@
+"""
+Read-only JSON API over the market offers, games, articles and game prices.
+
+Responses are compact (short flat records, no whitespace) and cursor-paginated like the market page. Every
+response carries a strong ETag read from the database, so every worker gives the same ETag for the same data
+and a client polling with If-None-Match gets an empty 304 while nothing changed. Offers and price statistics
+have a version stamp (ExchangeOffer.modified, GamePriceStats.updated): their ETag hashes the ids and stamps of
+the listed rows, read with a cheap query, and a 304 is answered before the records are loaded and serialized.
+Games and articles have none, so their ETag hashes the response content. There is no Last-Modified: a list
+also changes when an offer leaves it, which moves no date.
+"""
+import hashlib
+
+from django.db.models import F
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.views import View
+
+from gameapp.models import ExchangeOffer, Game, Article, GamePriceStats
+from gameapp.pagination import KeysetPaginator, InvalidCursor
+from gameapp.views import MarketFilterMixin
+
+
+def version_etag(versions):
+    """ Returns a strong ETag of the version stamps of the rows a response lists. """
+    return quote_etag(hashlib.sha1(repr(versions).encode()).hexdigest())
+
+
+def conditional_json(request, payload, etag=None):
+    """ Returns the payload as compact JSON with the given ETag, or a strong ETag of its content, or a 304 Not
+    Modified when the ETag matches the If-None-Match of the request. """
+    response = JsonResponse(payload, json_dumps_params={'separators': (',', ':')})
+    response['ETag'] = etag or quote_etag(hashlib.sha1(response.content).hexdigest())
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+class ApiListView(View):
+    """
+    Base class for the API list endpoints, returning one cursor-paginated page of `values` records.
+
+    A subclass whose records have a version stamp returns the rows they are read from in get_versioned_queryset
+    and names the stamp in `version_field`: the page of their ids and stamps then gives the ETag.
+    """
+    page_size = 50
+    ordering = ('-added', '-id')
+    version_field = None
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def get_versioned_queryset(self):
+        raise NotImplementedError
+
+    def get_ordering(self):
+        return self.ordering
+
+    def paginate(self, queryset):
+        paginator = KeysetPaginator(queryset, self.page_size, ordering=self.get_ordering())
+        return paginator.page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+
+    def get(self, request):
+        etag = None
+        try:
+            if self.version_field:
+                # the same page of the keys and stamps alone, the cursors included
+                fields = {field.lstrip('-') for field in self.get_ordering()} | {'id', self.version_field}
+                versions = self.paginate(self.get_versioned_queryset().values(*sorted(fields)))
+                etag = version_etag((versions.object_list, versions.next_cursor, versions.previous_cursor))
+                not_modified = get_conditional_response(request, etag=etag)
+                if not_modified is not None:
+                    return not_modified
+            page = self.paginate(self.get_queryset())
+        except InvalidCursor:
+            return JsonResponse({'error': "Invalid cursor."}, status=400)
+        return conditional_json(request, {
+            'results': page.object_list,
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        }, etag)
+
+
+class OfferApiView(MarketFilterMixin, ApiListView):
+    """ Lists the active exchange offers with the filters and sort orders of the market page. """
+    # moved on every save of the offer and on renames of its owner and game
+    version_field = 'modified'
+
+    def get_ordering(self):
+        return self.market_ordering()
+
+    def get_versioned_queryset(self):
+        return self.filter_offers(ExchangeOffer.objects.all())
+
+    def get_queryset(self):
+        return self.get_versioned_queryset().values(
+            'id', 'offer_type', 'price', 'description', 'added',
+            game_name=F('game__name'), owner_name=F('owner__username'))
+
+
+class GameApiView(ApiListView):
+    """ Lists the games by name with the number of their active offers. """
+    ordering = ('name', 'id')
+
+    def get_queryset(self):
+        return Game.objects.values('id', 'name', 'description', active_offers=F('market_stats__active_offers'))
+
+
+class ArticleApiView(ApiListView):
+    """ Lists the articles, newest first, without their content. """
+    ordering = ('-added', '-slug')
+
+    def get_queryset(self):
+        return Article.objects.values('slug', 'title', 'summary', 'added', game_name=F('game__name'))
+
+
+class GamePriceApiView(View):
+    """ Returns the price statistics of a game, optionally of one offer type (`?offer_type=S`). """
+
+    def get(self, request, game_id):
+        if not Game.objects.filter(id=game_id).exists():
+            return JsonResponse({'error': "Unknown game."}, status=404)
+        stats = GamePriceStats.of_game(game_id, request.GET.get('offer_type'))
+        # every recorded price moves `updated`
+        etag = version_etag(list(stats.values_list('id', 'updated')))
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        return conditional_json(request, {
+            'game': game_id,
+            'results': [row.summary() for row in stats],
+        }, etag)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class GameappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gameapp'
+
+    def ready(self):
+        # connects the signal handlers and registers the checks
+        from gameapp import auth, signals  # noqa: F401
@@ -0,0 +1,66 @@
+"""
+Moving closed exchange offers and their customer offers out of the hot tables, used by the `archive_offers`
+command.
+
+The market and user page queries read ExchangeOffer and CustomerOffer, which would otherwise keep every
+offer ever closed. Offers closed (last changed) before the cutoff are copied with their customer offers into
+ArchivedExchangeOffer and ArchivedCustomerOffer, keeping their ids, and deleted from the hot tables. Each
+batch is one transaction, so an interrupted run loses nothing and the next run resumes with the offers that
+are still left.
+
+The offers are deleted without the per-offer post_delete handlers of gameapp.signals, so what they would do is
+done once per batch instead: the search documents of the batch are removed together and the cached main page
+is dropped after the commit.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from gameapp import search
+from gameapp.cache import invalidate
+from gameapp.catalogue import chunks
+from gameapp.models import ExchangeOffer, CustomerOffer, ArchivedExchangeOffer, ArchivedCustomerOffer
+
+
+def archive_batch(cutoff, batch_size):
+    """ Archives up to `batch_size` offers closed before the cutoff, returning (offers, customer offers). """
+    with transaction.atomic():
+        offers = list(ExchangeOffer.objects.select_for_update().filter(status=False, modified__lt=cutoff)
+                      .order_by('modified', 'id')[:batch_size])
+        if not offers:
+            return 0, 0
+        ids = [offer.id for offer in offers]
+        ArchivedExchangeOffer.objects.bulk_create([ArchivedExchangeOffer.from_offer(offer) for offer in offers])
+
+        bids = 0
+        for chunk in chunks(CustomerOffer.objects.filter(exchange_offer_id__in=ids).iterator(chunk_size=batch_size),
+                            batch_size):
+            ArchivedCustomerOffer.objects.bulk_create([ArchivedCustomerOffer.from_offer(bid) for bid in chunk])
+            bids += len(chunk)
+
+        # customer offers have no dependents or signal handlers, so Django deletes them with one DELETE
+        CustomerOffer.objects.filter(exchange_offer_id__in=ids).delete()
+        # QuerySet.delete() would send post_delete, and so remove the search document and drop the main page,
+        # once per offer
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(ExchangeOffer._meta.db_table)} "
+                           f"WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+        search.remove_documents([('offer', str(offer_id)) for offer_id in ids])
+        transaction.on_commit(lambda: invalidate('main_page'))
+    return len(offers), bids
+
+
+def archive_offers(days, batch_size=1000, log=None):
+    """ Archives every offer closed more than `days` days ago in batches, returning (offers, customer offers). """
+    cutoff = timezone.now() - timedelta(days=days)
+    log = log or (lambda message: None)
+    total_offers = total_bids = 0
+    while True:
+        offers, bids = archive_batch(cutoff, batch_size)
+        if not offers:
+            break
+        total_offers += offers
+        total_bids += bids
+        log(f"Archived {total_offers} offers and {total_bids} customer offers")
+    return total_offers, total_bids
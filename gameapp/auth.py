@@ -0,0 +1,103 @@
+"""
+A cached lookup of the logged-in user of a request, used by CachedAuthenticationMiddleware.
+
+Sessions are kept in the same bounded cache by the gameapp.sessions backend (SESSION_CACHE_ALIAS), so a
+logged-in request usually runs no query before its view. Users are cached under a versioned key: forget_user
+moves a user to a new version on every save or delete and on logout, so a lookup that was already reading the
+old row can never store it under the new key. A cached user is still checked against the password hash stored
+in the session, like django.contrib.auth.get_user does.
+
+Logouts and user changes are only seen by every worker when they share the cache, so the fast path is off for a
+process-local cache (LocMemCache): sessions then stay in the database and users are read with the stock get_user.
+"""
+import time
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.checks import Tags, Warning, register
+from django.utils.crypto import constant_time_compare
+
+from gameapp.cache import is_shared
+
+CACHED_SESSION_ENGINES = ('django.contrib.sessions.backends.cache', 'django.contrib.sessions.backends.cached_db')
+
+
+def auth_cache():
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def fast_path_enabled():
+    """ Returns whether sessions and users are cached, which needs a SESSION_CACHE_ALIAS shared by the workers. """
+    return is_shared(auth_cache())
+
+
+def version_key(user_id):
+    return f"auth-user:{user_id}:version"
+
+
+def user_key(user_id):
+    """ Returns the key of the current version of a cached user, starting the version from the clock. """
+    cache = auth_cache()
+    version = cache.get(version_key(user_id))
+    if version is None:
+        cache.add(version_key(user_id), time.time_ns(), None)
+        version = cache.get(version_key(user_id))
+    return f"auth-user:{user_id}:{version}"
+
+
+def forget_user(user_id):
+    """ Moves a user to a new version, so the next request reads it from the database again. """
+    if not fast_path_enabled():
+        return
+    cache = auth_cache()
+    try:
+        cache.incr(version_key(user_id))
+    except ValueError:
+        cache.set(version_key(user_id), time.time_ns(), None)
+
+
+def get_user(request):
+    """
+    Returns the user of the request's session, from the cache when it holds the current version of the user.
+
+    Misses, and cached users whose password no longer matches the session, go through
+    django.contrib.auth.get_user, which flushes the session of a changed password.
+    """
+    if not fast_path_enabled():
+        return auth.get_user(request)
+    try:
+        user_id = str(request.session[SESSION_KEY])
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+
+    cache = auth_cache()
+    key = user_key(user_id)
+    user = cache.get(key)
+    if user is not None:
+        session_hash = request.session.get(HASH_SESSION_KEY)
+        if session_hash and constant_time_compare(session_hash, user.get_session_auth_hash()):
+            return user
+
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+@register(Tags.security, Tags.caches)
+def check_session_cache(app_configs, **kwargs):
+    """ Warns about sessions cached in a process-local cache, where other workers keep logged-out sessions. """
+    if settings.SESSION_ENGINE in CACHED_SESSION_ENGINES and not is_shared(auth_cache()):
+        return [Warning(
+            f"{settings.SESSION_ENGINE} keeps sessions in the process-local cache {settings.SESSION_CACHE_ALIAS!r}, "
+            "so a logout only ends the session in the worker that handled it.",
+            hint="Use gameapp.sessions as SESSION_ENGINE, or point SESSION_CACHE_ALIAS at a shared cache.",
+            id='gameapp.W001',
+        )]
+    return []
@@ -0,0 +1,515 @@
+"""
+Benchmarks run by the `benchmark` management command.
+
+A benchmark is a function registered with @benchmark. It takes the requested scale (number of rows or
+operations) and returns a dict of measurements. Unless registered with rollback=False, it runs in a
+transaction that is rolled back afterwards, so benchmarks leave the database as they found it.
+"""
+import itertools
+import random
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import cache
+from django.db import connection, connections, reset_queries
+from django.http import HttpResponse
+from django.urls import URLPattern, get_resolver, reverse
+from django.conf import settings
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from gameapp import search, seeding
+from gameapp.auth import auth_cache, fast_path_enabled, forget_user
+from gameapp.cache import invalidate
+from gameapp.models import Game, Article, ExchangeOffer, CustomerOffer, GameMarketStats, SearchDocument, \
+    SearchPosting
+from gameapp.middleware import CachedAuthenticationMiddleware
+from gameapp.offers import accept_offer
+
+BENCHMARKS = {}
+
+
+def benchmark(name, scale, rollback=True):
+    """ Registers a benchmark under the name with its default scale. """
+    def register(function):
+        BENCHMARKS[name] = {'function': function, 'scale': scale, 'rollback': rollback}
+        return function
+    return register
+
+
+class Timer:
+    """ Measures the wall time of a block in milliseconds. """
+    elapsed = 0.0
+
+
+@contextmanager
+def timer():
+    """ Times the enclosed block, the result is available as `.elapsed` (ms) after it exits. """
+    result = Timer()
+    started = time.perf_counter()
+    yield result
+    result.elapsed = (time.perf_counter() - started) * 1000
+
+
+def percentile(samples, fraction):
+    """ Returns the given percentile (0-1) of the samples by the nearest-rank method. """
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def count_queries(function, *args, **kwargs):
+    """ Calls the function and returns the number of queries it ran. """
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        function(*args, **kwargs)
+    return len(queries.captured_queries)
+
+
+def run_concurrently(function, threads, calls):
+    """ Calls the function `calls` times from each of `threads` threads at once, returning the latencies (ms). """
+    samples = []
+    start = threading.Barrier(threads)
+
+    def worker():
+        start.wait()
+        try:
+            for _ in range(calls):
+                with timer() as elapsed:
+                    function()
+                samples.append(elapsed.elapsed)
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return samples
+
+
+def anonymous_get(path):
+    """ Builds an anonymous GET request for calling a view directly. """
+    request = RequestFactory().get(path)
+    request.user = AnonymousUser()
+    return request
+
+
+def benchmark_user(username="benchmark"):
+    """ Returns a user to own the rows created by a benchmark. """
+    user, _ = User.objects.get_or_create(username=username, defaults={'email': f"{username}@example.com"})
+    return user
+
+
+def benchmark_game(name="Benchmark Game"):
+    """ Returns a game to attach the rows created by a benchmark to. """
+    game, _ = Game.objects.get_or_create(name=name, defaults={'description': "Benchmark"})
+    return game
+
+
+@benchmark('article_slugs', scale=10000)
+def article_slugs(scale):
+    """ Inserts `scale` articles sharing one title, checking the cost of a slug stays flat. """
+    game = benchmark_game()
+    samples = []
+    with timer() as total:
+        for i in range(scale):
+            with timer() as insert:
+                Article.objects.create(game=game, title="Patch Notes", summary="summary", content="content")
+            samples.append(insert.elapsed)
+
+    queries = count_queries(Article.objects.create, game=game, title="Patch Notes", summary="summary",
+                            content="content")
+
+    tenth = max(1, scale // 10)
+    return {
+        'articles': scale,
+        'total_s': round(total.elapsed / 1000, 2),
+        'first_10pct_mean_ms': round(sum(samples[:tenth]) / tenth, 3),
+        'last_10pct_mean_ms': round(sum(samples[-tenth:]) / tenth, 3),
+        'p95_ms': round(percentile(samples, 0.95), 3),
+        'queries_per_insert': queries,
+    }
+
+
+@benchmark('search', scale=1000000)
+def search_latency(scale, queries=100, terms_per_document=30, vocabulary=50000):
+    """
+    Fills the search index with `scale` synthetic documents and measures the latency of ranked queries.
+
+    `queries` queries are run from each mix of terms: drawn with the documents' own Zipf popularity, only from
+    the 100 most frequent terms (the common-term path), mid-frequency, uniform over the vocabulary, and one top
+    term with a rare one.
+    """
+    rng = random.Random(7)
+    words = [f"w{i}" for i in range(vocabulary)]
+    # Zipf-like term popularity, as in natural text
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(vocabulary)))
+
+    # the documents point at offer ids that do not exist, so the measurement covers the ranking only
+    with timer() as build:
+        for start in range(0, scale, 10000):
+            documents = SearchDocument.objects.bulk_create(
+                SearchDocument(kind='offer', object_key=str(10 ** 12 + i), length=terms_per_document)
+                for i in range(start, min(start + 10000, scale)))
+            SearchPosting.objects.bulk_create(
+                (SearchPosting(term=term, document=document, frequency=1)
+                 for document in documents
+                 for term in set(rng.choices(words, cum_weights=weights, k=terms_per_document))),
+                batch_size=10000)
+
+    mixes = {
+        'zipf': lambda: rng.choices(words, cum_weights=weights, k=rng.randint(1, 3)),
+        'top': lambda: rng.sample(words[:100], rng.randint(1, 3)),
+        'mid': lambda: rng.choices(words[100:5000], k=rng.randint(1, 3)),
+        'uniform': lambda: rng.choices(words, k=rng.randint(1, 3)),
+        'top_and_rare': lambda: [rng.choice(words[:10]), rng.choice(words[5000:])],
+    }
+    cache.delete(search.STATS_CACHE_KEY)
+    results = {'documents': scale, 'build_s': round(build.elapsed / 1000, 2), 'queries': queries}
+    for name, terms in mixes.items():
+        samples = []
+        for _ in range(queries):
+            query = " ".join(terms())
+            with timer() as elapsed:
+                search.search(query)
+            samples.append(elapsed.elapsed)
+        results[f'{name}_p50_ms'] = round(percentile(samples, 0.5), 2)
+        results[f'{name}_p95_ms'] = round(percentile(samples, 0.95), 2)
+    cache.delete(search.STATS_CACHE_KEY)
+    return results
+
+
+@benchmark('main_page', scale=50, rollback=False)
+def main_page(scale, threads=16):
+    """ Compares cold (just invalidated) and warm hits of the main page under concurrent load. """
+    from gameapp.views import MainView
+
+    view = MainView.as_view()
+    builds = []
+    latest = MainView.latest
+
+    def counted_latest():
+        builds.append(1)
+        return latest()
+
+    cold, warm = [], []
+    with mock.patch.object(MainView, 'latest', staticmethod(counted_latest)):
+        for _ in range(scale):
+            invalidate(MainView.cache_name)
+            cold += run_concurrently(lambda: view(anonymous_get('/')), threads, 1)
+            warm += run_concurrently(lambda: view(anonymous_get('/')), threads, 1)
+
+    return {
+        'rounds': scale,
+        'threads': threads,
+        'cold_p50_ms': round(percentile(cold, 0.5), 2),
+        'cold_p95_ms': round(percentile(cold, 0.95), 2),
+        'warm_p50_ms': round(percentile(warm, 0.5), 2),
+        'warm_p95_ms': round(percentile(warm, 0.95), 2),
+        'recomputes_per_cold_round': round(len(builds) / scale, 2),
+    }
+
+
+@benchmark('offer_acceptance', scale=5000)
+def offer_acceptance(scale, listings=5):
+    """ Accepts a bid on listings with `scale` bids each, measuring the latency and queries of an acceptance. """
+    owner = benchmark_user()
+    game = benchmark_game()
+    customers = User.objects.bulk_create(
+        User(username=f"benchmark-bidder-{i}", email=f"bidder{i}@example.com") for i in range(scale))
+
+    samples, queries = [], []
+    for _ in range(listings):
+        offer = ExchangeOffer.objects.create(owner=owner, offer_type="S", game=game, price=1, description="Benchmark")
+        GameMarketStats.offer_opened(offer)
+        bids = CustomerOffer.objects.bulk_create(
+            (CustomerOffer(exchange_offer=offer, customer=customer, game_name=game, description="Benchmark")
+             for customer in customers), batch_size=5000)
+        reset_queries()
+        with CaptureQueriesContext(connection) as captured, timer() as elapsed:
+            accept_offer(offer.id, owner.id, bids[scale // 2].id)
+        samples.append(elapsed.elapsed)
+        queries.append(len(captured.captured_queries))
+
+    return {
+        'bids_per_listing': scale,
+        'listings': listings,
+        'p50_ms': round(percentile(samples, 0.5), 2),
+        'max_ms': round(max(samples), 2),
+        'queries_per_acceptance': max(queries),
+    }
+
+
+@benchmark('market_api', scale=1000)
+def market_api(scale, polls=100):
+    """ Compares the bytes and latency of polling the market HTML page, the offers API and a 304 API poll. """
+    from gameapp.api import OfferApiView
+    from gameapp.views import MarketListView
+
+    owner = benchmark_user()
+    game = benchmark_game()
+    offers = ExchangeOffer.objects.bulk_create(
+        ExchangeOffer(owner=owner, offer_type="S", game=game, price=i, description=f"Benchmark offer {i}")
+        for i in range(scale))
+
+    html = MarketListView.as_view()
+    api = OfferApiView.as_view()
+    etag = api(anonymous_get('/api/offers/'))['ETag']
+
+    def conditional_get():
+        request = anonymous_get('/api/offers/')
+        request.META['HTTP_IF_NONE_MATCH'] = etag
+        return request
+
+    results = {'offers': len(offers), 'html_page_size': MarketListView.paginate_by,
+               'api_page_size': OfferApiView.page_size}
+    for name, view, build in [('html', html, lambda: anonymous_get('/market/')),
+                              ('api', api, lambda: anonymous_get('/api/offers/')),
+                              ('api_304', api, conditional_get)]:
+        samples = []
+        for _ in range(polls):
+            request = build()
+            with timer() as elapsed:
+                response = view(request)
+                if hasattr(response, 'render'):
+                    response.render()
+            samples.append(elapsed.elapsed)
+        results[f'{name}_status'] = response.status_code
+        results[f'{name}_bytes'] = len(response.content)
+        results[f'{name}_p50_ms'] = round(percentile(samples, 0.5), 2)
+    return results
+
+
+@benchmark('matching', scale=1000000)
+def matching(scale, offers=300):
+    """
+    Seeds `scale` active offers (scale / 100 games, popularity skewed) and measures matching `offers` new Sell,
+    Buy and Exchange offers against them, with the notifications of the matches.
+    """
+    from gameapp.matching import match_offer
+
+    with timer() as seeding_time:
+        seeding.seed(users=max(10, scale // 20), games=max(10, scale // 100), articles=0, offers=scale,
+                     customer_offers=0, notifications=0, inactive_share=0, index=False)
+    rng = random.Random(3)
+    game_ids = list(Game.objects.filter(name__startswith="Seed game ").order_by('id').values_list('id', flat=True))
+    weights = seeding.popularity(len(game_ids), 1.0)
+    owner = benchmark_user()
+
+    samples = {offer_type: [] for offer_type in "SBE"}
+    queries, found = [], {'price_matches': 0, 'cycles': 0}
+    for i in range(offers):
+        offer_type = "SBE"[i % 3]
+        game_id, wanted_game_id = rng.choices(game_ids, cum_weights=weights, k=2)
+        offer = ExchangeOffer.objects.create(
+            owner=owner, offer_type=offer_type, game_id=game_id, description="Benchmark",
+            price=None if offer_type == "E" else rng.randint(5, 80),
+            wanted_game_id=wanted_game_id if offer_type == "E" else None)
+        reset_queries()
+        with CaptureQueriesContext(connection) as captured, timer() as elapsed:
+            matches, cycles = match_offer(offer)
+        samples[offer_type].append(elapsed.elapsed)
+        queries.append(len(captured.captured_queries))
+        found['price_matches'] += len(matches)
+        found['cycles'] += len(cycles)
+
+    return {
+        'active_offers': scale,
+        'seed_s': round(seeding_time.elapsed / 1000, 2),
+        'new_offers': offers,
+        **{f'{name}_p{round(fraction * 100)}_ms': round(percentile(samples[offer_type], fraction), 2)
+           for offer_type, name in (("S", 'sell'), ("B", 'buy'), ("E", 'exchange')) for fraction in (0.5, 0.95)},
+        'max_queries_per_offer': max(queries),
+        **found,
+    }
+
+
+MARKET_FILTERS = {
+    'newest': {},
+    'newest_game_type': {'offer_type': "S"},
+    'newest_price_range': {'min_price': "20", 'max_price': "40"},
+    'cheapest': {'sort': "price"},
+    'cheapest_type_range': {'offer_type': "B", 'min_price': "20", 'max_price': "40", 'sort': "price"},
+    'most_expensive_game': {'sort': "-price"},
+    'most_expensive_game_type': {'offer_type': "S", 'sort': "-price"},
+}
+
+
+@benchmark('market_filters', scale=200000)
+def market_filters(scale, steps=4, requests=50):
+    """
+    Grows the offer table to `scale` offers in `steps` equal seeding runs and measures the market page with
+    each filter and sort combination after every run. Combinations named with `game` are narrowed to the most
+    popular seeded game. Each run adds only 10 games, so the game list of the page stays the same size.
+    """
+    client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost')
+    results = {}
+    for step in range(1, steps + 1):
+        seeding.seed(users=max(10, scale // (20 * steps)), games=10, articles=0,
+                     offers=scale // steps, customer_offers=0, notifications=0, random_seed=step, index=False)
+        game = Game.objects.filter(name__startswith="Seed game ").order_by('id').values_list('name', flat=True)[0]
+        active = ExchangeOffer.objects.filter(status=True).count()
+        for name, params in MARKET_FILTERS.items():
+            params = {**params, 'game': game} if 'game' in name else params
+            measured = measure_url(client, f"{reverse('market')}?{urlencode(params)}", requests)
+            results.setdefault(name, {})[active] = measured['p95_ms']
+    return {
+        'p95_ms_by_active_offers': results,
+        'p95_growth': {name: round(max(p95s.values()) / max(min(p95s.values()), 0.01), 2)
+                       for name, p95s in results.items()},
+    }
+
+
+# URLs the views benchmark leaves out: logging out ends its session, the notification stream never ends
+SKIPPED_URLS = {'logout', 'notification_stream'}
+
+
+def has_get(pattern):
+    view_class = getattr(pattern.callback, 'view_class', None)
+    return view_class is None or hasattr(view_class, 'get')
+
+
+def view_urls(kwargs):
+    """ Returns (name, path) pairs for every named GET URL of the project, plus common query variants. """
+    urls = []
+    for pattern in get_resolver().url_patterns:
+        if (isinstance(pattern, URLPattern) and pattern.name and pattern.name not in SKIPPED_URLS
+                and has_get(pattern)):
+            params = {name: kwargs[name] for name in pattern.pattern.converters}
+            urls.append((pattern.name, reverse(pattern.name, kwargs=params)))
+    game = kwargs['game']
+    urls += [
+        ('market?game', f"{reverse('market')}?game={game}"),
+        ('api_offers?game', f"{reverse('api_offers')}?game={game}"),
+        ('search?q', f"{reverse('search')}?q=rare+boxed+edition"),
+    ]
+    return urls
+
+
+def measure_url(client, path, requests):
+    """ Requests the path after a warm-up request, returning its latency percentiles and query count. """
+    client.get(path)
+    samples = []
+    for _ in range(requests):
+        with timer() as elapsed:
+            response = client.get(path)
+        samples.append(elapsed.elapsed)
+    # the query log is reset when a request starts
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        client.get(path)
+    return {
+        'status': response.status_code,
+        'p50_ms': round(percentile(samples, 0.5), 2),
+        'p95_ms': round(percentile(samples, 0.95), 2),
+        'queries': len(queries.captured_queries),
+    }
+
+
+@benchmark('views', scale=1000000)
+def views(scale, requests=20):
+    """
+    Seeds `scale` offers with proportional volumes (scale / 10 games, 5 * scale customer offers,
+    10 * scale notifications) and measures every URL of the project as a logged-in user.
+    """
+    with timer() as seeding_time:
+        rows = seeding.seed(users=max(10, scale // 20), games=max(10, scale // 10), articles=max(10, scale // 100),
+                            offers=scale, customer_offers=5 * scale, notifications=10 * scale)
+
+    offer = ExchangeOffer.objects.select_related('owner', 'game').filter(status=True).order_by('id').first()
+    user = offer.owner
+    # the add game and add article pages need the permissions
+    User.objects.filter(id=user.id).update(is_superuser=True)
+    client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost')
+    client.force_login(user)
+
+    kwargs = {'user_id': user.id, 'offer_id': offer.id, 'game': offer.game.name, 'game_id': offer.game_id,
+              'slug': Article.objects.order_by('added').values_list('slug', flat=True).first()}
+    return {
+        'seed_s': round(seeding_time.elapsed / 1000, 2),
+        'rows': {table: count for table, (count, _) in rows.items() if count},
+        'urls': {name: measure_url(client, path, requests) for name, path in view_urls(kwargs)},
+    }
+
+
+AUTHENTICATION_PATHS = {
+    'database': ('django.contrib.sessions.backends.db', AuthenticationMiddleware),
+    'cached': ('gameapp.sessions', CachedAuthenticationMiddleware),
+}
+
+
+@contextmanager
+def shared_auth_cache():
+    """ Yields the name of the cache backend of SESSION_CACHE_ALIAS, replacing a process-local one by a temporary
+    file-based cache for the block, so that the fast path of gameapp.auth is on. """
+    if fast_path_enabled():
+        yield type(auth_cache()).__name__
+        return
+    alias = settings.SESSION_CACHE_ALIAS
+    with tempfile.TemporaryDirectory() as location, override_settings(CACHES={**settings.CACHES, alias: {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+            'OPTIONS': settings.CACHES[alias].get('OPTIONS', {})}}):
+        yield type(auth_cache()).__name__
+
+
+@benchmark('authentication', scale=1000)
+def authentication(scale, rounds=2):
+    """
+    Measures the per-request cost of loading the session and the user of `scale` logged-in users through the
+    session and authentication middleware, with the database session backend and AuthenticationMiddleware and
+    with the cached fast path. Every session is requested once from cold caches, then `rounds` times warm.
+
+    The fast path needs a shared cache: a process-local SESSION_CACHE_ALIAS is replaced by a file-based cache,
+    reported as `cache_backend`.
+    """
+    password = make_password("benchmark")
+    users = User.objects.bulk_create(User(username=f"Auth benchmark {i}", password=password) for i in range(scale))
+    factory = RequestFactory()
+
+    results = {'sessions': scale, 'warm_rounds': rounds}
+    for name, (engine, middleware) in AUTHENTICATION_PATHS.items():
+        with ExitStack() as stack:
+            if name == 'cached':
+                results['cache_backend'] = stack.enter_context(shared_auth_cache())
+            with override_settings(SESSION_ENGINE=engine):
+                handler = SessionMiddleware(middleware(lambda request: HttpResponse(request.user.username)))
+            session_keys = []
+            for user in users:
+                session = handler.SessionStore()
+                session.update({SESSION_KEY: str(user.pk), BACKEND_SESSION_KEY: settings.AUTHENTICATION_BACKENDS[0],
+                                HASH_SESSION_KEY: user.get_session_auth_hash()})
+                session.create()
+                session_keys.append(session.session_key)
+
+            for phase, count in (('cold', scale), ('warm', rounds * scale)):
+                samples = []
+                reset_queries()
+                with CaptureQueriesContext(connection) as queries:
+                    for i in range(count):
+                        request = factory.get('/')
+                        request.COOKIES[settings.SESSION_COOKIE_NAME] = session_keys[i % scale]
+                        with timer() as elapsed:
+                            handler(request)
+                        samples.append(elapsed.elapsed)
+                results[f'{name}_{phase}_p50_ms'] = round(percentile(samples, 0.5), 3)
+                results[f'{name}_{phase}_p95_ms'] = round(percentile(samples, 0.95), 3)
+                results[f'{name}_{phase}_request_queries'] = round(len(queries.captured_queries) / count, 2)
+
+            for session_key in session_keys:
+                handler.SessionStore(session_key).delete()
+            for user in users:
+                forget_user(user.pk)
+    return results
@@ -0,0 +1,104 @@
+"""
+Helpers for caching computed payloads that are invalidated by writes.
+
+Each payload lives under a versioned key; invalidating it just bumps the version, so a recompute that was
+already running when the data changed can never store its stale result under the new key. Template
+fragments are cached under version stamps of the objects they show instead, see get_or_render_many.
+
+An invalidation only reaches the other workers through a shared cache (e.g. Redis). With a process-local
+cache the versions expire after LOCAL_CACHE_VERSION_TIMEOUT instead, so every worker serves a payload at most
+that much older than the last write.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.safestring import mark_safe
+
+from gameapp.metrics import fragment_cache
+
+MISSING = object()
+
+# cache backends whose entries are not seen by the other worker processes
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def is_shared(cache):
+    return not isinstance(cache, PROCESS_LOCAL_CACHES)
+
+
+def version_timeout():
+    """ Returns how long versions are kept: for good in a shared cache, briefly in a process-local one. """
+    return None if is_shared(cache) else settings.LOCAL_CACHE_VERSION_TIMEOUT
+
+
+def version_key(name):
+    return f"{name}:version"
+
+
+def current_version(name):
+    """ Returns the current version of a payload, starting it from the clock when the cache has none. """
+    version = cache.get(version_key(name))
+    if version is None:
+        cache.add(version_key(name), time.time_ns(), version_timeout())
+        version = cache.get(version_key(name))
+    return version
+
+
+def invalidate(name):
+    """ Moves a payload to a new version, so the next read recomputes it. """
+    try:
+        cache.incr(version_key(name))
+    except ValueError:
+        cache.set(version_key(name), time.time_ns(), version_timeout())
+
+
+def get_or_build(name, build, timeout=None, lock_timeout=10, poll_interval=0.01):
+    """
+    Returns the cached payload, calling build() to compute it on a miss.
+
+    Concurrent misses are collapsed: the first caller takes a lock in the cache and computes the payload,
+    the others poll for the result for up to lock_timeout seconds before computing it themselves.
+    """
+    timeout = settings.PAYLOAD_CACHE_TIMEOUT if timeout is None else timeout
+    key = f"{name}:{current_version(name)}"
+    value = cache.get(key, MISSING)
+    if value is not MISSING:
+        return value
+
+    lock_key = f"{key}:lock"
+    deadline = time.monotonic() + lock_timeout
+    while not cache.add(lock_key, 1, lock_timeout):
+        time.sleep(poll_interval)
+        value = cache.get(key, MISSING)
+        if value is not MISSING:
+            return value
+        if time.monotonic() > deadline:
+            return build()
+
+    try:
+        value = build()
+        cache.set(key, value, timeout)
+    finally:
+        cache.delete(lock_key)
+    return value
+
+
+def get_or_render_many(fragment, items, render, timeout=None):
+    """
+    Returns the HTML fragments of the items, given as (version stamp, object) pairs, in their order.
+
+    Every fragment is cached under its name and stamp, so a new stamp renders it again. All of them are read
+    with one get_many, only the missing ones are rendered with render(object) and they are stored with one
+    set_many. Hits and misses are counted in gameapp.metrics.
+    """
+    timeout = settings.FRAGMENT_CACHE_TIMEOUT if timeout is None else timeout
+    keys = [f"{fragment}:{stamp}" for stamp, _ in items]
+    cached = cache.get_many(keys)
+    rendered = {key: render(obj) for key, (_, obj) in zip(keys, items) if key not in cached}
+    if rendered:
+        cache.set_many(rendered, timeout)
+    fragment_cache(fragment, len(keys) - len(rendered), len(rendered))
+    return [mark_safe(cached[key] if key in cached else rendered[key]) for key in keys]
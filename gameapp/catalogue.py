@@ -0,0 +1,137 @@
+"""
+Bulk import of games and articles from catalogue dumps, used by the `import_catalogue` command.
+
+Rows are streamed from CSV or JSON Lines files and written in chunks, so memory stays bounded however large
+the dump is. Every row is validated with the rules of the forms used to add games and articles, games are
+upserted on their name and article slugs are reserved from SlugCounter for a whole chunk at once. Bulk writes
+skip the model signals, so each chunk is indexed for search here and the cached pages are invalidated once
+at the end.
+"""
+import csv
+import json
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+
+from gameapp import search
+from gameapp.cache import invalidate
+from gameapp.forms import GameImportForm, ArticleImportForm
+from gameapp.models import Game, Article, SlugCounter
+
+
+class ImportResult:
+    """ Counts the rows of an import; `errors` holds (line, message) pairs of the skipped rows. """
+
+    def __init__(self):
+        self.imported = 0
+        self.errors = []
+
+    @property
+    def skipped(self):
+        return len(self.errors)
+
+
+def read_rows(path, file_format=None):
+    """ Yields (line number, row dict) pairs from a .csv or .jsonl file, one line at a time. """
+    file_format = file_format or ('csv' if path.endswith('.csv') else 'jsonl')
+    with open(path, newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as error:
+                yield line_number, error
+
+
+def chunks(rows, size):
+    """ Splits an iterator into lists of up to `size` items. """
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def validate(form_class, rows, result):
+    """ Returns (line, cleaned data) pairs of the valid rows, recording the errors of the others. """
+    valid = []
+    for line, row in rows:
+        if not isinstance(row, dict):
+            result.errors.append((line, f"invalid row: {row}"))
+            continue
+        form = form_class(data=row)
+        if form.is_valid():
+            valid.append((line, form.cleaned_data))
+        else:
+            messages = "; ".join(f"{field}: {' '.join(errors)}" for field, errors in form.errors.items())
+            result.errors.append((line, messages))
+    return valid
+
+
+def import_games(rows, chunk_size=1000, index=True):
+    """ Creates or updates (matched on name) the games of the rows, indexing them for search unless `index`
+    is False (for large dumps followed by rebuild_search_index). """
+    result = ImportResult()
+    for chunk in chunks(rows, chunk_size):
+        # a name repeated within a chunk keeps its last row
+        games = {data['name']: data['description'] for _, data in validate(GameImportForm, chunk, result)}
+        if not games:
+            continue
+        with transaction.atomic():
+            Game.objects.bulk_create(
+                [Game(name=name, description=description) for name, description in games.items()],
+                update_conflicts=True, unique_fields=['name'], update_fields=['description'])
+            if index:
+                search.index_objects(Game.objects.filter(name__in=games))
+        result.imported += len(games)
+    if result.imported:
+        invalidate('main_page')
+    return result
+
+
+def import_articles(rows, chunk_size=1000, index=True):
+    """ Creates the articles of the rows, whose games are given by name and must exist, indexing them for
+    search unless `index` is False. """
+    result = ImportResult()
+    for chunk in chunks(rows, chunk_size):
+        valid = validate(ArticleImportForm, chunk, result)
+        games = dict(Game.objects.filter(name__in={data['game'] for _, data in valid}).values_list('name', 'id'))
+
+        articles = []
+        for line, data in valid:
+            if data['game'] not in games:
+                result.errors.append((line, f"game: unknown game {data['game']!r}"))
+                continue
+            articles.append(Article(game_id=games[data['game']], title=data['title'], summary=data['summary'],
+                                    content=data['content']))
+        if not articles:
+            continue
+        with transaction.atomic():
+            assign_slugs(articles)
+            Article.objects.bulk_create(articles)
+            if index:
+                search.index_objects(articles)
+        result.imported += len(articles)
+    if result.imported:
+        invalidate('main_page')
+    return result
+
+
+def assign_slugs(articles):
+    """ Gives the articles unique slugs, reserving the suffixes of every title base in one go. """
+    pending = articles
+    while pending:
+        bases = [SlugCounter.base_for(article.title) for article in pending]
+        first = SlugCounter.allocate_many(Counter(bases))
+        for article, base in zip(pending, bases):
+            article.slug = SlugCounter.slug_for(base, first[base])
+            first[base] += 1
+        # slugs set by hand are not tracked by the counters, such collisions take the next suffix
+        taken = set(Article.objects.filter(slug__in=[article.slug for article in pending])
+                    .values_list('slug', flat=True))
+        pending = [article for article in pending if article.slug in taken]
@@ -0,0 +1,8 @@
+from gameapp.notifications import unread_count
+
+
+def notifications(request):
+    """ Adds the unread notification count of the logged-in user to every template. """
+    if not request.user.is_authenticated:
+        return {}
+    return {'unread_notifications': unread_count(request.user.id)}
@@ -2,9 +2,10 @@ from captcha.fields import CaptchaField
 from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
+from django.core.exceptions import ValidationError
 from django.forms import ModelForm, Form
 
-from gameapp.models import ExchangeOffer, CustomerOffer, Game, Article
+from gameapp.models import ExchangeOffer, CustomerOffer, Game, Article, OFFER_TYPE_CHOICES
 
 User = get_user_model()
 
@@ -22,10 +23,11 @@ class AddOfferForm(ModelForm):
 
     class Meta:
         model = ExchangeOffer
-        fields = ['offer_type', 'game', 'price', 'description']
+        fields = ['offer_type', 'game', 'wanted_game', 'price', 'description']
         labels = {
             'offer_type': 'Offer Type',
             'game': 'Game',
+            'wanted_game': 'Wanted game (for exchange offers)',
             'description': 'Description',
         }
     price = forms.DecimalField(
@@ -34,6 +36,13 @@ class AddOfferForm(ModelForm):
         widget=forms.TextInput(attrs={'placeholder': '0.00'})
     )
 
+    def clean(self):
+        """ Drops the wanted game of offers other than exchange offers. """
+        cleaned_data = super().clean()
+        if cleaned_data.get('offer_type') != "E":
+            cleaned_data['wanted_game'] = None
+        return cleaned_data
+
 
 class MakeOfferForm(ModelForm):
     """ A form for making an offer on an existing exchange offer. """
@@ -54,6 +63,17 @@ class MakeOfferForm(ModelForm):
     )
 
 
+class MarketFilterForm(Form):
+    """ A form validating the market filters and sort order of the query string. """
+    SORT_CHOICES = [('newest', 'Newest first'), ('price', 'Cheapest first'), ('-price', 'Most expensive first')]
+
+    game = forms.CharField(required=False)
+    offer_type = forms.ChoiceField(choices=[('', 'All types')] + OFFER_TYPE_CHOICES, required=False)
+    min_price = forms.DecimalField(required=False, min_value=0, max_digits=10, decimal_places=2)
+    max_price = forms.DecimalField(required=False, min_value=0, max_digits=10, decimal_places=2)
+    sort = forms.ChoiceField(choices=SORT_CHOICES, required=False)
+
+
 class AcceptForm(Form):
     """ A form for accepting an offer. """
     customer_offer_id = forms.IntegerField(widget=forms.HiddenInput())
@@ -64,6 +84,24 @@ class NotificationForm(Form):
     notification_id = forms.IntegerField(widget=forms.HiddenInput())
 
 
+class IntegerListField(forms.Field):
+    """ A field for a list of integers posted under one name, e.g. by a group of checkboxes. """
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        if not value:
+            return []
+        try:
+            return [int(item) for item in value]
+        except (TypeError, ValueError):
+            raise ValidationError("Enter a list of whole numbers.", code='invalid')
+
+
+class NotificationSelectionForm(Form):
+    """ A form for selecting several notifications at once. """
+    notification_ids = IntegerListField()
+
+
 class NewGameForm(ModelForm):
     """ A form for adding new game to database. """
     class Meta:
@@ -76,3 +114,19 @@ class NewArticleForm(ModelForm):
     class Meta:
         model = Article
         fields = ['game', 'title', 'summary', 'content']
+
+
+class GameImportForm(NewGameForm):
+    """ NewGameForm for catalogue imports, which upsert games on name instead of rejecting existing names. """
+
+    def validate_unique(self):
+        pass
+
+
+class ArticleImportForm(NewArticleForm):
+    """ NewArticleForm for catalogue imports, taking the game by name; the importer resolves the names
+    of a whole chunk with one query. """
+    game = forms.CharField(max_length=100)
+
+    class Meta(NewArticleForm.Meta):
+        fields = ['title', 'summary', 'content']
@@ -0,0 +1,248 @@
+"""
+Load-test scenarios replaying the marketplace flows, run by the `loadtest` command.
+
+Every virtual user is a seeded customer (see gameapp.seeding) repeating the flow: browse the market, filter
+it by a game, open the offer form of a listing and make an offer, after which the owner of the listing logs
+in, reviews the offers and accepts one. The listings are open offers of seeded owners picked from the
+database beforehand and split between the virtual users, so two flows never compete for the same listing.
+
+The requests go through the WSGI or ASGI handler in this process (captchas pass in test mode and emails go
+to the locmem backend), or over HTTP to a server on localhost started with CAPTCHA_TEST_MODE = True and
+sharing this database. Each step records its latency and whether the response had the expected status.
+"""
+import http.cookiejar
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import ExitStack
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from captcha.conf import settings as captcha_settings
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, AsyncClient, override_settings
+from django.urls import reverse
+
+from gameapp.benchmarks import percentile
+from gameapp.models import ExchangeOffer
+from gameapp.seeding import SEED_PASSWORD, USERNAME_PREFIX
+
+STEPS = ('login', 'browse_market', 'filter_market', 'offer_form', 'make_offer', 'review_offers', 'accept_offer')
+CUSTOMER_OFFER_ID = re.compile(rb'name="customer_offer_id" value="(\d+)"')
+SELECTED_GAME = re.compile(rb'<option value="(\d+)" selected>')
+
+
+class InProcessSession:
+    """ A browser session sending its requests through the WSGI handler of this process. """
+
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+
+    def get(self, path, params=None):
+        response = self.client.get(path, params or {})
+        return response.status_code, response.content
+
+    def post(self, path, data):
+        response = self.client.post(path, data)
+        return response.status_code, response.content
+
+
+class AsgiSession(InProcessSession):
+    """ A browser session sending its requests through the ASGI handler of this process. """
+
+    def __init__(self):
+        self.client = AsyncClient(raise_request_exception=False)
+
+    def get(self, path, params=None):
+        return async_to_sync(self.send)(self.client.get, path, params or {})
+
+    def post(self, path, data):
+        return async_to_sync(self.send)(self.client.post, path, data)
+
+    @staticmethod
+    async def send(method, *args):
+        response = await method(*args)
+        return response.status_code, response.content
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    """ A browser session talking to a running server, keeping its cookies and sending the CSRF token. """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect)
+
+    def get(self, path, params=None):
+        query = f"?{urllib.parse.urlencode(params)}" if params else ""
+        return self.open(urllib.request.Request(self.base_url + path + query))
+
+    def post(self, path, data):
+        token = next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), "")
+        body = urllib.parse.urlencode({**data, 'csrfmiddlewaretoken': token}).encode()
+        return self.open(urllib.request.Request(self.base_url + path, data=body,
+                                                headers={'Referer': self.base_url + path, 'X-CSRFToken': token}))
+
+    def open(self, request):
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+
+class StepStats:
+    """ Collects the latencies (ms) and failures of one step across the virtual users. """
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed, ok):
+        with self._lock:
+            self.latencies.append(elapsed)
+            self.errors += not ok
+
+    def report(self, duration):
+        count = len(self.latencies)
+        return {'requests': count, 'throughput_rps': round(count / duration, 1) if duration else 0.0,
+                'p50_ms': round(percentile(self.latencies, 0.5), 2),
+                'p95_ms': round(percentile(self.latencies, 0.95), 2),
+                'error_rate': round(self.errors / count, 4) if count else 0.0}
+
+
+class StepFailed(Exception):
+    pass
+
+
+class VirtualUser:
+    """ Replays the flow for one customer over its share of the listings. """
+
+    def __init__(self, session_factory, customer, listings, stats):
+        self.session_factory = session_factory
+        self.customer = customer
+        self.listings = listings
+        self.stats = stats
+        self.sessions = {}
+        self.flows = 0
+
+    def step(self, name, call, expected, check=None):
+        """ Runs a request of the step, returning its body; raises StepFailed on an unexpected status or
+        when `check` rejects the body. """
+        started = time.perf_counter()
+        try:
+            status, body = call()
+        except Exception:
+            status, body = None, b""
+        ok = status == expected and (check is None or bool(check(body)))
+        self.stats[name].record((time.perf_counter() - started) * 1000, ok)
+        if not ok:
+            raise StepFailed(f"{name}: {status}")
+        return body
+
+    def session(self, username):
+        """ Returns the logged in session of the user, logging in on first use. """
+        if username not in self.sessions:
+            session = self.session_factory()
+            session.get(reverse('login'))
+            self.step('login', lambda: session.post(
+                reverse('login'), {'username': username, 'password': SEED_PASSWORD}), 302)
+            self.sessions[username] = session
+        return self.sessions[username]
+
+    def run(self):
+        try:
+            for listing in self.listings:
+                try:
+                    self.flow(*listing)
+                    self.flows += 1
+                except StepFailed:
+                    pass
+        finally:
+            connection.close()
+
+    def flow(self, offer_id, owner, game):
+        customer = self.session(self.customer)
+        self.step('browse_market', lambda: customer.get(reverse('market')), 200)
+        self.step('filter_market', lambda: customer.get(reverse('market'), {'game': game}), 200)
+        make_offer = reverse('make_offer', args=[offer_id])
+        # the offer is made for the game the form preselects, the listed one
+        form = self.step('offer_form', lambda: customer.get(make_offer), 200, SELECTED_GAME.search)
+        self.step('make_offer', lambda: customer.post(make_offer, {
+            'game_name': SELECTED_GAME.search(form).group(1).decode(), 'price': "10.00",
+            'description': "Load test offer", 'captcha_0': "loadtest", 'captcha_1': "PASSED"}), 302)
+
+        owner_session = self.session(owner)
+        offer_details = reverse('offer_details', args=[offer_id])
+        page = self.step('review_offers', lambda: owner_session.get(offer_details), 200, CUSTOMER_OFFER_ID.search)
+        bids = CUSTOMER_OFFER_ID.findall(page)
+        self.step('accept_offer', lambda: owner_session.post(
+            offer_details, {'customer_offer_id': bids[-1].decode()}), 302)
+
+
+def plan(users, iterations):
+    """ Returns (customer, listings) per virtual user: seeded customers with open listings of other
+    seeded users, newest first. """
+    customers = list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('id')
+                     .values_list('username', flat=True)[:users])
+    if not customers:
+        raise ValueError("No seeded users, run the seed management command first.")
+    listings = iter(ExchangeOffer.objects.filter(status=True, owner__username__startswith=USERNAME_PREFIX)
+                    .order_by('-id').values_list('id', 'owner__username', 'game__name')
+                    .iterator(chunk_size=1000))
+    shares = [(customer, []) for customer in customers]
+    for customer, share in shares:
+        for listing in listings:
+            if listing[1] != customer:
+                share.append(listing)
+            if len(share) == iterations:
+                break
+    return [(customer, share) for customer, share in shares if share]
+
+
+def run(users=10, iterations=10, transport='wsgi', base_url=None):
+    """
+    Replays `iterations` flows for each of `users` concurrent virtual users and returns the throughput,
+    latency percentiles and error rate of every step, plus the totals of the run.
+
+    `transport` is 'wsgi' or 'asgi' for the handlers of this process, or 'http' for the server at `base_url`.
+    """
+    stats = {name: StepStats() for name in STEPS}
+    if transport == 'http':
+        session_factory = lambda: HttpSession(base_url)  # noqa: E731
+    else:
+        session_factory = {'wsgi': InProcessSession, 'asgi': AsgiSession}[transport]
+    virtual_users = [VirtualUser(session_factory, customer, listings, stats)
+                     for customer, listings in plan(users, iterations)]
+
+    with ExitStack() as stack:
+        if transport != 'http':
+            stack.enter_context(mock.patch.object(captcha_settings, 'CAPTCHA_TEST_MODE', True))
+            stack.enter_context(override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                                                  ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']))
+        threads = [threading.Thread(target=virtual_user.run) for virtual_user in virtual_users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - started
+
+    flows = sum(virtual_user.flows for virtual_user in virtual_users)
+    planned = sum(len(virtual_user.listings) for virtual_user in virtual_users)
+    return {
+        'users': len(virtual_users), 'transport': transport, 'duration_s': round(duration, 2),
+        'flows': flows, 'failed_flows': planned - flows, 'flows_per_s': round(flows / duration, 2),
+        'steps': {name: step.report(duration) for name, step in stats.items()},
+    }
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from gameapp.metrics import external_call
+from gameapp.models import OutgoingEmail
+
+
+def queue_email(subject, text_content, to, from_email="emistrij@gmail.com", html_content=None):
+    """
+    Stores an email in the outbox instead of sending it.
+
+    The row is written with the caller's database connection, so inside transaction.atomic() the email
+    is only queued when the surrounding changes are committed.
+    """
+    if html_content is None:
+        html_content = f"<p>{text_content}</p>"
+    return OutgoingEmail.objects.create(subject=subject, from_email=from_email, to=to, text_content=text_content,
+                                        html_content=html_content)
+
+
+def build_message(email, connection=None):
+    """ Builds the EmailMultiAlternatives message of an outbox row. """
+    msg = EmailMultiAlternatives(email.subject, email.text_content, email.from_email, [email.to],
+                                 connection=connection)
+    if email.html_content:
+        msg.attach_alternative(email.html_content, "text/html")
+    return msg
+
+
+def retry_delay(attempts):
+    """ Returns the backoff before the next attempt, doubling after every failure. """
+    return timedelta(seconds=settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def close_quietly(connection):
+    """ Closes a mail connection that may already be broken. """
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def send_pending(batch_size=None, connection=None):
+    """
+    Delivers one batch of due outbox emails over a single connection.
+
+    The batch is locked for the duration of the delivery (rows locked by another worker are skipped), and
+    delivered rows are marked as sent in the same transaction, so concurrent workers never send the same
+    email twice. Failed rows are rescheduled with exponential backoff until OUTBOX_MAX_ATTEMPTS is reached.
+    Returns a (sent, failed) tuple of counts.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    connection = connection or get_connection()
+    sent, failed = [], []
+
+    with transaction.atomic():
+        batch = list(OutgoingEmail.objects.select_for_update(skip_locked=True)
+                     .filter(sent__isnull=True, failed=False, next_attempt__lte=timezone.now())
+                     .order_by('next_attempt', 'id')[:batch_size])
+        if not batch:
+            return 0, 0
+
+        for email in batch:
+            try:
+                # opens the connection on the first email and after a failure, otherwise it is reused
+                with external_call('email'):
+                    connection.open()
+                    connection.send_messages([build_message(email, connection)])
+            except Exception as error:
+                email.last_error = str(error)
+                failed.append(email)
+                close_quietly(connection)
+            else:
+                sent.append(email.id)
+        close_quietly(connection)
+
+        now = timezone.now()
+        OutgoingEmail.objects.filter(id__in=sent).update(sent=now)
+        for email in failed:
+            email.attempts += 1
+            email.failed = email.attempts >= settings.OUTBOX_MAX_ATTEMPTS
+            email.next_attempt = now + retry_delay(email.attempts)
+            email.save(update_fields=['attempts', 'last_error', 'failed', 'next_attempt'])
+
+    return len(sent), len(failed)
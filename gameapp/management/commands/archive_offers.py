@@ -0,0 +1,23 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gameapp.archive import archive_offers
+
+
+class Command(BaseCommand):
+    """ Moves old closed offers and their customer offers to the archive tables, resuming where it stopped. """
+    help = "Archive exchange offers closed more than --days days ago."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help="Archive offers closed more than this many days ago.")
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE,
+                            help="Number of offers moved per transaction.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        offers, bids = archive_offers(options['days'], options['batch_size'], log=self.stderr.write)
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Archived {offers} offers and {bids} customer offers in {elapsed:.2f}s.")
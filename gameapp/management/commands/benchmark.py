@@ -0,0 +1,83 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from gameapp.benchmarks import BENCHMARKS
+
+
+def flatten(results, prefix=""):
+    """ Flattens nested results into {"benchmark.key.metric": value} for the numeric measurements. """
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def regressions(baseline, results, threshold):
+    """ Lists the latencies that grew by more than `threshold` (and 1 ms) and the query counts that grew. """
+    found = []
+    current = flatten(results)
+    for key, old in flatten(baseline).items():
+        new = current.get(key)
+        if new is None:
+            continue
+        if key.endswith('_ms') and new > old * (1 + threshold) and new - old >= 1:
+            found.append(f"{key}: {old} -> {new} ms (+{(new - old) / old:.0%})" if old else f"{key}: {old} -> {new} ms")
+        elif key.endswith('queries') and new > old:
+            found.append(f"{key}: {old} -> {new} queries")
+    return found
+
+
+class Command(BaseCommand):
+    """ Runs the benchmarks registered in gameapp.benchmarks and prints their measurements as JSON. """
+    help = "Run performance benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Benchmarks to run, all of them by default.")
+        parser.add_argument('--scale', type=int, help="Overrides the default scale of the benchmarks.")
+        parser.add_argument('--list', action='store_true', help="List the available benchmarks.")
+        parser.add_argument('--save', metavar='PATH', help="Stores the results as a JSON baseline.")
+        parser.add_argument('--compare', metavar='PATH',
+                            help="Compares the results with a JSON baseline, failing on regressions.")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Relative latency growth tolerated by --compare (default 0.2 = 20%%).")
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name, entry in sorted(BENCHMARKS.items()):
+                self.stdout.write(f"{name} (scale {entry['scale']})")
+            return
+
+        names = options['names'] or sorted(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+        results = {}
+        for name in names:
+            entry = BENCHMARKS[name]
+            scale = options['scale'] or entry['scale']
+            self.stderr.write(f"Running {name} at scale {scale}...")
+            if entry['rollback']:
+                with transaction.atomic():
+                    results[name] = entry['function'](scale)
+                    transaction.set_rollback(True)
+            else:
+                results[name] = entry['function'](scale)
+        self.stdout.write(json.dumps(results, indent=2))
+
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump(results, file, indent=2)
+        if options['compare']:
+            with open(options['compare']) as file:
+                found = regressions(json.load(file), results, options['threshold'])
+            for regression in found:
+                self.stderr.write(f"Regression: {regression}")
+            if found:
+                raise CommandError(f"{len(found)} regressions against {options['compare']}")
+            self.stderr.write(f"No regressions against {options['compare']}.")
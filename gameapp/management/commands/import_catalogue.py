@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gameapp.catalogue import read_rows, import_games, import_articles
+
+IMPORTERS = {'games': import_games, 'articles': import_articles}
+
+
+class Command(BaseCommand):
+    """ Streams games or articles from a CSV or JSON Lines dump into the database. """
+    help = "Import games (name, description) or articles (game, title, summary, content) from a catalogue dump."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS), help="What the file contains.")
+        parser.add_argument('path', help="A .csv file with a header row or a .jsonl file with one object per line.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Overrides the format guessed from the path.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Number of rows written per batch.")
+        parser.add_argument('--no-index', action='store_true',
+                            help="Skip search indexing, for large dumps followed by rebuild_search_index.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rows = read_rows(options['path'], options['format'])
+        result = IMPORTERS[options['kind']](rows, options['chunk_size'], index=not options['no_index'])
+        elapsed = time.monotonic() - started
+
+        for line, message in result.errors:
+            self.stderr.write(f"Line {line}: {message}")
+        rate = (result.imported + result.skipped) / elapsed if elapsed else 0
+        self.stdout.write(f"Imported {result.imported} {options['kind']}, skipped {result.skipped} invalid rows "
+                          f"in {elapsed:.2f}s ({rate:.0f} rows/s).")
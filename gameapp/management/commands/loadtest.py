@@ -0,0 +1,27 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gameapp import loadtest
+
+
+class Command(BaseCommand):
+    """ Replays the marketplace flows with concurrent virtual users and prints per-step measurements as JSON. """
+    help = "Load test the market: browse, filter, make an offer, review and accept it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help="Concurrent virtual users (seeded customers).")
+        parser.add_argument('--iterations', type=int, default=10, help="Flows replayed by every virtual user.")
+        parser.add_argument('--transport', choices=['wsgi', 'asgi'], default='wsgi',
+                            help="Handler of this process driven by the virtual users.")
+        parser.add_argument('--base-url', help="Drive the server at this URL (e.g. http://127.0.0.1:8000) "
+                                               "instead, which must run with CAPTCHA_TEST_MODE = True.")
+
+    def handle(self, *args, **options):
+        transport = 'http' if options['base_url'] else options['transport']
+        self.stderr.write(f"Replaying {options['iterations']} flows for {options['users']} users over {transport}...")
+        try:
+            results = loadtest.run(options['users'], options['iterations'], transport, options['base_url'])
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,35 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """ Relays every line published by a worker to all connected workers, for the BrokerHub. """
+    help = "Run the notification broker fanning real-time notifications out to the web workers."
+
+    def add_arguments(self, parser):
+        host, port = settings.NOTIFICATION_BROKER_ADDRESS
+        parser.add_argument('--host', default=host, help="Address to listen on.")
+        parser.add_argument('--port', type=int, default=port, help="Port to listen on.")
+
+    def handle(self, *args, **options):
+        asyncio.run(self.serve(options['host'], options['port']))
+
+    async def serve(self, host, port):
+        workers = set()
+
+        async def relay(reader, writer):
+            workers.add(writer)
+            try:
+                while line := await reader.readline():
+                    for worker in list(workers):
+                        worker.write(line)
+            finally:
+                workers.discard(writer)
+                writer.close()
+
+        server = await asyncio.start_server(relay, host, port)
+        self.stdout.write(f"Notification broker listening on {host}:{port}.")
+        async with server:
+            await server.serve_forever()
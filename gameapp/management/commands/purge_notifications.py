@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gameapp.notifications import purge_notifications
+
+
+class Command(BaseCommand):
+    """ Applies the notification retention policy: read ones expire and every user keeps a bounded number. """
+    help = "Delete expired read notifications and those over the per-user cap."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.NOTIFICATION_READ_RETENTION_DAYS,
+                            help="Delete read notifications created more than this many days ago.")
+        parser.add_argument('--max-per-user', type=int, default=settings.NOTIFICATION_MAX_PER_USER,
+                            help="Number of the newest notifications kept for every user, 0 keeps none.")
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_PURGE_BATCH_SIZE,
+                            help="Rows deleted per statement.")
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to wait between batches.")
+
+    def handle(self, *args, **options):
+        if options['max_per_user'] < 0:
+            raise CommandError("--max-per-user must not be negative.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+        started = time.monotonic()
+        expired, over_cap = purge_notifications(options['days'], options['max_per_user'], options['batch_size'],
+                                                options['pause'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Deleted {expired + over_cap} notifications ({expired} expired, {over_cap} over the "
+                          f"per-user cap) in {elapsed:.2f}s.")
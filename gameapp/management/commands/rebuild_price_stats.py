@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from gameapp.models import GamePriceStats
+
+
+class Command(BaseCommand):
+    """ Recomputes the per-game price statistics from the offers, e.g. after bulk imports. """
+    help = "Rebuild the per-game price statistics from the offers and accepted customer offers."
+
+    def handle(self, *args, **options):
+        rows = GamePriceStats.rebuild()
+        self.stdout.write(f"Rebuilt {rows} price statistics.")
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gameapp.search import rebuild_index
+
+
+class Command(BaseCommand):
+    """ Rebuilds the full-text search index from the articles, games and active offers. """
+    help = "Rebuild the search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Number of objects indexed per batch.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            indexed = rebuild_index(options['chunk_size'])
+        self.stdout.write(f"Indexed {indexed} documents in {time.monotonic() - started:.2f}s.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gameapp.models import GameMarketStats
+
+
+class Command(BaseCommand):
+    """ Recomputes the per-game market statistics from the offers, fixing any drift. """
+    help = "Reconcile the per-game market statistics with the offers."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            corrected = GameMarketStats.reconcile()
+        self.stdout.write(f"Corrected {corrected} game statistics.")
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gameapp.models import OFFER_TYPE_CHOICES
+from gameapp.seeding import seed, SEED_PASSWORD
+
+
+def share(value):
+    value = float(value)
+    if not 0 <= value <= 1:
+        raise ValueError(value)
+    return value
+
+
+class Command(BaseCommand):
+    """ Fills the database with deterministic, realistically skewed data (see gameapp.seeding). """
+    help = "Seed users, games, articles, offers, customer offers and notifications."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--games', type=int, default=1000)
+        parser.add_argument('--articles', type=int, default=1000)
+        parser.add_argument('--offers', type=int, default=10000)
+        parser.add_argument('--customer-offers', type=int, default=50000)
+        parser.add_argument('--notifications', type=int, default=100000)
+        parser.add_argument('--inactive-share', type=share, default=0.3, help="Share of closed offers (0-1).")
+        parser.add_argument('--read-share', type=share, default=0.7, help="Share of read notifications (0-1).")
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help="Popularity skew of games and users, 0 for uniform (default 1, Zipf-like).")
+        parser.add_argument('--offer-types', default="",
+                            help="Relative frequency of the offer types, e.g. S=5,B=3,E=2 (equal by default).")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same data.")
+        parser.add_argument('--batch-size', type=int, default=10000, help="Rows per bulk insert.")
+        parser.add_argument('--no-index', action='store_true',
+                            help="Skip rebuilding the search index (run rebuild_search_index later).")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['games'] < 1:
+            raise CommandError("At least one user and one game are needed.")
+
+        started = time.monotonic()
+        timings = seed(
+            users=options['users'], games=options['games'], articles=options['articles'], offers=options['offers'],
+            customer_offers=options['customer_offers'], notifications=options['notifications'],
+            inactive_share=options['inactive_share'], popularity_skew=options['skew'],
+            read_share=options['read_share'], offer_type_weights=self.offer_type_weights(options['offer_types']),
+            random_seed=options['seed'], batch_size=options['batch_size'], index=not options['no_index'],
+            log=self.stderr.write)
+
+        rows = sum(count for count, _ in timings.values())
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Seeded {rows} rows in {elapsed:.2f}s ({rows / elapsed:.0f} rows/s). "
+                          f"Seeded users log in with the password {SEED_PASSWORD!r}.")
+
+    def offer_type_weights(self, value):
+        if not value:
+            return None
+        valid = dict(OFFER_TYPE_CHOICES)
+        try:
+            weights = {offer_type.strip(): float(weight) for offer_type, weight in
+                       (item.split("=") for item in value.split(","))}
+        except ValueError:
+            raise CommandError(f"Invalid --offer-types {value!r}, expected e.g. S=5,B=3,E=2.")
+        if set(weights) - set(valid) or not any(weights.values()) or min(weights.values()) < 0:
+            raise CommandError(f"--offer-types takes non-negative weights for {', '.join(valid)}.")
+        return weights
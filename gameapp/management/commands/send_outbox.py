@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from gameapp.mail import send_pending
+
+
+class Command(BaseCommand):
+    """ Drains the email outbox in batches, reusing one mail connection per batch. """
+    help = "Deliver queued outbox emails."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE,
+                            help="Number of emails delivered per batch.")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep polling the outbox instead of exiting once it is drained.")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds to wait between polls of an empty outbox in --loop mode.")
+
+    def handle(self, *args, **options):
+        connection = get_connection()
+        total_sent = total_failed = 0
+        started = time.monotonic()
+
+        while True:
+            sent, failed = send_pending(options['batch_size'], connection)
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Sent {total_sent} emails, {total_failed} failed attempts in {elapsed:.2f}s.")
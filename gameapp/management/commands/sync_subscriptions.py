@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gameapp.subscriptions import mailchimp_client, sync_pending
+
+
+class Command(BaseCommand):
+    """ Adds pending newsletter subscriptions to the Mailchimp list in batches. """
+    help = "Sync queued newsletter subscriptions to Mailchimp."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.MAILCHIMP_BATCH_SIZE,
+                            help="Number of subscriptions sent per batch request (at most 500).")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep polling for subscriptions instead of exiting once all are synced.")
+        parser.add_argument('--interval', type=float, default=30.0,
+                            help="Seconds to wait between polls in --loop mode.")
+
+    def handle(self, *args, **options):
+        client = mailchimp_client()
+        total_synced = total_failed = 0
+        started = time.monotonic()
+
+        while True:
+            synced, failed = sync_pending(options['batch_size'], client)
+            total_synced += synced
+            total_failed += failed
+            if synced or failed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Synced {total_synced} subscriptions, {total_failed} failed attempts in {elapsed:.2f}s.")
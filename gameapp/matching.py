@@ -0,0 +1,103 @@
+"""
+Matching a new exchange offer with the open offers it can trade with, run when the offer is added.
+
+A Sell and a Buy offer of the same game match when the buyer's price reaches the seller's. An Exchange
+offer gives its game for its wanted game and closes a cycle with open Exchange offers of other users whose
+games go around: two-way (A for B with B for A) or three-way (A for B, B for C and C for A). Both sides of
+every match get a notification.
+
+The open offers are not held in memory: the partial indexes on active offers by game, type and price and by
+game and wanted game are the buckets of the engine. A new offer reads only the buckets of the games it gives
+and wants, and stops after settings.MATCHES_PER_OFFER matches. Offers are matched when the later of them is
+added, so every match is reported once, and closed offers drop out of the indexes.
+"""
+from django.conf import settings
+from django.db.models import FilteredRelation, Q, F
+
+from gameapp.models import ExchangeOffer
+from gameapp.notifications import notify_many
+
+# the offer type a Sell or Buy offer is matched with
+COUNTER_TYPES = {"S": "B", "B": "S"}
+
+
+def open_offers(owner_id):
+    """ Returns the open offers of the users other than the owner. """
+    return ExchangeOffer.objects.filter(status=True).exclude(owner_id=owner_id).select_related(
+        'owner', 'game', 'wanted_game')
+
+
+def price_matches(offer, limit):
+    """ Returns up to `limit` open offers on the other side of a Sell or Buy offer of the same game that agree
+    with its price, the best price first. """
+    if offer.offer_type not in COUNTER_TYPES or offer.price is None:
+        return []
+    candidates = open_offers(offer.owner_id).filter(game_id=offer.game_id,
+                                                    offer_type=COUNTER_TYPES[offer.offer_type])
+    if offer.offer_type == "S":
+        candidates = candidates.filter(price__gte=offer.price).order_by('-price', '-id')
+    else:
+        candidates = candidates.filter(price__lte=offer.price).order_by('price', 'id')
+    return list(candidates[:limit])
+
+
+def exchange_cycles(offer, limit):
+    """
+    Returns up to `limit` cycles an Exchange offer closes, each a tuple of the other offers in trading order:
+    (B for A,) or (B for C, C for A) for an offer giving A for B. Two-way cycles come first.
+
+    The three-way cycles are found with one join from the offers of the wanted game to the offers giving their
+    wanted game for the offered one, both read from the (game, wanted game) index.
+    """
+    if offer.offer_type != "E" or offer.wanted_game_id in (None, offer.game_id):
+        return []
+    swaps = open_offers(offer.owner_id).filter(offer_type="E")
+    cycles = [(other,) for other in swaps.filter(game_id=offer.wanted_game_id, wanted_game_id=offer.game_id)[:limit]]
+    if len(cycles) == limit:
+        return cycles
+
+    third = 'wanted_game__exchangeoffer'
+    closing = Q(**{f'{third}__status': True, f'{third}__offer_type': "E", f'{third}__wanted_game_id': offer.game_id})
+    # the third offer belongs to neither of the other two owners
+    closing &= ~Q(**{f'{third}__owner_id': offer.owner_id}) & ~Q(**{f'{third}__owner_id': F('owner_id')})
+    rows = list(swaps.filter(game_id=offer.wanted_game_id)
+                .exclude(wanted_game_id__in=[offer.game_id, offer.wanted_game_id])
+                .alias(third=FilteredRelation(third, condition=closing)).filter(third__isnull=False)
+                .values_list('id', 'third__id')[:limit - len(cycles)])
+    offers = open_offers(offer.owner_id).in_bulk({offer_id for row in rows for offer_id in row})
+    return cycles + [(offers[second], offers[third]) for second, third in rows]
+
+
+def describe(offer):
+    return f"{offer.get_offer_type_display()}-{offer.game}"
+
+
+def match_notifications(offer, matches, cycles):
+    """ Returns the (user id, description) notifications of both sides of the matches and of every party of
+    the cycles. """
+    entries = []
+    for other in matches:
+        entries.append((offer.owner_id, f"Your offer {describe(offer)} matches the offer {describe(other)} of "
+                                         f"user {other.owner.username} for {other.price:.2f}."))
+        entries.append((other.owner_id, f"Your offer {describe(other)} matches the new offer {describe(offer)} of "
+                                         f"user {offer.owner.username} for {offer.price:.2f}."))
+    for cycle in cycles:
+        parties = (offer,) + cycle
+        trades = "; ".join(f"{party.owner.username} gives {party.game} for {party.wanted_game}" for party in parties)
+        entries += [(party.owner_id, f"Your offer {describe(party)} can be traded in a {len(parties)}-way "
+                                     f"exchange: {trades}.") for party in parties]
+    return entries
+
+
+def match_offer(offer, limit=None):
+    """
+    Matches a newly added offer with the open offers and notifies the users of every match.
+
+    Returns (matched offers, cycles), up to `limit` of each (settings.MATCHES_PER_OFFER by default).
+    """
+    limit = settings.MATCHES_PER_OFFER if limit is None else limit
+    matches = price_matches(offer, limit)
+    cycles = exchange_cycles(offer, limit)
+    if matches or cycles:
+        notify_many(match_notifications(offer, matches, cycles))
+    return matches, cycles
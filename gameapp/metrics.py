@@ -0,0 +1,190 @@
+"""
+Per-view performance metrics, exported in the Prometheus text format at /metrics.
+
+PerformanceMiddleware (gameapp.middleware) times a sample of the requests and records, per URL name, the
+total latency, the number and time of SQL queries, the template rendering time and the time spent calling
+external services (SMTP, Mailchimp). The histograms live in the memory of each worker process, so every
+worker is scraped on its own, as usual for Prometheus. Template fragment cache hits and misses are counted
+for every request.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# timings of the request being handled in this context, None when it is not sampled
+current_timings = ContextVar('current_timings', default=None)
+
+
+class Histogram:
+    """ A Prometheus histogram with one series per label value. """
+
+    def __init__(self, name, documentation, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            counts, total = self._series.get(label_value, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._series[label_value] = (counts, total + value)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        """ Returns the lines of the histogram in the Prometheus text format. """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((value, list(counts), total) for value, (counts, total) in self._series.items())
+        for value, counts, total in series:
+            label = f'{self.label}="{escape(value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    """ A Prometheus counter with one series per label value. """
+
+    def __init__(self, name, documentation, label):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._series[label_value] = self._series.get(label_value, 0) + amount
+
+    def value(self, label_value):
+        with self._lock:
+            return self._series.get(label_value, 0)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        """ Returns the lines of the counter in the Prometheus text format. """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = sorted(self._series.items())
+        lines += [f'{self.name}{{{self.label}="{escape(value)}"}} {total}' for value, total in series]
+        return lines
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram('gameconnect_request_duration_seconds', "Total time to handle a request.", 'view')
+DB_QUERIES = Histogram('gameconnect_db_queries', "SQL queries run by a request.", 'view', QUERY_BUCKETS)
+DB_DURATION = Histogram('gameconnect_db_duration_seconds', "Time spent in SQL queries by a request.", 'view')
+TEMPLATE_DURATION = Histogram('gameconnect_template_duration_seconds', "Time spent rendering templates by a request.",
+                              'view')
+EXTERNAL_DURATION = Histogram('gameconnect_external_duration_seconds',
+                              "Time spent calling external services by a request.", 'view')
+SERVICE_DURATION = Histogram('gameconnect_service_call_duration_seconds',
+                             "Duration of calls to external services, from requests and background jobs.", 'service')
+HISTOGRAMS = [REQUEST_DURATION, DB_QUERIES, DB_DURATION, TEMPLATE_DURATION, EXTERNAL_DURATION, SERVICE_DURATION]
+FRAGMENT_HITS = Counter('gameconnect_fragment_cache_hits_total', "Template fragments served from the cache.",
+                        'fragment')
+FRAGMENT_MISSES = Counter('gameconnect_fragment_cache_misses_total', "Template fragments rendered on a cache miss.",
+                          'fragment')
+COUNTERS = [FRAGMENT_HITS, FRAGMENT_MISSES]
+
+
+class RequestTimings:
+    """ Accumulates the durations (seconds) of one request. """
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.external = 0.0
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        """ A database execute wrapper counting and timing the queries. """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - started
+
+    def observe(self, view, total):
+        REQUEST_DURATION.observe(view, total)
+        DB_QUERIES.observe(view, self.queries)
+        DB_DURATION.observe(view, self.db)
+        TEMPLATE_DURATION.observe(view, self.template)
+        EXTERNAL_DURATION.observe(view, self.external)
+
+    def server_timing(self, total):
+        """ Returns the value of the Server-Timing header (durations in milliseconds). """
+        entries = [
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f"template;dur={self.template * 1000:.1f}",
+            f"external;dur={self.external * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ]
+        if self.fragment_hits or self.fragment_misses:
+            fragments = self.fragment_hits + self.fragment_misses
+            entries.append(f'fragments;desc="{self.fragment_hits}/{fragments} cached"')
+        return ", ".join(entries)
+
+
+@contextmanager
+def timed(kind):
+    """ Adds the duration of the block to the "template" or "external" time of the sampled request, if any. """
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(timings, kind, getattr(timings, kind) + time.perf_counter() - started)
+
+
+@contextmanager
+def external_call(service):
+    """ Times a call to an external service, for the service histogram and the current request. """
+    started = time.perf_counter()
+    try:
+        with timed('external'):
+            yield
+    finally:
+        SERVICE_DURATION.observe(service, time.perf_counter() - started)
+
+
+def fragment_cache(fragment, hits, misses):
+    """ Counts the cache hits and misses of a template fragment, for the counters and the current request. """
+    FRAGMENT_HITS.inc(fragment, hits)
+    FRAGMENT_MISSES.inc(fragment, misses)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.fragment_hits += hits
+        timings.fragment_misses += misses
+
+
+def render_metrics():
+    """ Returns every histogram and counter in the Prometheus text format. """
+    return "\n".join(line for metric in HISTOGRAMS + COUNTERS for line in metric.render()) + "\n"
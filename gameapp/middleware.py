@@ -0,0 +1,58 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from gameapp import auth
+from gameapp.metrics import RequestTimings, current_timings
+
+
+class PerformanceMiddleware:
+    """
+    Times a sample of the requests (PERF_SAMPLE_RATE) and records them per URL name in gameapp.metrics.
+
+    Sampled responses get a Server-Timing header with the database, template, external service and total
+    times. Put it first in MIDDLEWARE so the total covers the other middleware too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PERF_SAMPLE_RATE:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.record_query))
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        timings.observe(match.url_name or match.view_name if match else 'unresolved', total)
+        if settings.PERF_SERVER_TIMING:
+            response['Server-Timing'] = timings.server_timing(total)
+        return response
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware reading the user of the session from the cache (gameapp.auth) instead of the database.
+
+    Together with the gameapp.sessions backend a logged-in request runs no query before its view while both
+    are cached; with a process-local cache it reads the user like AuthenticationMiddleware.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: auth.get_user(request))
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gameapp', '0009_article_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exchangeoffer',
+            index=models.Index(condition=models.Q(('status', True)), fields=['-added', '-id'], name='offer_active_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangeoffer',
+            index=models.Index(condition=models.Q(('status', True)), fields=['game', '-added', '-id'], name='offer_active_game_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangeoffer',
+            index=models.Index(fields=['owner', 'status'], name='offer_owner_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-id'], name='notification_user_id_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gameapp', '0010_offer_and_notification_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutgoingEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255)),
+                ('from_email', models.CharField(max_length=254)),
+                ('to', models.CharField(max_length=254)),
+                ('text_content', models.TextField()),
+                ('html_content', models.TextField(blank=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent', models.DateTimeField(null=True)),
+                ('failed', models.BooleanField(default=False)),
+                ('added', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('failed', False), ('sent__isnull', True)), fields=['next_attempt', 'id'], name='outbox_pending_idx')],
+            },
+        ),
+    ]
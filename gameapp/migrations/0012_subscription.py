@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:08
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gameapp', '0011_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Subscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('status', models.CharField(choices=[('P', 'Pending'), ('S', 'Synced'), ('F', 'Failed')], default='P', max_length=1)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('added', models.DateTimeField(auto_now_add=True)),
+                ('synced', models.DateTimeField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'P')), fields=['next_attempt', 'id'], name='subscription_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:09
+
+import re
+
+from django.db import migrations, models
+
+
+def create_counters(apps, schema_editor):
+    """ Starts every counter after the highest suffix already used by an article slug. """
+    Article = apps.get_model('gameapp', 'Article')
+    SlugCounter = apps.get_model('gameapp', 'SlugCounter')
+
+    counters = {}
+    for slug in Article.objects.values_list('slug', flat=True).iterator():
+        counters[slug] = max(counters.get(slug, 0), 1)
+        match = re.match(r'^(.*)-(\d+)$', slug)
+        if match:
+            base, suffix = match.group(1), int(match.group(2))
+            counters[base] = max(counters.get(base, 0), suffix + 1)
+    SlugCounter.objects.bulk_create(
+        [SlugCounter(base=base, next_suffix=suffix) for base, suffix in counters.items()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gameapp', '0012_subscription'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlugCounter',
+            fields=[
+                ('base', models.SlugField(max_length=100, primary_key=True, serialize=False)),
+                ('next_suffix', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_stats(apps, schema_editor):
+    """ Computes the statistics of every game with active offers. """
+    ExchangeOffer = apps.get_model('gameapp', 'ExchangeOffer')
+    GameMarketStats = apps.get_model('gameapp', 'GameMarketStats')
+    counts = ExchangeOffer.objects.filter(status=True).values('game').annotate(
+        active_offers=models.Count('id'),
+        sell_offers=models.Count('id', filter=models.Q(offer_type="S")),
+        buy_offers=models.Count('id', filter=models.Q(offer_type="B")),
+        exchange_offers=models.Count('id', filter=models.Q(offer_type="E")),
+        newest_offer=models.Max('added'),
+    )
+    GameMarketStats.objects.bulk_create(
+        [GameMarketStats(game_id=row.pop('game'), **row) for row in counts], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gameapp', '0014_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameMarketStats',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='market_stats', serialize=False, to='gameapp.game')),
+                ('active_offers', models.PositiveIntegerField(default=0)),
+                ('sell_offers', models.PositiveIntegerField(default=0)),
+                ('buy_offers', models.PositiveIntegerField(default=0)),
+                ('exchange_offers', models.PositiveIntegerField(default=0)),
+                ('newest_offer', models.DateTimeField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('active_offers__gt', 0)), fields=['game'], name='market_stats_active_idx')],
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
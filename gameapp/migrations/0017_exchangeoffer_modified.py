@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gameapp', '0016_notification_unread_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exchangeoffer',
+            name='modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
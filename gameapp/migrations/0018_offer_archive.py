@@ -0,0 +1,67 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gameapp', '0017_exchangeoffer_modified'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedCustomerOffer',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('description', models.TextField()),
+                ('status', models.CharField(choices=[('P', 'Pending'), ('A', 'Accepted'), ('R', 'Rejected')], max_length=20)),
+                ('added', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedExchangeOffer',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('offer_type', models.CharField(choices=[('S', 'Sell'), ('E', 'Exchange'), ('B', 'Buy')], max_length=10)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('description', models.TextField()),
+                ('added', models.DateTimeField()),
+                ('modified', models.DateTimeField()),
+                ('archived', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='exchangeoffer',
+            index=models.Index(condition=models.Q(('status', False)), fields=['modified', 'id'], name='offer_closed_modified_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedexchangeoffer',
+            name='game',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='gameapp.game'),
+        ),
+        migrations.AddField(
+            model_name='archivedexchangeoffer',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedcustomeroffer',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedcustomeroffer',
+            name='exchange_offer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='gameapp.archivedexchangeoffer'),
+        ),
+        migrations.AddField(
+            model_name='archivedcustomeroffer',
+            name='game_name',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='gameapp.game'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:41
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gameapp', '0018_offer_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('status', True)), fields=['created', 'id'], name='notification_read_created_idx'),
+        ),
+    ]
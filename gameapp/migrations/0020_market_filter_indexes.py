@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gameapp', '0019_notification_created'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exchangeoffer',
+            index=models.Index(condition=models.Q(('status', True)), fields=['offer_type', '-added', '-id'], name='offer_active_type_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangeoffer',
+            index=models.Index(condition=models.Q(('status', True)), fields=['game', 'offer_type', '-added', '-id'], name='offer_active_gt_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangeoffer',
+            index=models.Index(condition=models.Q(('price__isnull', False), ('status', True)), fields=['price', 'id'], name='offer_active_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangeoffer',
+            index=models.Index(condition=models.Q(('price__isnull', False), ('status', True)), fields=['game', 'price', 'id'], name='offer_active_game_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangeoffer',
+            index=models.Index(condition=models.Q(('price__isnull', False), ('status', True)), fields=['offer_type', 'price', 'id'], name='offer_active_type_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangeoffer',
+            index=models.Index(condition=models.Q(('price__isnull', False), ('status', True)), fields=['game', 'offer_type', 'price', 'id'], name='offer_active_gt_price_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gameapp', '0020_market_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedexchangeoffer',
+            name='wanted_game',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gameapp.game'),
+        ),
+        migrations.AddField(
+            model_name='exchangeoffer',
+            name='wanted_game',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='wanted_by', to='gameapp.game'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangeoffer',
+            index=models.Index(condition=models.Q(('offer_type', 'E'), ('status', True)), fields=['game', 'wanted_game'], name='offer_active_swap_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gameapp', '0021_exchangeoffer_wanted_game'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GamePriceStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offer_type', models.CharField(choices=[('S', 'Sell'), ('E', 'Exchange'), ('B', 'Buy')], max_length=10)),
+                ('source', models.CharField(choices=[('L', 'Listed'), ('A', 'Accepted')], max_length=1)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('prices', models.JSONField(default=list)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_stats', to='gameapp.game')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='gamepricestats',
+            constraint=models.UniqueConstraint(fields=('game', 'offer_type', 'source'), name='price_stats_unique'),
+        ),
+    ]
@@ -1,5 +1,12 @@
-from django.db import models
+import itertools
+import math
+from collections import deque
+from decimal import Decimal
+
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth.models import User
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 from django.utils.text import slugify
 
 OFFER_TYPE_CHOICES = [
@@ -12,6 +19,20 @@ STATUS_CHOICES = [
     ("A", "Accepted"),
     ("R", "Rejected"),
 ]
+SEARCH_KIND_CHOICES = [
+    ("article", "Article"),
+    ("game", "Game"),
+    ("offer", "Offer"),
+]
+PRICE_SOURCE_CHOICES = [
+    ("L", "Listed"),
+    ("A", "Accepted"),
+]
+SUBSCRIPTION_STATUS_CHOICES = [
+    ("P", "Pending"),
+    ("S", "Synced"),
+    ("F", "Failed"),
+]
 
 
 class Game(models.Model):
@@ -56,15 +77,84 @@ class Article(models.Model):
     added = models.DateTimeField(auto_now_add=True)
 
     def save(self, *args, **kwargs):
-        """ Override the save method to generate a slug from the title and ensure uniqueness. """
-        if not self.slug:
-            self.slug = slugify(self.title)
-            if Article.objects.filter(slug=self.slug).exists():
-                suffix = 1
-                while Article.objects.filter(slug=self.slug).exists():
-                    self.slug = f"{slugify(self.title)}-{suffix}"
-                    suffix += 1
-        super().save(*args, **kwargs)
+        """ Override the save method to generate a slug from the title and ensure uniqueness.
+
+        The suffix is allocated by SlugCounter, so a new slug costs the same number of queries however many
+        articles share the title. The article is force-inserted, and if the slug was already taken outside
+        the counter (e.g. set by hand) the next suffix is tried. """
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        base = SlugCounter.base_for(self.title)
+        if not args:
+            kwargs['force_insert'] = True
+        while True:
+            self.slug = SlugCounter.slug_for(base, SlugCounter.allocate(base))
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if not Article.objects.filter(slug=self.slug).exists():
+                    self.slug = ""
+                    raise
+
+
+class SlugCounter(models.Model):
+    """
+    Model keeping the next free suffix of every article slug base.
+
+    Fields:
+    - base (SlugField): slugified article title
+    - next_suffix (PositiveIntegerField): suffix the next article with this base gets (0 means no suffix)
+    """
+    base = models.SlugField(max_length=100, primary_key=True)
+    next_suffix = models.PositiveIntegerField(default=0)
+
+    # leaves room for a "-<suffix>" within Article.slug's max_length
+    BASE_LENGTH = 90
+
+    @classmethod
+    def base_for(cls, title):
+        """ Returns the slug base of an article title. """
+        return slugify(title)[:cls.BASE_LENGTH]
+
+    @staticmethod
+    def slug_for(base, suffix):
+        """ Returns the slug for a base and an allocated suffix. """
+        return f"{base}-{suffix}" if suffix else base
+
+    @classmethod
+    def allocate(cls, base, count=1):
+        """ Reserves `count` consecutive suffixes of the base and returns the first one.
+
+        The counter row is incremented in place, which locks it until the surrounding transaction ends, so
+        concurrent writers always get disjoint suffixes. """
+        with transaction.atomic():
+            if not cls.objects.filter(base=base).update(next_suffix=models.F('next_suffix') + count):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(base=base, next_suffix=count)
+                    return 0
+                except IntegrityError:
+                    # another writer created the counter first
+                    cls.objects.filter(base=base).update(next_suffix=models.F('next_suffix') + count)
+            return cls.objects.get(base=base).next_suffix - count
+
+    @classmethod
+    def allocate_many(cls, counts):
+        """ Reserves suffixes for many bases at once, a fixed number of queries for any number of bases.
+
+        Takes a {base: count} dict and returns {base: first suffix}. The counters are created if missing,
+        read under a lock and moved forward with a single upsert. """
+        if not counts:
+            return {}
+        with transaction.atomic():
+            cls.objects.bulk_create([cls(base=base) for base in counts], ignore_conflicts=True)
+            first = dict(cls.objects.select_for_update().filter(base__in=counts).values_list('base', 'next_suffix'))
+            cls.objects.bulk_create(
+                [cls(base=base, next_suffix=suffix + counts[base]) for base, suffix in first.items()],
+                update_conflicts=True, unique_fields=['base'], update_fields=['next_suffix'])
+        return first
 
 
 class ExchangeOffer(models.Model):
@@ -75,18 +165,140 @@ class ExchangeOffer(models.Model):
     - owner (ForeignKey): Reference to the offer owner (User).
     - offer_type (CharField): Type of the offer (limited to choices).
     - game (ForeignKey): Reference to the game.
+    - wanted_game (ForeignKey): The game asked for in return, for Exchange offers (optional).
     - price (DecimalField): Price of the offer.
     - description (TextField): Description of the offer.
     - status (BooleanField): Offer status (defaulted to True).
     - added(DateTimeField): Timestamp when the offer was made.
+    - modified(DateTimeField): Version stamp of the offer's market card, moved on every save and when the
+      owner or the game is renamed.
     """
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
     offer_type = models.CharField(max_length=10, choices=OFFER_TYPE_CHOICES)
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    wanted_game = models.ForeignKey(Game, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='wanted_by')
     price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
     description = models.TextField()
     status = models.BooleanField(default=True)
     added = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # market feed: active offers, newest first, optionally narrowed to a game and an offer type
+            # (gt: game and offer type)
+            models.Index(fields=['-added', '-id'], condition=models.Q(status=True), name='offer_active_added_idx'),
+            models.Index(fields=['game', '-added', '-id'], condition=models.Q(status=True),
+                         name='offer_active_game_added_idx'),
+            models.Index(fields=['offer_type', '-added', '-id'], condition=models.Q(status=True),
+                         name='offer_active_type_added_idx'),
+            models.Index(fields=['game', 'offer_type', '-added', '-id'], condition=models.Q(status=True),
+                         name='offer_active_gt_added_idx'),
+            # market sorted by price, only offers with one (Exchange offers have none); also read backwards
+            models.Index(fields=['price', 'id'], condition=models.Q(status=True, price__isnull=False),
+                         name='offer_active_price_idx'),
+            models.Index(fields=['game', 'price', 'id'], condition=models.Q(status=True, price__isnull=False),
+                         name='offer_active_game_price_idx'),
+            models.Index(fields=['offer_type', 'price', 'id'], condition=models.Q(status=True, price__isnull=False),
+                         name='offer_active_type_price_idx'),
+            models.Index(fields=['game', 'offer_type', 'price', 'id'],
+                         condition=models.Q(status=True, price__isnull=False), name='offer_active_gt_price_idx'),
+            # matching: open Exchange offers by the game given and the game wanted in return
+            models.Index(fields=['game', 'wanted_game'], condition=models.Q(status=True, offer_type="E"),
+                         name='offer_active_swap_idx'),
+            # user page: active and closed offers of one owner
+            models.Index(fields=['owner', 'status'], name='offer_owner_status_idx'),
+            # archiving: closed offers, least recently changed first
+            models.Index(fields=['modified', 'id'], condition=models.Q(status=False), name='offer_closed_modified_idx'),
+        ]
+
+
+class GameMarketStats(models.Model):
+    """
+    Model keeping denormalized market statistics of a game, read by the market filter instead of aggregating offers.
+
+    Fields:
+    - game (OneToOneField): the game
+    - active_offers (PositiveIntegerField): number of active offers of the game
+    - sell_offers (PositiveIntegerField): number of active Sell offers
+    - buy_offers (PositiveIntegerField): number of active Buy offers
+    - exchange_offers (PositiveIntegerField): number of active Exchange offers
+    - newest_offer (DateTimeField): time the newest active offer was added
+
+    Kept up to date by offer_opened/offer_closed; drift from other writes is fixed by reconcile().
+    """
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, primary_key=True, related_name='market_stats')
+    active_offers = models.PositiveIntegerField(default=0)
+    sell_offers = models.PositiveIntegerField(default=0)
+    buy_offers = models.PositiveIntegerField(default=0)
+    exchange_offers = models.PositiveIntegerField(default=0)
+    newest_offer = models.DateTimeField(null=True)
+
+    TYPE_FIELDS = {"S": 'sell_offers', "B": 'buy_offers', "E": 'exchange_offers'}
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['game'], condition=models.Q(active_offers__gt=0), name='market_stats_active_idx'),
+        ]
+
+    @classmethod
+    def offer_opened(cls, offer):
+        """ Counts a new active offer in the statistics of its game. """
+        type_field = cls.TYPE_FIELDS[offer.offer_type]
+        changes = {
+            'active_offers': models.F('active_offers') + 1,
+            type_field: models.F(type_field) + 1,
+            'newest_offer': Greatest(Coalesce('newest_offer', models.Value(offer.added)), models.Value(offer.added)),
+        }
+        with transaction.atomic():
+            if cls.objects.filter(game_id=offer.game_id).update(**changes):
+                return
+            try:
+                with transaction.atomic():
+                    cls.objects.create(game_id=offer.game_id, active_offers=1, newest_offer=offer.added,
+                                       **{type_field: 1})
+            except IntegrityError:
+                # another writer created the row first
+                cls.objects.filter(game_id=offer.game_id).update(**changes)
+
+    @classmethod
+    def offer_closed(cls, offer):
+        """ Removes a closed offer from the statistics of its game, never counting below zero. """
+        type_field = cls.TYPE_FIELDS[offer.offer_type]
+        newest = ExchangeOffer.objects.filter(game_id=offer.game_id, status=True).order_by('-added', '-id')
+        # a drifted row (see reconcile) must not fail the positive constraint and abort the closing transaction
+        cls.objects.filter(game_id=offer.game_id).update(**{
+            'active_offers': Greatest(models.F('active_offers') - 1, models.Value(0)),
+            type_field: Greatest(models.F(type_field) - 1, models.Value(0)),
+            'newest_offer': models.Subquery(newest.values('added')[:1]),
+        })
+
+    @classmethod
+    def reconcile(cls):
+        """ Recomputes the statistics of every game from the offers, returning the number of corrected rows. """
+        counts = ExchangeOffer.objects.filter(status=True).values('game').annotate(
+            active_offers=models.Count('id'),
+            sell_offers=models.Count('id', filter=models.Q(offer_type="S")),
+            buy_offers=models.Count('id', filter=models.Q(offer_type="B")),
+            exchange_offers=models.Count('id', filter=models.Q(offer_type="E")),
+            newest_offer=models.Max('added'),
+        )
+        expected = {row.pop('game'): row for row in counts}
+        fields = ['active_offers', 'sell_offers', 'buy_offers', 'exchange_offers', 'newest_offer']
+        empty = dict.fromkeys(fields, 0) | {'newest_offer': None}
+
+        changed = []
+        for stats in cls.objects.all():
+            values = expected.pop(stats.game_id, empty)
+            if any(getattr(stats, field) != values[field] for field in fields):
+                for field in fields:
+                    setattr(stats, field, values[field])
+                changed.append(stats)
+        cls.objects.bulk_update(changed, fields, batch_size=1000)
+        cls.objects.bulk_create([cls(game_id=game_id, **values) for game_id, values in expected.items()],
+                                batch_size=1000)
+        return len(changed) + len(expected)
 
 
 class CustomerOffer(models.Model):
@@ -111,6 +323,167 @@ class CustomerOffer(models.Model):
     added = models.DateTimeField(auto_now_add=True)
 
 
+class GamePriceStats(models.Model):
+    """
+    Model keeping the recent prices of a game's offers of one type, read by the offer pages and the price API
+    instead of aggregating the offers.
+
+    Fields:
+    - game (ForeignKey): the game
+    - offer_type (CharField): type of the exchange offers
+    - source (CharField): "L" for the prices of the listed offers, "A" for the accepted customer offers on them
+    - count (PositiveIntegerField): number of prices ever recorded
+    - prices (JSONField): the latest WINDOW prices as strings, oldest first
+    - updated (DateTimeField): time the last price was recorded
+
+    Kept up to date by offer_listed/offer_accepted; rebuild() recomputes every row from the offers.
+    """
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='price_stats')
+    offer_type = models.CharField(max_length=10, choices=OFFER_TYPE_CHOICES)
+    source = models.CharField(max_length=1, choices=PRICE_SOURCE_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    prices = models.JSONField(default=list)
+    updated = models.DateTimeField(auto_now=True)
+
+    # the summaries cover this many latest prices
+    WINDOW = 200
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'offer_type', 'source'], name='price_stats_unique'),
+        ]
+
+    @staticmethod
+    def format_price(price):
+        return str(Decimal(price).quantize(Decimal("0.01")))
+
+    @classmethod
+    def record(cls, game_id, offer_type, source, price):
+        """ Adds a price to the window of the game, offer type and source, dropping the oldest beyond WINDOW.
+        The row is read under a lock, so concurrent prices are all kept. """
+        with transaction.atomic():
+            cls.objects.bulk_create([cls(game_id=game_id, offer_type=offer_type, source=source)],
+                                    ignore_conflicts=True)
+            stats = cls.objects.select_for_update().get(game_id=game_id, offer_type=offer_type, source=source)
+            stats.count += 1
+            stats.prices = (stats.prices + [cls.format_price(price)])[-cls.WINDOW:]
+            stats.save(update_fields=['count', 'prices', 'updated'])
+
+    @classmethod
+    def offer_listed(cls, offer):
+        """ Records the price of a new exchange offer, if it has one. """
+        if offer.price is not None:
+            cls.record(offer.game_id, offer.offer_type, "L", offer.price)
+
+    @classmethod
+    def offer_accepted(cls, offer, customer_offer):
+        """ Records the price of a customer offer accepted on an exchange offer, if it has one. """
+        if customer_offer.price is not None:
+            cls.record(offer.game_id, offer.offer_type, "A", customer_offer.price)
+
+    def summary(self):
+        """ Returns the number of recorded prices and the size, min, max, mean and quartiles of the window. """
+        prices = sorted(Decimal(price) for price in self.prices)
+        summary = {'offer_type': self.offer_type, 'source': self.source, 'count': self.count,
+                   'window': len(prices)}
+        if prices:
+            def rank(fraction):
+                return prices[max(0, math.ceil(fraction * len(prices)) - 1)]
+
+            summary |= {'min': prices[0], 'max': prices[-1],
+                        'mean': (sum(prices) / len(prices)).quantize(Decimal("0.01")),
+                        'p25': rank(0.25), 'median': rank(0.5), 'p75': rank(0.75)}
+        return summary
+
+    @classmethod
+    def of_game(cls, game_id, offer_type=None):
+        """ Returns the statistics of a game, optionally of one offer type, listed prices first. """
+        stats = cls.objects.filter(game_id=game_id)
+        if offer_type:
+            stats = stats.filter(offer_type=offer_type)
+        return stats.order_by('offer_type', '-source')
+
+    @classmethod
+    def summaries(cls, game_id, offer_type=None):
+        """ Returns the summaries of a game, optionally of one offer type, listed prices first. """
+        return [row.summary() for row in cls.of_game(game_id, offer_type)]
+
+    @classmethod
+    def rebuild(cls):
+        """ Recomputes the statistics of every game from the offers, returning the number of rows. """
+        listed = (ExchangeOffer.objects.filter(price__isnull=False).order_by('game_id', 'offer_type', 'id')
+                  .values_list('game_id', 'offer_type', 'price'))
+        accepted = (CustomerOffer.objects.filter(status="A", price__isnull=False)
+                    .order_by('exchange_offer__game_id', 'exchange_offer__offer_type', 'id')
+                    .values_list('exchange_offer__game_id', 'exchange_offer__offer_type', 'price'))
+        rows = []
+        for source, prices in (("L", listed), ("A", accepted)):
+            for (game_id, offer_type), group in itertools.groupby(prices.iterator(chunk_size=10000),
+                                                                  key=lambda row: row[:2]):
+                window, count = deque(maxlen=cls.WINDOW), 0
+                for *_, price in group:
+                    window.append(cls.format_price(price))
+                    count += 1
+                rows.append(cls(game_id=game_id, offer_type=offer_type, source=source, count=count,
+                                prices=list(window)))
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
+class ArchivedExchangeOffer(models.Model):
+    """
+    Model for closed exchange offers moved out of ExchangeOffer by the archive_offers command.
+
+    Fields:
+    - id (BigIntegerField): The id the offer had in ExchangeOffer.
+    - owner, offer_type, game, wanted_game, price, description, added, modified: Copied from the ExchangeOffer.
+    - archived (DateTimeField): Timestamp when the offer was archived.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    offer_type = models.CharField(max_length=10, choices=OFFER_TYPE_CHOICES)
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    wanted_game = models.ForeignKey(Game, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    description = models.TextField()
+    added = models.DateTimeField()
+    modified = models.DateTimeField()
+    archived = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def from_offer(cls, offer):
+        return cls(id=offer.id, owner_id=offer.owner_id, offer_type=offer.offer_type, game_id=offer.game_id,
+                   wanted_game_id=offer.wanted_game_id, price=offer.price, description=offer.description,
+                   added=offer.added, modified=offer.modified)
+
+
+class ArchivedCustomerOffer(models.Model):
+    """
+    Model for the customer offers of archived exchange offers.
+
+    Fields:
+    - id (BigIntegerField): The id the offer had in CustomerOffer.
+    - exchange_offer (ForeignKey): Reference to the archived exchange offer.
+    - customer, game_name, price, description, status, added: Copied from the CustomerOffer.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    exchange_offer = models.ForeignKey(ArchivedExchangeOffer, on_delete=models.CASCADE)
+    customer = models.ForeignKey(User, on_delete=models.CASCADE)
+    game_name = models.ForeignKey(Game, on_delete=models.CASCADE)
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    description = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    added = models.DateTimeField()
+
+    @classmethod
+    def from_offer(cls, offer):
+        return cls(id=offer.id, exchange_offer_id=offer.exchange_offer_id, customer_id=offer.customer_id,
+                   game_name_id=offer.game_name_id, price=offer.price, description=offer.description,
+                   status=offer.status, added=offer.added)
+
+
 class Notification(models.Model):
     """
     Model for customer made offers and owner's accepted offers notifications.
@@ -119,7 +492,119 @@ class Notification(models.Model):
     - user (ForeignKey): notification owner
     - description (TextField): notification content
     - status(BooleanField): notification status, shows whether user has seen it (defaulted to False)
+    - created (DateTimeField): Timestamp when the notification was created.
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     description = models.TextField()
     status = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='notification_user_id_idx'),
+            models.Index(fields=['user'], condition=models.Q(status=False), name='notification_unread_idx'),
+            # retention: read notifications, oldest first
+            models.Index(fields=['created', 'id'], condition=models.Q(status=True),
+                         name='notification_read_created_idx'),
+        ]
+
+
+class OutgoingEmail(models.Model):
+    """
+    Model for emails waiting in the outbox to be delivered by the send_outbox command.
+
+    Fields:
+    - subject (CharField): email subject
+    - from_email (CharField): sender address
+    - to (CharField): recipient address
+    - text_content (TextField): plain text body
+    - html_content (TextField): HTML alternative of the body (optional)
+    - attempts (PositiveSmallIntegerField): number of failed delivery attempts so far
+    - last_error (TextField): error of the last failed attempt
+    - next_attempt (DateTimeField): earliest time of the next delivery attempt
+    - sent (DateTimeField): time of the delivery, empty while the email is pending
+    - failed (BooleanField): set when the email ran out of delivery attempts
+    - added (DateTimeField): timestamp when the email was queued
+    """
+    subject = models.CharField(max_length=255)
+    from_email = models.CharField(max_length=254)
+    to = models.CharField(max_length=254)
+    text_content = models.TextField()
+    html_content = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    sent = models.DateTimeField(null=True)
+    failed = models.BooleanField(default=False)
+    added = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt', 'id'], condition=models.Q(sent__isnull=True, failed=False),
+                         name='outbox_pending_idx'),
+        ]
+
+
+class Subscription(models.Model):
+    """
+    Model for newsletter subscriptions waiting to be synced to the Mailchimp list by the sync_subscriptions command.
+
+    Fields:
+    - email (EmailField): subscribed email address, stored once
+    - status (CharField): sync status (defaulted to Pending)
+    - attempts (PositiveSmallIntegerField): number of failed sync attempts so far
+    - last_error (TextField): error of the last failed attempt
+    - next_attempt (DateTimeField): earliest time of the next sync attempt
+    - added (DateTimeField): timestamp when the email was subscribed
+    - synced (DateTimeField): time the email was added to the Mailchimp list
+    """
+    email = models.EmailField(unique=True)
+    status = models.CharField(max_length=1, default="P", choices=SUBSCRIPTION_STATUS_CHOICES)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    added = models.DateTimeField(auto_now_add=True)
+    synced = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt', 'id'], condition=models.Q(status="P"), name='subscription_pending_idx'),
+        ]
+
+
+class SearchDocument(models.Model):
+    """
+    Model for an object indexed by the search engine in gameapp.search.
+
+    Fields:
+    - kind (CharField): type of the indexed object (limited to choices)
+    - object_key (CharField): primary key of the indexed object as text
+    - length (PositiveIntegerField): weighted number of terms of the document, used for ranking
+    """
+    kind = models.CharField(max_length=10, choices=SEARCH_KIND_CHOICES)
+    object_key = models.CharField(max_length=100)
+    length = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_key'], name='search_document_unique'),
+        ]
+
+
+class SearchPosting(models.Model):
+    """
+    Model for an entry of the inverted search index: a term occurring in a document.
+
+    Fields:
+    - term (CharField): normalized term
+    - document (ForeignKey): document containing the term
+    - frequency (PositiveIntegerField): weighted number of occurrences of the term in the document
+    """
+    term = models.CharField(max_length=50)
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name='postings')
+    frequency = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'document', 'frequency'], name='search_posting_term_idx'),
+        ]
@@ -0,0 +1,103 @@
+"""
+Creation of notifications and the cached per-user unread counters shown on every page.
+
+All notification writes go through these helpers (or call invalidate_unread themselves), so the counter of
+a user is dropped whenever their notifications change and recomputed from the unread index on the next read.
+New notifications are also published to gameapp.realtime for the open notification streams. Old ones are
+deleted by purge_notifications according to the retention settings.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from gameapp.models import Notification
+from gameapp.realtime import get_hub, notification_event
+
+
+def unread_key(user_id):
+    return f"notifications:unread:{user_id}"
+
+
+def unread_count(user_id):
+    """ Returns the number of unread notifications of a user, counting them only on a cache miss. """
+    count = cache.get(unread_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, status=False).count()
+        cache.set(unread_key(user_id), count, settings.NOTIFICATION_COUNT_TIMEOUT)
+    return count
+
+
+def invalidate_unread(*user_ids):
+    """ Drops the cached unread counters of the users once the transaction commits; dropped earlier, a
+    concurrent read could count the rows not committed yet and cache the stale count again. """
+    keys = [unread_key(user_id) for user_id in set(user_ids)]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def notify(user, description):
+    """ Creates a notification for a user. """
+    return notify_many([(user.pk, description)])[0]
+
+
+def notify_many(entries):
+    """ Creates notifications from (user id, description) pairs with a single bulk insert.
+    They are pushed to the open streams of their users once the transaction commits. """
+    notifications = Notification.objects.bulk_create(
+        Notification(user_id=user_id, description=description) for user_id, description in entries)
+    invalidate_unread(*(notification.user_id for notification in notifications))
+    transaction.on_commit(lambda: publish(notifications))
+    return notifications
+
+
+def publish(notifications):
+    """ Pushes the notifications to the hub. """
+    hub = get_hub()
+    for notification in notifications:
+        hub.publish(notification.user_id, notification_event(notification))
+
+
+def delete_batches(queryset, batch_size, pause=0.0):
+    """ Deletes the rows of an ordered queryset `batch_size` at a time, each batch by primary key in its own
+    statement, and returns the number deleted. """
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Notification.objects.filter(id__in=ids).delete()[0]
+        if pause:
+            time.sleep(pause)
+
+
+def purge_notifications(retention_days, max_per_user, batch_size=1000, pause=0.0):
+    """
+    Deletes the read notifications created more than `retention_days` ago, then the oldest notifications of
+    every user beyond their newest `max_per_user` (all of them for 0). Returns the numbers of (expired, over the
+    cap) rows deleted.
+
+    Every batch is a short DELETE found through an index (the read-by-creation index, or the per-user one),
+    so writers are never blocked for long; `pause` seconds between batches leave them room on busy databases.
+    """
+    if max_per_user < 0:
+        raise ValueError("max_per_user must not be negative")
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    expired = delete_batches(
+        Notification.objects.filter(status=True, created__lt=cutoff).order_by('created', 'id'), batch_size, pause)
+
+    over_cap = 0
+    users = (Notification.objects.values('user_id').annotate(count=Count('id')).filter(count__gt=max_per_user)
+             .values_list('user_id', flat=True))
+    for user_id in list(users):
+        notifications = Notification.objects.filter(user_id=user_id).order_by('id')
+        if max_per_user:
+            oldest_kept = notifications.order_by('-id').values_list('id', flat=True)[max_per_user - 1]
+            notifications = notifications.filter(id__lt=oldest_kept)
+        over_cap += delete_batches(notifications, batch_size, pause)
+        # the cap also removes unread notifications
+        invalidate_unread(user_id)
+    return expired, over_cap
@@ -0,0 +1,56 @@
+"""
+Closing an exchange offer by accepting one of its customer offers.
+
+The acceptance is one transaction whose queries do not grow with the bids of the listing (apart from the
+batches of the notification insert on SQLite). It starts with a conditional UPDATE that closes the offer
+only while it is still open: the row lock it takes makes a concurrent acceptance wait, and once it may
+proceed its UPDATE matches no row, so only one of them succeeds.
+"""
+from django.db import transaction
+from django.db.models import Case, When, Value
+from django.utils import timezone
+
+from gameapp import search
+from gameapp.cache import invalidate
+from gameapp.mail import queue_email
+from gameapp.models import ExchangeOffer, CustomerOffer, GameMarketStats, GamePriceStats
+from gameapp.notifications import notify_many
+
+
+def accept_offer(offer_id, owner_id, customer_offer_id):
+    """
+    Accepts a customer offer and rejects every other one made to the owner's open exchange offer.
+
+    Returns the accepted CustomerOffer, or None when the offer is not open, not owned by the user or the
+    customer offer was not made to it; nothing is changed then.
+    """
+    with transaction.atomic():
+        closed = ExchangeOffer.objects.filter(id=offer_id, owner_id=owner_id, status=True).update(
+            status=False, modified=timezone.now())
+        if not closed:
+            return None
+        accepted = CustomerOffer.objects.select_related('customer').filter(
+            id=customer_offer_id, exchange_offer_id=offer_id).first()
+        if accepted is None:
+            transaction.set_rollback(True)
+            return None
+
+        bids = CustomerOffer.objects.filter(exchange_offer_id=offer_id)
+        bids.update(status=Case(When(id=accepted.id, then=Value("A")), default=Value("R")))
+        rejected = (bids.exclude(customer_id=accepted.customer_id).order_by('customer_id')
+                    .values_list('customer_id', flat=True).distinct())
+
+        offer = ExchangeOffer.objects.select_related('game', 'owner').get(id=offer_id)
+        offer_details = offer.get_offer_type_display() + "-" + str(offer.game)
+        notification = (f"User {offer.owner.username} has accepted your offer for {offer_details}. Please "
+                        f"reach out ot them via email {offer.owner.email}")
+        rejection = f"Your offer for {offer_details} was not accepted, the listing is closed."
+        notify_many([(accepted.customer_id, notification)] + [(customer_id, rejection) for customer_id in rejected])
+        queue_email("You offer was accepted", notification, accepted.customer.email)
+
+        # the UPDATE bypasses the post_save handlers, so the derived data is refreshed here
+        GameMarketStats.offer_closed(offer)
+        GamePriceStats.offer_accepted(offer, accepted)
+        search.remove_object(offer)
+        invalidate('main_page')
+    return accepted
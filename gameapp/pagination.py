@@ -0,0 +1,141 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    """ Raised when a pagination cursor cannot be decoded. """
+
+
+def encode_cursor(values):
+    """ Encodes the ordering key values of a row into an opaque, URL-safe cursor. """
+    serialized = []
+    for value in values:
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        serialized.append(value)
+    raw = json.dumps(serialized, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """ Decodes a cursor produced by encode_cursor, checking it carries `size` key values. """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(cursor)
+    return values
+
+
+class KeysetPage:
+    """
+    A single page of results produced by KeysetPaginator.
+
+    Exposes the same has_next/has_previous interface as Django's Page, plus the cursors
+    needed to request the neighbouring pages.
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset by seeking on its ordering key instead of using OFFSET.
+
+    `ordering` lists the model fields of the key, most significant first, with a leading "-"
+    for descending fields; the last field must be unique (normally the primary key) so that
+    every row has a distinct position. Every page is fetched with one LIMIT query that starts
+    right after (or before) the cursor row, so page N costs the same as page 1 and no COUNT
+    is ever issued.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-added', '-id')):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+
+    def page(self, after=None, before=None):
+        """ Returns the page following the `after` cursor, preceding the `before` cursor, or the first page. """
+        if before:
+            rows = self._fetch(before, backwards=True)
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            previous_cursor = self._cursor(rows[0]) if has_more and rows else None
+            next_cursor = self._cursor(rows[-1]) if rows else None
+        else:
+            rows = self._fetch(after, backwards=False)
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            next_cursor = self._cursor(rows[-1]) if has_more else None
+            previous_cursor = self._cursor(rows[0]) if after and rows else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def _fetch(self, cursor, backwards):
+        ordering = self.ordering
+        if backwards:
+            ordering = tuple(field[1:] if field.startswith('-') else f"-{field}" for field in ordering)
+        queryset = self.queryset.order_by(*ordering)
+        if cursor:
+            values = decode_cursor(cursor, len(self.fields))
+            try:
+                queryset = queryset.filter(self._seek(ordering, values))
+            except (TypeError, ValueError, ValidationError):
+                raise InvalidCursor(cursor)
+        return list(queryset[:self.per_page + 1])
+
+    def _seek(self, ordering, values):
+        """ Builds the row-value comparison "key after cursor" for the given ordering. """
+        condition = Q()
+        for position, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            term = Q(**{f"{name}__{lookup}": values[position]})
+            for previous, value in zip(self.fields[:position], values):
+                term &= Q(**{previous: value})
+            condition |= term
+        return condition
+
+    def _cursor(self, obj):
+        if isinstance(obj, dict):
+            return encode_cursor([obj[field] for field in self.fields])
+        return encode_cursor([getattr(obj, field) for field in self.fields])
+
+
+def cursor_query(params, direction, cursor):
+    """ Builds the query string of a neighbouring page from the current one, keeping its other parameters. """
+    if cursor is None:
+        return None
+    params = params.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+    params[direction] = cursor
+    return params.urlencode()
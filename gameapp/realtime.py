@@ -0,0 +1,145 @@
+"""
+Pushing new notifications to the browsers of their users.
+
+Open notification streams subscribe to a hub with their user id and wait on an asyncio queue, so a worker
+serving the ASGI application holds thousands of idle streams on its event loop without a thread each.
+gameapp.notifications publishes every committed notification to the hub selected by NOTIFICATION_HUB:
+
+- InProcessHub delivers to the streams of the current process only, enough for a single worker.
+- BrokerHub relays the events through the `notification_broker` command, which fans every event out to
+  all connected workers, so a user is reached whichever worker holds their stream.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import socket
+import threading
+import time
+from collections import defaultdict
+from queue import Full, Queue
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# events waiting for a slow stream beyond this are dropped; the browser catches up with Last-Event-ID
+QUEUE_SIZE = 100
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+class InProcessHub:
+    """ Delivers events published from any thread to the streams subscribed in this process. """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, user_id):
+        """ Yields a queue receiving the events of the user until the block exits. """
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(QUEUE_SIZE))
+        with self._lock:
+            self._subscribers[user_id].add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers[user_id].discard(subscriber)
+                if not self._subscribers[user_id]:
+                    del self._subscribers[user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_id, event):
+        """ Queues the event for every stream of the user. Safe to call from any thread. """
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, event)
+            except RuntimeError:
+                # the loop of a stream that is shutting down
+                pass
+
+    @staticmethod
+    def _put(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+
+class BrokerHub(InProcessHub):
+    """
+    Publishes events to the notification broker and delivers the events it relays to the local streams.
+
+    Published events go to a bounded outbox that a sender thread writes to the broker, so publishing never
+    blocks the request; events beyond `outbox_size` are dropped while the broker is slow or unreachable.
+    A listener thread keeps the broker connection, reconnecting when it drops.
+    """
+    reconnect_delay = 1
+    outbox_size = 1000
+
+    def __init__(self, address=None):
+        super().__init__()
+        self.address = address or tuple(settings.NOTIFICATION_BROKER_ADDRESS)
+        self._socket = None
+        self._connected = threading.Event()
+        self._outbox = Queue(self.outbox_size)
+        threading.Thread(target=self._listen, name="notification-broker", daemon=True).start()
+        threading.Thread(target=self._send, name="notification-broker-sender", daemon=True).start()
+
+    def publish(self, user_id, event):
+        line = json.dumps({'user': user_id, 'event': event}, separators=(',', ':')) + "\n"
+        try:
+            self._outbox.put_nowait(line.encode())
+        except Full:
+            logger.warning("Notification broker outbox full, dropping an event for user %s", user_id)
+
+    def _send(self):
+        while True:
+            message = self._outbox.get()
+            self._connected.wait()
+            try:
+                self._socket.sendall(message)
+            except OSError:
+                logger.warning("Notification broker unreachable, dropping an event")
+
+    def _listen(self):
+        while True:
+            try:
+                with socket.create_connection(self.address) as connection:
+                    self._socket = connection
+                    self._connected.set()
+                    for line in connection.makefile(encoding='utf-8'):
+                        message = json.loads(line)
+                        InProcessHub.publish(self, message['user'], message['event'])
+            except OSError:
+                pass
+            self._connected.clear()
+            time.sleep(self.reconnect_delay)
+
+
+def get_hub():
+    """ Returns the hub of this process, created from the NOTIFICATION_HUB setting on first use. """
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = import_string(settings.NOTIFICATION_HUB)()
+        return _hub
+
+
+def notification_event(notification):
+    """ Serializes a notification for the stream. """
+    return {'id': notification.id, 'description': notification.description}
+
+
+def format_event(event):
+    """ Formats an event as a server-sent event whose id lets the browser resume after it. """
+    return f"id: {event['id']}\nevent: notification\ndata: {json.dumps(event)}\n\n"
@@ -0,0 +1,199 @@
+"""
+Full-text search over articles, games and active market offers.
+
+Every searchable object is stored as a SearchDocument with one SearchPosting per distinct term, forming an
+inverted index that is kept up to date by the signal handlers in gameapp.signals. A query reads only the
+posting lists of its own terms (through the (term, document) index) and the database ranks the documents with
+BM25, returning only the best ones.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Avg, Case, Count, FloatField, Sum, Value, When
+from django.db.models.functions import Cast
+
+from gameapp.models import Article, Game, ExchangeOffer, SearchDocument, SearchPosting
+
+TITLE_WEIGHT = 3
+MAX_TERM_LENGTH = 50
+# terms found in more than this share of the documents carry little ranking signal and are skipped, unless they
+# are in at most COMMON_TERM_MIN_DOCUMENTS documents: such short posting lists are cheap to rank and, in a small
+# index where every term is "common", skipping them would drop words of the query
+COMMON_TERM_RATIO = 0.05
+COMMON_TERM_MIN_DOCUMENTS = 1000
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "or", "the",
+    "to", "with",
+}
+KIND_MODELS = {'article': Article, 'game': Game, 'offer': ExchangeOffer}
+STATS_CACHE_KEY = 'search:stats'
+STATS_CACHE_TIMEOUT = 300
+
+
+def tokenize(text):
+    """ Splits text into lowercase terms, dropping stop words and single characters. """
+    return [term[:MAX_TERM_LENGTH] for term in re.findall(r"\w+", text.lower())
+            if len(term) > 1 and term not in STOP_WORDS]
+
+
+def document_for(obj):
+    """ Returns the (kind, key, title, body) of an object, or None when it should not be searchable. """
+    if isinstance(obj, Article):
+        return 'article', obj.slug, obj.title, f"{obj.summary} {obj.content}"
+    if isinstance(obj, Game):
+        return 'game', str(obj.pk), obj.name, obj.description
+    if isinstance(obj, ExchangeOffer):
+        if not obj.status:
+            return None
+        return 'offer', str(obj.pk), "", obj.description
+    raise TypeError(f"{type(obj).__name__} is not searchable")
+
+
+def kind_of(obj):
+    """ Returns the search kind of a model instance. """
+    for kind, model in KIND_MODELS.items():
+        if isinstance(obj, model):
+            return kind
+    raise TypeError(f"{type(obj).__name__} is not searchable")
+
+
+def term_frequencies(title, body):
+    """ Counts the terms of a document, weighting the title terms. """
+    frequencies = Counter(tokenize(body))
+    for term in tokenize(title):
+        frequencies[term] += TITLE_WEIGHT
+    return frequencies
+
+
+def index_objects(objects):
+    """
+    Adds or replaces the documents of the objects in the index, with a fixed number of queries.
+
+    Objects that are not searchable any more (closed offers) are removed from the index.
+    """
+    documents = {}
+    for obj in objects:
+        key = (kind_of(obj), str(obj.pk))
+        documents[key] = document_for(obj)
+
+    remove_documents(documents)
+    entries = {key: term_frequencies(document[2], document[3]) for key, document in documents.items() if document}
+    if not entries:
+        return
+    created = SearchDocument.objects.bulk_create(
+        SearchDocument(kind=kind, object_key=key, length=sum(frequencies.values()))
+        for (kind, key), frequencies in entries.items())
+    SearchPosting.objects.bulk_create(
+        (SearchPosting(term=term, document=document, frequency=frequency)
+         for document, frequencies in zip(created, entries.values())
+         for term, frequency in frequencies.items()),
+        batch_size=5000)
+
+
+def index_object(obj):
+    """ Adds or replaces the document of one object in the index. """
+    index_objects([obj])
+
+
+def remove_documents(keys):
+    """ Removes the documents with the given (kind, key) pairs from the index. """
+    by_kind = defaultdict(list)
+    for kind, key in keys:
+        by_kind[kind].append(key)
+    for kind, object_keys in by_kind.items():
+        SearchDocument.objects.filter(kind=kind, object_key__in=object_keys).delete()
+
+
+def remove_object(obj):
+    """ Removes the document of one object from the index. """
+    remove_documents([(kind_of(obj), str(obj.pk))])
+
+
+def index_stats():
+    """ Returns the number of documents and their average length, cached as they only drift slowly. """
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = SearchDocument.objects.aggregate(count=Count('id'), average_length=Avg('length'))
+        stats['average_length'] = stats['average_length'] or 1.0
+        cache.set(STATS_CACHE_KEY, stats, STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def search(query, kinds=None, limit=20):
+    """
+    Returns up to `limit` (score, kind, object) tuples matching any term of the query, best first.
+
+    `kinds` optionally restricts the results to some of "article", "game" and "offer".
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+    stats = index_stats()
+    total = max(stats['count'], 1)
+
+    frequencies = dict(SearchPosting.objects.filter(term__in=terms).values_list('term')
+                       .annotate(documents=Count('id')).values_list('term', 'documents'))
+    cutoff = max(total * COMMON_TERM_RATIO, COMMON_TERM_MIN_DOCUMENTS)
+    useful = {term for term, documents in frequencies.items() if documents <= cutoff}
+    # a query made only of very common terms of a large index still has to match something: it is ranked by its
+    # rarest term
+    terms = useful or set(sorted(frequencies, key=frequencies.get)[:1])
+    if not terms:
+        return []
+
+    postings = SearchPosting.objects.filter(term__in=terms)
+    if kinds:
+        postings = postings.filter(document__kind__in=kinds)
+    # BM25 is summed per document and ranked by the database, which returns only the best `limit` documents
+    idf = Case(*[When(term=term, then=Value(math.log(1 + (total - documents + 0.5) / (documents + 0.5))))
+                 for term, documents in frequencies.items() if term in terms], output_field=FloatField())
+    frequency = Cast('frequency', FloatField())
+    norm = frequency + K1 * (1 - B) + K1 * B / stats['average_length'] * Cast('document__length', FloatField())
+    ranked = (postings.values('document_id', 'document__kind', 'document__object_key')
+              .annotate(score=Sum(idf * frequency * (K1 + 1) / norm))
+              .order_by('-score', 'document_id')[:limit])
+    return load_results([(row['score'], row['document__kind'], row['document__object_key']) for row in ranked])
+
+
+def load_results(ranked):
+    """ Replaces the (score, kind, key) tuples with (score, kind, object), one query per kind. """
+    keys = defaultdict(list)
+    for _, kind, key in ranked:
+        keys[kind].append(key)
+    objects = {}
+    for kind, object_keys in keys.items():
+        queryset = KIND_MODELS[kind].objects.filter(pk__in=object_keys)
+        if kind == 'offer':
+            queryset = queryset.select_related('game', 'owner')
+        objects.update({(kind, str(obj.pk)): obj for obj in queryset})
+    return [(score, kind, objects[(kind, key)]) for score, kind, key in ranked if (kind, key) in objects]
+
+
+def rebuild_index(chunk_size=1000):
+    """ Drops the whole index and indexes every searchable object again. Returns the number of documents. """
+    # postings have no dependents, so Django deletes them with one DELETE
+    SearchPosting.objects.all().delete()
+    # QuerySet.delete() would load every document to cascade to the postings, which are already gone
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {connection.ops.quote_name(SearchDocument._meta.db_table)}")
+    cache.delete(STATS_CACHE_KEY)
+    querysets = [Article.objects.all(), Game.objects.all(), ExchangeOffer.objects.filter(status=True)]
+    indexed = 0
+    for queryset in querysets:
+        chunk = []
+        for obj in queryset.order_by('pk').iterator(chunk_size=chunk_size):
+            chunk.append(obj)
+            if len(chunk) == chunk_size:
+                index_objects(chunk)
+                indexed += len(chunk)
+                chunk = []
+        index_objects(chunk)
+        indexed += len(chunk)
+    return indexed
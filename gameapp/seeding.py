@@ -0,0 +1,150 @@
+"""
+Deterministic generation of realistic data volumes, for the benchmarks and the `seed` command.
+
+The same arguments always produce the same rows. Popularity is skewed like real traffic: the chance of a
+game being picked for an offer (and of a user making one) falls with its rank as 1 / rank ** skew. Rows are
+written with bulk_create in batches, holding only the ids of the created rows in memory, and the derived
+data (market and price statistics, search index, cached pages) is rebuilt at the end because bulk writes
+skip the model signals. Seeded users can log in with SEED_PASSWORD.
+"""
+import itertools
+import random
+import time
+from array import array
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from gameapp import search
+from gameapp.cache import invalidate
+from gameapp.catalogue import chunks, assign_slugs
+from gameapp.models import Game, Article, ExchangeOffer, CustomerOffer, Notification, GameMarketStats, \
+    GamePriceStats, OFFER_TYPE_CHOICES
+
+SEED_PASSWORD = "seed-password"
+USERNAME_PREFIX = "seed-user-"
+WORDS = (
+    "rare", "boxed", "sealed", "mint", "complete", "edition", "collector", "deluxe", "classic", "retro", "console",
+    "cartridge", "disc", "manual", "steelbook", "bundle", "digital", "code", "limited", "signed", "import",
+    "region", "free", "used", "scratched", "pristine", "swap", "trade", "shipping", "local", "pickup", "quest",
+    "dungeon", "racing", "shooter", "strategy", "puzzle", "arcade", "platformer", "adventure", "multiplayer",
+    "campaign", "expansion", "season", "pass", "soundtrack", "artbook", "figure", "controller", "preorder",
+)
+
+
+def popularity(count, skew):
+    """ Returns cumulative weights picking rank r with a probability proportional to 1 / (r + 1) ** skew. """
+    return list(itertools.accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+def text(rng, words=12):
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+def seed(users=1000, games=1000, articles=1000, offers=10000, customer_offers=50000, notifications=100000,
+         inactive_share=0.3, popularity_skew=1.0, read_share=0.7, offer_type_weights=None, random_seed=0,
+         batch_size=10000, index=True, log=None):
+    """
+    Seeds the given numbers of rows and returns {table: (rows, seconds)}.
+
+    `inactive_share` of the offers are closed, with one accepted and otherwise rejected customer offers;
+    bids on open offers are pending. `offer_type_weights` maps the offer types to their relative frequency
+    (equal by default). `read_share` of the notifications are read. With `index` False the search index is
+    left for rebuild_search_index. `log` is called with a progress message per table.
+    """
+    rng = random.Random(random_seed)
+    log = log or (lambda message: None)
+    timings = {}
+
+    def create(name, model, objects):
+        """ Inserts the objects in batches, returning their ids. """
+        started = time.monotonic()
+        # articles are keyed by their slug
+        ids = [] if model is Article else array('q')
+        for batch in chunks(objects, batch_size):
+            with transaction.atomic():
+                if model is Article:
+                    assign_slugs(batch)
+                ids.extend(obj.pk for obj in model.objects.bulk_create(batch))
+        elapsed = time.monotonic() - started
+        timings[name] = (len(ids), round(elapsed, 2))
+        log(f"{name}: {len(ids)} rows in {elapsed:.2f}s ({len(ids) / elapsed if elapsed else 0:.0f} rows/s)")
+        return ids
+
+    # names continue after earlier seeding runs, so seeding can be repeated on the same database
+    first = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+    password = make_password(SEED_PASSWORD)
+    user_ids = create('users', User, (
+        User(username=f"{USERNAME_PREFIX}{first + i}", email=f"{USERNAME_PREFIX}{first + i}@example.com",
+             password=password) for i in range(users)))
+    first = Game.objects.filter(name__startswith="Seed game ").count()
+    game_ids = create('games', Game, (
+        Game(name=f"Seed game {first + i}", description=text(rng, 30)) for i in range(games)))
+    # the short texts of the large tables are drawn from a pool, building each one is slower than its insert
+    descriptions = [text(rng) for _ in range(1000)]
+    user_weights = popularity(len(user_ids), popularity_skew)
+    game_weights = popularity(len(game_ids), popularity_skew)
+
+    def pick(ids, weights, count):
+        """ Yields `count` ids picked by popularity, drawn in batches to bound memory. """
+        for start in range(0, count, batch_size):
+            yield from rng.choices(ids, cum_weights=weights, k=min(batch_size, count - start))
+
+    create('articles', Article, (
+        Article(game_id=game_id, title=f"Seed article {text(rng, 3)}", summary=text(rng), content=text(rng, 200))
+        for game_id in pick(game_ids, game_weights, articles)))
+
+    offer_type_weights = offer_type_weights or {offer_type: 1 for offer_type, _ in OFFER_TYPE_CHOICES}
+    offer_types = list(offer_type_weights)
+    type_weights = list(itertools.accumulate(offer_type_weights.values()))
+    closed = bytearray(1 if rng.random() < inactive_share else 0 for _ in range(offers))
+
+    def price(offer_type):
+        return None if offer_type == "E" else Decimal(rng.randint(500, 8000)) / 100
+
+    def offer_rows():
+        for position, (owner_id, game_id, offer_type) in enumerate(zip(
+                pick(user_ids, user_weights, offers), pick(game_ids, game_weights, offers),
+                pick(offer_types, type_weights, offers))):
+            # exchange offers ask for a game picked by popularity too
+            wanted_game_id = rng.choices(game_ids, cum_weights=game_weights)[0] if offer_type == "E" else None
+            yield ExchangeOffer(owner_id=owner_id, offer_type=offer_type, game_id=game_id,
+                                wanted_game_id=wanted_game_id, price=price(offer_type),
+                                description=rng.choice(descriptions), status=not closed[position])
+
+    offer_ids = create('offers', ExchangeOffer, offer_rows())
+    offer_weights = popularity(len(offer_ids), popularity_skew)
+    accepted = bytearray(len(offer_ids))
+
+    def customer_offer_rows():
+        for position, customer_id, game_id in zip(pick(range(len(offer_ids)), offer_weights, customer_offers),
+                                                  pick(user_ids, user_weights, customer_offers),
+                                                  pick(game_ids, game_weights, customer_offers)):
+            if not closed[position]:
+                status = "P"
+            elif not accepted[position]:
+                status = "A"
+                accepted[position] = 1
+            else:
+                status = "R"
+            yield CustomerOffer(exchange_offer_id=offer_ids[position], customer_id=customer_id, game_name_id=game_id,
+                                price=price("S"), description=rng.choice(descriptions), status=status)
+
+    if offer_ids:
+        create('customer_offers', CustomerOffer, customer_offer_rows())
+    create('notifications', Notification, (
+        Notification(user_id=user_id, description=f"New offer was made to Your listing {rng.choice(descriptions)}",
+                     status=rng.random() < read_share)
+        for user_id in pick(user_ids, user_weights, notifications)))
+
+    started = time.monotonic()
+    GameMarketStats.reconcile()
+    GamePriceStats.rebuild()
+    if index:
+        search.rebuild_index()
+    invalidate('main_page')
+    timings['derived'] = (0, round(time.monotonic() - started, 2))
+    log(f"market and price statistics{' and search index' if index else ''} in {time.monotonic() - started:.2f}s")
+    return timings
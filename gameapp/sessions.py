@@ -0,0 +1,35 @@
+"""
+The session backend of the authentication fast path (SESSION_ENGINE = 'gameapp.sessions').
+
+Sessions are cached like with django.contrib.sessions.backends.cached_db when SESSION_CACHE_ALIAS is shared by
+the workers, and only kept in the database otherwise, see gameapp.auth.
+"""
+from django.contrib.sessions.backends import cached_db, db
+
+from gameapp.cache import is_shared
+
+
+class SessionStore(cached_db.SessionStore):
+    """ cached_db sessions that skip a process-local cache. """
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self.cached = is_shared(self._cache)
+
+    def load(self):
+        return super().load() if self.cached else db.SessionStore.load(self)
+
+    def exists(self, session_key):
+        return super().exists(session_key) if self.cached else db.SessionStore.exists(self, session_key)
+
+    def save(self, must_create=False):
+        if self.cached:
+            super().save(must_create)
+        else:
+            db.SessionStore.save(self, must_create)
+
+    def delete(self, session_key=None):
+        if self.cached:
+            super().delete(session_key)
+        else:
+            db.SessionStore.delete(self, session_key)
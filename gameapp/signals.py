@@ -0,0 +1,64 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from gameapp import search
+from gameapp.auth import forget_user
+from gameapp.cache import invalidate
+from gameapp.models import Article, Game, ExchangeOffer
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=Game)
+@receiver(post_save, sender=ExchangeOffer)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """ Re-indexes a searchable object after every save (closed offers are dropped from the index). """
+    if not raw:
+        search.index_object(instance)
+
+
+@receiver(post_delete, sender=Article)
+@receiver(post_delete, sender=Game)
+@receiver(post_delete, sender=ExchangeOffer)
+def remove_from_search_index(sender, instance, **kwargs):
+    """ Removes a deleted object from the search index. """
+    search.remove_object(instance)
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=Game)
+@receiver(post_save, sender=ExchangeOffer)
+@receiver(post_delete, sender=Article)
+@receiver(post_delete, sender=Game)
+@receiver(post_delete, sender=ExchangeOffer)
+def invalidate_main_page(sender, **kwargs):
+    """ Drops the cached main page payload, which shows the latest game, article and offer. """
+    invalidate('main_page')
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Game)
+def touch_renamed_offer_cards(sender, instance, raw=False, update_fields=None, **kwargs):
+    """ Moves the version stamp of the open offers of a renamed owner, game or wanted game, whose cached market
+    cards show the name. Saves leaving the name out (like the last_login update of every login) are skipped. """
+    field, relations = ('username', ['owner']) if sender is User else ('name', ['game', 'wanted_game'])
+    if raw or instance.pk is None or (update_fields is not None and field not in update_fields):
+        return
+    if sender.objects.filter(pk=instance.pk).exclude(**{field: getattr(instance, field)}).exists():
+        for relation in relations:
+            ExchangeOffer.objects.filter(status=True, **{relation: instance.pk}).update(modified=timezone.now())
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """ Drops the cached user of the authentication fast path, e.g. after a password change. """
+    forget_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        forget_user(user.pk)
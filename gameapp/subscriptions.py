@@ -0,0 +1,102 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from mailchimp_marketing import Client
+from mailchimp_marketing.api_client import ApiClientError
+
+from gameapp.metrics import external_call
+from gameapp.models import Subscription
+
+logger = logging.getLogger(__name__)
+
+# Mailchimp reports members already on the list as errors, for us they are done
+ALREADY_SUBSCRIBED_CODES = {"ERROR_CONTACT_EXISTS"}
+
+
+def normalize_email(email):
+    """ Returns the form of an email address that is stored, synced to Mailchimp and mailed to. """
+    return email.strip().lower()
+
+
+def subscribe(email):
+    """
+    Queues an email address for the Mailchimp list without calling Mailchimp.
+
+    Returns True when the address is new, False when it was already subscribed.
+    """
+    _, created = Subscription.objects.get_or_create(email=normalize_email(email))
+    return created
+
+
+def mailchimp_client():
+    """ Builds a Mailchimp client from the project settings. """
+    client = Client()
+    client.set_config({
+        "api_key": settings.MAILCHIMP_API_KEY,
+        "server": settings.MAILCHIMP_DATA_CENTER,
+        "timeout": settings.MAILCHIMP_TIMEOUT,
+    })
+    if settings.MAILCHIMP_HOST:
+        client.api_client.host = settings.MAILCHIMP_HOST
+    return client
+
+
+def record_failure(subscriptions, error):
+    """ Reschedules each subscription with exponential backoff, giving up after MAILCHIMP_MAX_ATTEMPTS. """
+    now = timezone.now()
+    for subscription in subscriptions:
+        subscription.attempts += 1
+        subscription.last_error = str(error)
+        subscription.next_attempt = now + timedelta(
+            seconds=settings.MAILCHIMP_RETRY_DELAY * 2 ** (subscription.attempts - 1))
+        if subscription.attempts >= settings.MAILCHIMP_MAX_ATTEMPTS:
+            subscription.status = "F"
+        subscription.save(update_fields=['attempts', 'last_error', 'next_attempt', 'status'])
+
+
+def sync_pending(batch_size=None, client=None):
+    """
+    Adds one batch of pending subscriptions to the Mailchimp list with a single batch-members request.
+
+    The batch is locked while the request is in flight (rows locked by another worker are skipped).
+    Addresses rejected by Mailchimp keep their pending status and are retried with exponential backoff until
+    MAILCHIMP_MAX_ATTEMPTS is reached. Returns a (synced, failed) tuple of counts.
+    """
+    batch_size = min(batch_size or settings.MAILCHIMP_BATCH_SIZE, 500)
+    client = client or mailchimp_client()
+
+    with transaction.atomic():
+        batch = list(Subscription.objects.select_for_update(skip_locked=True)
+                     .filter(status="P", next_attempt__lte=timezone.now())
+                     .order_by('next_attempt', 'id')[:batch_size])
+        if not batch:
+            return 0, 0
+
+        members = [{"email_address": subscription.email, "status": "subscribed"} for subscription in batch]
+        try:
+            with external_call('mailchimp'):
+                response = client.lists.batch_list_members(settings.MAILCHIMP_EMAIL_LIST_ID,
+                                                           {"members": members, "update_existing": False})
+        except ApiClientError as error:
+            logger.warning("Mailchimp batch subscribe failed: %s", error.text)
+            record_failure(batch, error.text)
+            return 0, len(batch)
+
+        errors = {
+            item["email_address"].lower(): item
+            for item in response.get("errors", [])
+            if item.get("error_code") not in ALREADY_SUBSCRIBED_CODES
+        }
+        failed = [subscription for subscription in batch if subscription.email in errors]
+        synced = [subscription.id for subscription in batch if subscription.email not in errors]
+
+        Subscription.objects.filter(id__in=synced).update(status="S", synced=timezone.now())
+        for subscription in failed:
+            record_failure([subscription], errors[subscription.email].get("error", "Rejected by Mailchimp"))
+        if failed:
+            logger.warning("Mailchimp rejected %d of %d subscriptions", len(failed), len(batch))
+
+    return len(synced), len(failed)
@@ -0,0 +1,25 @@
+"""
+A Django template backend that adds the rendering time of every template to the current request's metrics.
+"""
+from django.template.backends.django import DjangoTemplates, Template
+
+from gameapp.metrics import timed
+
+
+class TimedTemplate(Template):
+    """ A template timing its own rendering. """
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """ The Django template backend returning TimedTemplate objects. """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
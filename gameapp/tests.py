@@ -1,11 +1,51 @@
+import asyncio
+import itertools
+import json
+import re
+import socket
+import threading
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from urllib.parse import urlencode
+
 import pytest
+from asgiref.sync import sync_to_async
 from captcha.models import CaptchaStore
 from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command, CommandError
+from django.db import connection, OperationalError, reset_queries
+from django.test import AsyncRequestFactory, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
 from pytest_django.asserts import assertRedirects
-from gameapp.models import Game, Article, ExchangeOffer, CustomerOffer, Notification
-from conftest import user, exchange_offer
+from gameapp.archive import archive_batch
+from gameapp.auth import auth_cache, check_session_cache, user_key
+from gameapp.cache import current_version, get_or_build, invalidate, version_timeout
+from gameapp.mail import queue_email
+from gameapp.notifications import notify, notify_many, purge_notifications, unread_count
+from gameapp.offers import accept_offer
+from gameapp.management.commands.benchmark import regressions
+from gameapp.metrics import HISTOGRAMS, COUNTERS, FRAGMENT_HITS, FRAGMENT_MISSES, render_metrics
+from gameapp import matching, seeding
+from gameapp.search import search
+from gameapp.management.commands.notification_broker import Command as BrokerCommand
+from gameapp.realtime import InProcessHub, BrokerHub, get_hub
+from gameapp.views import NotificationStreamView, MarketListView, UserPageView
+from gameapp.models import Game, Article, ExchangeOffer, CustomerOffer, Notification, OutgoingEmail, Subscription, \
+    GameMarketStats, GamePriceStats, ArchivedExchangeOffer, ArchivedCustomerOffer, SearchDocument, \
+    SearchPosting
+from conftest import user, exchange_offer, fake_mailchimp
 
 User = get_user_model()
 
@@ -83,6 +123,76 @@ def test_main_view(client):
     assert offer.description.encode() in response.content
 
 
+@pytest.mark.django_db
+def test_main_view_empty_site(client):
+    """Test that the MainView renders before any game, article or offer exists."""
+    response = client.get(reverse('main'))
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_main_view_cache_invalidated_on_write(client):
+    """Test that the MainView serves its payload from the cache until a game, article or offer changes."""
+    game = Game.objects.create(name="Old Game", description="text")
+    client.get(reverse('main'))
+    assert count_queries(client, reverse('main')) == 0
+
+    game.name = "Renamed Game"
+    game.save()
+    response = client.get(reverse('main'))
+    assert b"Renamed Game" in response.content
+
+
+def test_get_or_build_collapses_concurrent_misses():
+    """Test that concurrent cache misses compute the payload only once."""
+    builds = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.2)
+        return "payload"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(get_or_build('stampede', build))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["payload"] * 8
+    assert len(builds) == 1
+
+    invalidate('stampede')
+    assert get_or_build('stampede', lambda: "rebuilt") == "rebuilt"
+
+
+def test_payload_versions_expire_in_process_local_caches(settings, tmp_path):
+    """Test that a worker whose process-local cache misses the invalidations of another worker serves a payload
+    at most LOCAL_CACHE_VERSION_TIMEOUT old, while a shared cache keeps its versions."""
+    settings.LOCAL_CACHE_VERSION_TIMEOUT = 0.3
+    worker, other_worker = LocMemCache('worker', {}), LocMemCache('other-worker', {})
+    data = {'value': 1}
+
+    def build():
+        return data['value']
+
+    with mock.patch('gameapp.cache.cache', worker):
+        assert get_or_build('payload', build) == 1
+    data['value'] = 2
+    with mock.patch('gameapp.cache.cache', other_worker):
+        invalidate('payload')
+        assert get_or_build('payload', build) == 2
+    with mock.patch('gameapp.cache.cache', worker):
+        assert get_or_build('payload', build) == 1
+        time.sleep(0.4)
+        assert get_or_build('payload', build) == 2
+    worker.clear()
+    other_worker.clear()
+
+    with mock.patch('gameapp.cache.cache', FileBasedCache(str(tmp_path), {})):
+        assert version_timeout() is None
+
+
 @pytest.mark.django_db
 def test_games_list_view(client):
     """Test that the GamesListView displays a list of games correctly."""
@@ -110,6 +220,42 @@ def test_articles_list_view(client):
     assert article2.title.encode() in response.content
 
 
+@pytest.mark.django_db
+def test_article_slug_suffixes():
+    """Test that articles sharing a title get numbered slugs at a constant query cost."""
+    game = Game.objects.create(name="Game 1", description="text")
+    slugs = [Article.objects.create(game=game, title="Patch Notes", content="text").slug for _ in range(3)]
+    assert slugs == ["patch-notes", "patch-notes-1", "patch-notes-2"]
+
+    with CaptureQueriesContext(connection) as first:
+        Article.objects.create(game=game, title="Patch Notes", content="text")
+    for _ in range(30):
+        Article.objects.create(game=game, title="Patch Notes", content="text")
+    with CaptureQueriesContext(connection) as last:
+        article = Article.objects.create(game=game, title="Patch Notes", content="text")
+    assert len(last.captured_queries) == len(first.captured_queries)
+    assert article.slug == "patch-notes-34"
+
+
+@pytest.mark.django_db
+def test_article_slug_skips_slug_taken_by_hand():
+    """Test that a generated slug never overwrites an article whose slug was set by hand."""
+    game = Game.objects.create(name="Game 1", description="text")
+    Article.objects.create(slug="review-1", game=game, title="Handmade", content="text")
+
+    slugs = [Article.objects.create(game=game, title="Review", content="text").slug for _ in range(2)]
+    assert slugs == ["review", "review-2"]
+    assert Article.objects.get(slug="review-1").title == "Handmade"
+
+
+@pytest.mark.django_db
+def test_benchmark_command(capsys):
+    """Test that the benchmark command runs a benchmark and rolls its rows back."""
+    call_command('benchmark', 'article_slugs', '--scale', '20')
+    assert '"articles": 20' in capsys.readouterr().out
+    assert not Article.objects.exists()
+
+
 @pytest.mark.django_db
 def test_article_details_view(client, user):
     """Test the ArticleDetailsView with a logged-in user."""
@@ -152,6 +298,175 @@ def test_market_list_view(client, user):
     assert inactive_offer.description.encode() not in response.content
 
 
+@pytest.mark.django_db
+def test_market_list_view_cursor_pagination(client, user):
+    """Test that the MarketListView pages through offers with next/previous cursors, newest first."""
+
+    game = Game.objects.create(name="Game 1", description="text")
+    offers = [ExchangeOffer.objects.create(owner=user, offer_type="S", game=game, price=1.0, description=f"Offer {i}")
+              for i in range(25)]
+    newest_first = [offer.id for offer in reversed(offers)]
+
+    response = client.get(reverse('market'))
+    first_page = [offer.id for offer in response.context['object_list']]
+    assert first_page == newest_first[:20]
+    assert response.context['previous_query'] is None
+
+    response = client.get(reverse('market') + '?' + response.context['next_query'])
+    assert [offer.id for offer in response.context['object_list']] == newest_first[20:]
+    assert response.context['next_query'] is None
+
+    response = client.get(reverse('market') + '?' + response.context['previous_query'])
+    assert [offer.id for offer in response.context['object_list']] == first_page
+
+
+@pytest.mark.django_db
+def test_market_list_view_cursor_keeps_game_filter(client, user):
+    """Test that the MarketListView cursors keep the selected game filter."""
+
+    game1 = Game.objects.create(name="Game 1", description="text")
+    game2 = Game.objects.create(name="Game 2", description="text")
+    for i in range(21):
+        ExchangeOffer.objects.create(owner=user, offer_type="E", game=game1, description=f"Offer {i}")
+    ExchangeOffer.objects.create(owner=user, offer_type="E", game=game2, description="Other game")
+
+    response = client.get(reverse('market'), {'game': 'Game 1'})
+    assert 'game=Game+1' in response.context['next_query']
+
+    response = client.get(reverse('market') + '?' + response.context['next_query'])
+    assert [offer.description for offer in response.context['object_list']] == ["Offer 0"]
+
+
+@pytest.mark.django_db
+def test_market_list_view_price_filters_and_sorting(client, user):
+    """Test that the MarketListView filters by offer type and price range and pages through price orders."""
+
+    game1 = Game.objects.create(name="Game 1", description="text")
+    game2 = Game.objects.create(name="Game 2", description="text")
+    offers = [ExchangeOffer.objects.create(owner=user, offer_type="SB"[i % 2], game=(game1, game2)[i % 3 == 0],
+                                           price=(i * 7) % 25 + 1, description=f"Offer {i}") for i in range(25)]
+    exchange = ExchangeOffer.objects.create(owner=user, offer_type="E", game=game1, description="Exchange offer")
+
+    def listed(params, pages=2):
+        ids, query = [], urlencode(params)
+        for _ in range(pages):
+            response = client.get(reverse('market') + '?' + query)
+            ids += [offer.id for offer in response.context['object_list']]
+            query = response.context['next_query']
+            if not query:
+                break
+        return ids
+
+    cheapest = [offer.id for offer in sorted(offers, key=lambda offer: (offer.price, offer.id))]
+    assert listed({'sort': 'price'}) == cheapest
+    assert listed({'sort': '-price'}) == cheapest[::-1]
+    assert listed({}) == [exchange.id] + [offer.id for offer in reversed(offers)]
+    assert listed({'sort': 'price', 'offer_type': 'B', 'game': 'Game 1'}) == [
+        offer.id for offer in sorted(offers, key=lambda offer: (offer.price, offer.id))
+        if offer.offer_type == "B" and offer.game == game1]
+    # newest first in a price range
+    in_range = [offer.id for offer in reversed(offers) if 5 <= offer.price <= 12]
+    assert listed({'min_price': '5', 'max_price': '12'}) == in_range
+    assert listed({'offer_type': 'E', 'max_price': '100'}) == []
+    # invalid values are ignored
+    assert listed({'min_price': 'cheap', 'sort': 'random'}, pages=1) == listed({}, pages=1)
+
+    page = client.get(reverse('api_offers'), {'sort': '-price', 'min_price': '20'}).json()
+    assert [offer['id'] for offer in page['results']] == [offer_id for offer_id in cheapest[::-1]
+                                                         if ExchangeOffer.objects.get(id=offer_id).price >= 20]
+
+
+@pytest.mark.django_db
+def test_market_list_view_invalid_cursor(client):
+    """Test that the MarketListView responds with 404 to a malformed cursor."""
+    response = client.get(reverse('market'), {'after': 'not-a-cursor'})
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_search_view_ranks_results(client, user):
+    """Test that the SearchView finds articles, games and active offers, best match first."""
+    game = Game.objects.create(name="Elden Ring", description="Open world action game")
+    Article.objects.create(game=game, title="Elden Ring review", summary="Our verdict", content="A great ring")
+    ExchangeOffer.objects.create(owner=user, offer_type="S", game=game, price=10.0, description="Selling elden ring")
+    ExchangeOffer.objects.create(owner=user, offer_type="S", game=game, price=10.0, description="Closed ring offer",
+                                 status=False)
+
+    response = client.get(reverse('search'), {'q': 'elden ring'})
+    assert response.status_code == 200
+    results = response.context['results']
+    assert sorted(kind for _, kind, _ in results) == ['article', 'game', 'offer']
+    scores = [score for score, _, _ in results]
+    assert scores == sorted(scores, reverse=True)
+    assert b"Closed ring offer" not in response.content
+
+    response = client.get(reverse('search'), {'q': 'ring', 'kind': 'offer'})
+    assert [obj.description for score, kind, obj in response.context['results']] == ["Selling elden ring"]
+
+
+@pytest.mark.django_db
+def test_search_ranks_and_limits_in_the_database():
+    """Test that search sums BM25 per document and keeps the best ones in SQL, skipping very common terms."""
+    for i in range(40):
+        Game.objects.create(name=f"Dragon {i}", description="dragon " * (i % 4) + ("quest" if i < 2 else ""))
+
+    with CaptureQueriesContext(connection) as context:
+        results = search("dragon", limit=5)
+    assert len(results) == 5
+    ranking = [query['sql'] for query in context.captured_queries if 'SUM(' in query['sql']]
+    assert len(ranking) == 1 and 'LIMIT 5' in ranking[0]
+    assert [score for score, _, _ in results] == sorted((score for score, _, _ in results), reverse=True)
+
+    # in a large enough index "dragon", found in every document, is skipped and only the rare "quest" ranks
+    with mock.patch('gameapp.search.COMMON_TERM_MIN_DOCUMENTS', 10):
+        assert {obj.name for _, _, obj in search("dragon quest")} == {"Dragon 0", "Dragon 1"}
+
+
+@pytest.mark.django_db
+def test_search_keeps_every_term_of_a_small_index():
+    """Test that a multi-term query on a small index matches the documents of every term, however common."""
+    for name in ["Mario Kart", "Zelda Breath of the Wild", "Metroid Dread", "Kirby", "Pikmin", "Splatoon", "Tetris"]:
+        Game.objects.create(name=name, description="Nintendo game")
+
+    assert {obj.name for _, _, obj in search("mario zelda")} == {"Mario Kart", "Zelda Breath of the Wild"}
+
+
+@pytest.mark.django_db
+def test_search_index_follows_changes(user):
+    """Test that the search index is updated when objects are edited, closed and deleted."""
+
+    game = Game.objects.create(name="Game 1", description="Platformer")
+    offer = ExchangeOffer.objects.create(owner=user, offer_type="E", game=game, description="Mint condition")
+    assert [obj for _, _, obj in search("mint")] == [offer]
+
+    offer.description = "Boxed"
+    offer.save()
+    assert search("mint") == []
+    assert [obj for _, _, obj in search("boxed")] == [offer]
+
+    offer.status = False
+    offer.save()
+    assert search("boxed") == []
+
+    game.delete()
+    assert search("platformer") == []
+
+
+@pytest.mark.django_db
+def test_rebuild_search_index_command(user):
+    """Test that rebuild_search_index restores a dropped index."""
+
+    game = Game.objects.create(name="Game 1", description="Racing")
+    SearchDocument.objects.all().delete()
+    SearchDocument.objects.create(kind='offer', object_key="999", length=1).postings.create(term="stale", frequency=1)
+    assert search("racing") == []
+
+    call_command('rebuild_search_index')
+    assert [obj for _, _, obj in search("racing")] == [game]
+    assert list(SearchDocument.objects.values_list('object_key', flat=True)) == [str(game.pk)]
+    assert not SearchPosting.objects.filter(term="stale").exists()
+
+
 @pytest.mark.django_db
 def test_user_page_view(client, user):
     """Test the UserPageView with a logged-in user."""
@@ -198,6 +513,88 @@ def test_change_password_view_post_invalid_form(client):
     assert 'The two password fields didn' in str(response.content)
 
 
+@pytest.mark.django_db
+def test_cached_authentication_forgets_session_and_user(shared_auth_cache, client, user, capsys):
+    """ Test that logged-in requests read their session and user from the cache, and that a password change logs
+    out the other sessions and a logout ends the session. """
+    url = reverse('notifications', args=[user.id])
+    assert client.get(url).status_code == 200
+    with CaptureQueriesContext(connection) as context:
+        assert client.get(url).status_code == 200
+    assert [query['sql'] for query in context.captured_queries
+            if 'django_session' in query['sql'] or 'auth_user' in query['sql']] == []
+
+    other_device = Client()
+    other_device.login(username='testuser', password='validpassword123!@#')
+    assert other_device.get(url).status_code == 200
+    data = {'old_password': 'validpassword123!@#', 'new_password1': 'newpassword123!',
+            'new_password2': 'newpassword123!'}
+    assert client.post(reverse('password_change', args=[user.id]), data).status_code == 302
+    assert other_device.get(url).url.startswith(reverse('login'))
+    assert client.get(url).status_code == 200
+
+    session_key = client.cookies['sessionid'].value
+    assert auth_cache().get(user_key(user.id)) is not None
+    client.post(reverse('logout'))
+    assert auth_cache().get(user_key(user.id)) is None
+    replay = Client()
+    replay.cookies['sessionid'] = session_key
+    assert replay.get(url).url.startswith(reverse('login'))
+
+    call_command('benchmark', 'authentication', '--scale', '5')
+    results = json.loads(capsys.readouterr().out)['authentication']
+    assert (results['database_warm_request_queries'], results['cached_warm_request_queries']) == (2, 0)
+
+
+@pytest.mark.django_db
+def test_cached_authentication_is_invalidated_across_workers(shared_auth_cache, client, user, settings):
+    """ Test that a logout and a deactivation handled by another worker, through its own instance of the shared
+    cache, end the session and drop the user cached by this worker. """
+    url = reverse('notifications', args=[user.id])
+    other_worker = FileBasedCache(shared_auth_cache, {})
+    assert other_worker is not caches[settings.SESSION_CACHE_ALIAS]
+
+    def in_other_worker():
+        stack = ExitStack()
+        stack.enter_context(mock.patch('gameapp.auth.auth_cache', return_value=other_worker))
+        stack.enter_context(mock.patch('django.contrib.sessions.backends.cached_db.caches',
+                                       {settings.SESSION_CACHE_ALIAS: other_worker}))
+        return stack
+
+    assert client.get(url).status_code == 200
+    session_key = client.cookies['sessionid'].value
+    with in_other_worker():
+        worker_client = Client()
+        worker_client.cookies['sessionid'] = session_key
+        worker_client.post(reverse('logout'))
+    assert client.get(url).url.startswith(reverse('login'))
+
+    client.force_login(user)
+    assert client.get(url).status_code == 200
+    with in_other_worker():
+        user.is_active = False
+        user.save()
+    assert client.get(url).url.startswith(reverse('login'))
+
+
+@pytest.mark.django_db
+def test_authentication_fast_path_needs_shared_cache(client, user, settings):
+    """ Test that with a process-local cache sessions and users are read from the database, and that the checks
+    warn about the stock cached session backends on such a cache. """
+    url = reverse('notifications', args=[user.id])
+    assert client.get(url).status_code == 200
+    with CaptureQueriesContext(connection) as context:
+        assert client.get(url).status_code == 200
+    tables = {table for query in context.captured_queries for table in ('django_session', 'auth_user')
+              if table in query['sql']}
+    assert tables == {'django_session', 'auth_user'}
+    assert auth_cache().get(user_key(user.id)) is None
+
+    assert check_session_cache(None) == []
+    settings.SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    assert [warning.id for warning in check_session_cache(None)] == ['gameapp.W001']
+
+
 @pytest.mark.django_db
 def test_add_offer_view_get(client, user):
     """Test the GET request to the AddOfferView."""
@@ -223,6 +620,266 @@ def test_add_offer_view_post(client, user):
     assert ExchangeOffer.objects.filter(description='Offer Description').exists()
 
 
+@pytest.mark.django_db
+def test_add_offer_matches_open_offers(client, user):
+    """Test that a new offer is matched with the open offers it can trade with and both sides are notified."""
+    game_a, game_b, game_c = (Game.objects.create(name=f"Game {name}", description="text") for name in "ABC")
+    buyer, swapper, third = (User.objects.create(username=name) for name in ("buyer", "swapper", "third"))
+    ExchangeOffer.objects.create(owner=buyer, offer_type="B", game=game_a, price=30, description="text")
+    ExchangeOffer.objects.create(owner=swapper, offer_type="B", game=game_a, price=15, description="Too low")
+    ExchangeOffer.objects.create(owner=third, offer_type="B", game=game_a, price=50, description="Closed",
+                                 status=False)
+    ExchangeOffer.objects.create(owner=user, offer_type="B", game=game_a, price=40, description="Own offer")
+    two_way = ExchangeOffer.objects.create(owner=swapper, offer_type="E", game=game_b, wanted_game=game_a,
+                                           description="text")
+    second = ExchangeOffer.objects.create(owner=buyer, offer_type="E", game=game_b, wanted_game=game_c,
+                                          description="text")
+    closing = ExchangeOffer.objects.create(owner=third, offer_type="E", game=game_c, wanted_game=game_a,
+                                           description="text")
+    # the same owner on two legs is no three-way exchange
+    ExchangeOffer.objects.create(owner=buyer, offer_type="E", game=game_c, wanted_game=game_a, description="text")
+
+    def add_offer(**data):
+        captcha = CaptchaStore.objects.create(challenge="test-challenge", response="test-response")
+        response = client.post(reverse('add_offer'), data={
+            'game': game_a.pk, 'description': 'New offer', 'captcha_0': captcha.hashkey,
+            'captcha_1': "test-response", **data})
+        assert response.status_code == 302
+
+    def notified(*users):
+        return [list(Notification.objects.filter(user=person).values_list('description', flat=True))
+                for person in users]
+
+    add_offer(offer_type='S', price=20, wanted_game=game_b.pk)
+    assert ExchangeOffer.objects.get(offer_type="S", description='New offer').wanted_game is None
+    assert notified(user, buyer, swapper) == [
+        ["Your offer Sell-Game A matches the offer Buy-Game A of user buyer for 30.00."],
+        ["Your offer Buy-Game A matches the new offer Sell-Game A of user testuser for 20.00."], []]
+
+    Notification.objects.all().delete()
+    add_offer(offer_type='E', wanted_game=game_b.pk)
+    offer = ExchangeOffer.objects.get(offer_type="E", description='New offer')
+    assert matching.exchange_cycles(offer, 5) == [(two_way,), (second, closing)]
+    three_way = ("Your offer Exchange-{} can be traded in a 3-way exchange: testuser gives Game A for Game B; "
+                 "buyer gives Game B for Game C; third gives Game C for Game A.")
+    assert notified(user, swapper, buyer, third) == [
+        ["Your offer Exchange-Game A can be traded in a 2-way exchange: testuser gives Game A for Game B; "
+         "swapper gives Game B for Game A.", three_way.format("Game A")],
+        ["Your offer Exchange-Game B can be traded in a 2-way exchange: testuser gives Game A for Game B; "
+         "swapper gives Game B for Game A."],
+        [three_way.format("Game B")], [three_way.format("Game C")]]
+    assert b"Wants: Game B" in client.get(reverse('market')).content
+
+
+@pytest.mark.django_db
+def test_matching_reads_game_buckets(user):
+    """ Test that matching a new offer reads the open offers of its games from indexes. """
+    games = [Game.objects.create(name=f"Game {i}", description="text") for i in range(6)]
+    others = [User.objects.create(username=f"user{i}") for i in range(3)]
+    ExchangeOffer.objects.bulk_create(
+        ExchangeOffer(owner=others[i % 3], offer_type="SBE"[i % 3], game=games[i // 3 % 6],
+                      price=None if i % 3 == 2 else i % 40 + 1, wanted_game=games[i // 18 % 6] if i % 3 == 2 else None,
+                      description="text", status=bool(i % 5)) for i in range(600))
+
+    for offer_type, price, wanted_game in (("S", 10, None), ("B", 30, None), ("E", None, games[1])):
+        offer = ExchangeOffer.objects.create(owner=user, offer_type=offer_type, game=games[0], price=price,
+                                             wanted_game=wanted_game, description="text")
+        with CaptureQueriesContext(connection) as context:
+            matches, cycles = matching.match_offer(offer, limit=3)
+        assert matches or cycles
+        assert sequential_scans(context.captured_queries) == [], offer_type
+        if connection.vendor == 'sqlite':
+            assert not any('TEMP B-TREE' in line for line in query_plans(context.captured_queries)), offer_type
+
+
+@pytest.mark.django_db
+def test_price_stats_follow_listed_and_accepted_offers(client, user):
+    """Test that the price statistics are updated by new offers and acceptances and shown on the offer pages."""
+    game = Game.objects.create(name="Game 1", description="text")
+    for price in (30, 10, 20, "", 40):
+        captcha = CaptchaStore.objects.create(challenge="test-challenge", response="test-response")
+        client.post(reverse('add_offer'), data={
+            'offer_type': 'S', 'game': game.pk, 'price': price, 'description': 'Offer',
+            'captcha_0': captcha.hashkey, 'captcha_1': "test-response"})
+    offer = ExchangeOffer.objects.filter(price=40).get()
+    for price in (35, 38):
+        bid = CustomerOffer.objects.create(exchange_offer=offer, customer=User.objects.create(username=f"c{price}"),
+                                           game_name=game, price=price, description="text")
+    client.post(reverse('offer_details', args=[offer.id]), {'customer_offer_id': bid.id})
+
+    listed = {'offer_type': "S", 'source': "L", 'count': 4, 'window': 4, 'min': Decimal("10.00"),
+              'max': Decimal("40.00"), 'mean': Decimal("25.00"), 'p25': Decimal("10.00"),
+              'median': Decimal("20.00"), 'p75': Decimal("30.00")}
+    accepted = {'offer_type': "S", 'source': "A", 'count': 1, 'window': 1, 'min': Decimal("38.00"),
+                'max': Decimal("38.00"), 'mean': Decimal("38.00"), 'p25': Decimal("38.00"),
+                'median': Decimal("38.00"), 'p75': Decimal("38.00")}
+    assert GamePriceStats.summaries(game.id) == [listed, accepted]
+    assert GamePriceStats.summaries(game.id, "B") == []
+    assert GamePriceStats.rebuild() == 2
+    assert GamePriceStats.summaries(game.id) == [listed, accepted]
+
+    with mock.patch.object(GamePriceStats, 'WINDOW', 2):
+        GamePriceStats.record(game.id, "S", "L", 50)
+    assert GamePriceStats.objects.get(source="L").prices == ["40.00", "50.00"]
+
+    page = client.get(reverse('api_game_prices', args=[game.id]), {'offer_type': "S"}).json()
+    assert page['results'][1] == {key: str(value) for key, value in accepted.items()} | {'count': 1, 'window': 1}
+    response = client.get(reverse('make_offer', args=[ExchangeOffer.objects.filter(price=10).get().id]))
+    assert b"Accepted offers: 1 prices, the last 1 from 38.00 to 38.00" in response.content
+
+
+@pytest.mark.django_db
+def test_market_stats_follow_offer_changes(client, user):
+    """Test that adding and accepting offers keeps the per-game market statistics shown in the market up to date."""
+    game = Game.objects.create(name="Game 1", description="text")
+    for offer_type in ("S", "S", "B"):
+        captcha = CaptchaStore.objects.create(challenge="test-challenge", response="test-response")
+        client.post(reverse('add_offer'), data={
+            'offer_type': offer_type, 'game': game.pk, 'price': 10.0, 'description': 'Offer',
+            'captcha_0': captcha.hashkey, 'captcha_1': "test-response"})
+
+    stats = GameMarketStats.objects.get(game=game)
+    newest = ExchangeOffer.objects.latest('added')
+    assert (stats.active_offers, stats.sell_offers, stats.buy_offers, stats.exchange_offers) == (3, 2, 1, 0)
+    assert stats.newest_offer == newest.added
+
+    customer_offer = CustomerOffer.objects.create(exchange_offer=newest, customer=user, game_name=game,
+                                                  description="text")
+    client.post(reverse('offer_details', args=[newest.id]), {'customer_offer_id': customer_offer.id})
+    stats.refresh_from_db()
+    assert (stats.active_offers, stats.sell_offers, stats.buy_offers) == (2, 2, 0)
+    assert stats.newest_offer < newest.added
+
+    response = client.get(reverse('market'), {'game': 'Game 1'})
+    assert b"Game 1 (2)" in response.content
+    assert response.context['game_stats'] == stats
+
+
+@pytest.mark.django_db
+def test_accept_offer_with_drifted_market_stats(user, exchange_offer):
+    """Test that accepting an offer succeeds when its game's statistics already count no active offers."""
+    GameMarketStats.objects.create(game=exchange_offer.game)
+    bid = add_bids(exchange_offer, 1)[0]
+
+    assert accept_offer(exchange_offer.id, user.id, bid.id) == bid
+    stats = GameMarketStats.objects.get(game=exchange_offer.game)
+    assert (stats.active_offers, stats.exchange_offers, stats.sell_offers, stats.buy_offers) == (0, 0, 0, 0)
+
+
+def add_bids(offer, count):
+    """ Creates `count` customer offers on the exchange offer, each from its own customer. """
+    game = Game.objects.create(name=f"Bid game {offer.id}", description="text")
+    customers = User.objects.bulk_create(
+        User(username=f"bidder{offer.id}-{i}", email=f"bidder{offer.id}-{i}@example.com") for i in range(count))
+    return CustomerOffer.objects.bulk_create(
+        CustomerOffer(exchange_offer=offer, customer=customer, game_name=game, description="text")
+        for customer in customers)
+
+
+@pytest.mark.django_db
+def test_offer_details_view_accepts_offer_with_fixed_queries(client, user, exchange_offer):
+    """ Test that accepting a bid closes the offer, rejects the other bids and notifies every bidder,
+    with the same number of queries for few and many bids. """
+    def accept(offer, bids):
+        with CaptureQueriesContext(connection) as context:
+            response = client.post(reverse('offer_details', args=[offer.id]), {'customer_offer_id': bids[1].id})
+        assert response.status_code == 302
+        return len(context.captured_queries)
+
+    small = ExchangeOffer.objects.create(owner=user, offer_type='S', game=exchange_offer.game, price=1.0,
+                                         description='text')
+    client.get(reverse('user_page', args=[user.id]))  # caches the session and the user
+    baseline = accept(small, add_bids(small, 3))
+    bids = add_bids(exchange_offer, 50)
+    assert accept(exchange_offer, bids) == baseline
+
+    exchange_offer.refresh_from_db()
+    assert exchange_offer.status is False
+    statuses = dict(CustomerOffer.objects.filter(exchange_offer=exchange_offer).values_list('id', 'status'))
+    assert statuses.pop(bids[1].id) == "A"
+    assert set(statuses.values()) == {"R"}
+    assert Notification.objects.filter(user__in=[bid.customer_id for bid in bids]).count() == 50
+    assert "has accepted your offer" in Notification.objects.get(user=bids[1].customer_id).description
+    assert OutgoingEmail.objects.filter(to=bids[1].customer.email).count() == 1
+
+
+@pytest.mark.django_db
+def test_offer_details_view_post_requires_open_owned_offer(client, user):
+    """ Test that bids cannot be accepted on another user's offer or on a closed offer. """
+    other = User.objects.create(username='user2')
+    game = Game.objects.create(name="Game 1", description="text")
+    offer = ExchangeOffer.objects.create(owner=other, offer_type='S', game=game, description='text')
+    bids = add_bids(offer, 2)
+    client.post(reverse('offer_details', args=[offer.id]), {'customer_offer_id': bids[0].id})
+    offer.refresh_from_db()
+    assert offer.status is True
+
+    own = ExchangeOffer.objects.create(owner=user, offer_type='S', game=game, description='text')
+    own_bids = add_bids(own, 2)
+    # a bid made to another offer
+    client.post(reverse('offer_details', args=[own.id]), {'customer_offer_id': bids[0].id})
+    own.refresh_from_db()
+    assert own.status is True
+
+    client.post(reverse('offer_details', args=[own.id]), {'customer_offer_id': own_bids[0].id})
+    client.post(reverse('offer_details', args=[own.id]), {'customer_offer_id': own_bids[1].id})
+    assert dict(CustomerOffer.objects.filter(exchange_offer=own).values_list('id', 'status')) == {
+        own_bids[0].id: "A", own_bids[1].id: "R"}
+    assert not CustomerOffer.objects.filter(exchange_offer=offer).exclude(status="P").exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_acceptances_accept_one_bid(user, exchange_offer):
+    """ Test that of several acceptances racing on one offer exactly one succeeds. """
+    GameMarketStats.offer_opened(exchange_offer)
+    bids = add_bids(exchange_offer, 8)
+    start = threading.Barrier(len(bids))
+    accepted = []
+
+    def accept(bid):
+        start.wait()
+        try:
+            accepted.append(accept_offer(exchange_offer.id, user.id, bid.id))
+        except OperationalError:
+            # SQLite refuses a second writer outright instead of making it wait
+            accepted.append(None)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=accept, args=(bid,)) for bid in bids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    winners = [bid for bid in accepted if bid is not None]
+    assert len(winners) == 1
+    statuses = dict(CustomerOffer.objects.values_list('id', 'status'))
+    assert list(statuses.values()).count("A") == 1
+    assert statuses[winners[0].id] == "A"
+    assert GameMarketStats.objects.get(game=exchange_offer.game).active_offers == 0
+
+
+@pytest.mark.django_db
+def test_reconcile_market_stats_command(user):
+    """Test that reconcile_market_stats fixes drifted, missing and stale statistics."""
+    game1 = Game.objects.create(name="Game 1", description="text")
+    game2 = Game.objects.create(name="Game 2", description="text")
+    game3 = Game.objects.create(name="Game 3", description="text")
+    offer = ExchangeOffer.objects.create(owner=user, offer_type="E", game=game1, description="text")
+    ExchangeOffer.objects.create(owner=user, offer_type="S", game=game2, price=1.0, description="text")
+    GameMarketStats.objects.create(game=game1, active_offers=5, exchange_offers=5)
+    GameMarketStats.objects.create(game=game3, active_offers=1, buy_offers=1)
+
+    call_command('reconcile_market_stats')
+
+    stats = {row.game_id: row for row in GameMarketStats.objects.all()}
+    assert (stats[game1.id].active_offers, stats[game1.id].exchange_offers) == (1, 1)
+    assert stats[game1.id].newest_offer == offer.added
+    assert (stats[game2.id].active_offers, stats[game2.id].sell_offers) == (1, 1)
+    assert (stats[game3.id].active_offers, stats[game3.id].newest_offer) == (0, None)
+
+
 @pytest.mark.django_db
 def test_make_offer_view_get(client, user, exchange_offer):
     """Test the GET request to the MakeOfferView."""
@@ -249,6 +906,8 @@ def test_make_offer_view_post(client, user, exchange_offer):
     assert response.status_code == 302
     assert CustomerOffer.objects.filter(game_name=exchange_offer.game.id, price=10.0, description='Test Description').exists()
     assert response.url == reverse('market')
+    assert len(mail.outbox) == 0
+    assert OutgoingEmail.objects.filter(subject="New offer made by customer", sent__isnull=True).count() == 1
 
 
 @pytest.mark.django_db
@@ -259,6 +918,44 @@ def test_subscribe_view_get(client):
     assert response.status_code == 200
 
 
+@pytest.mark.django_db
+def test_subscribe_view_post_queues_subscription(client, fake_mailchimp):
+    """Test that the SubscribeView stores the normalized subscription once, welcomes that address and makes no
+    call to Mailchimp."""
+    client.post(reverse('subscribe'), {'email': ' New@Example.com'})
+    response = client.post(reverse('subscribe'), {'email': 'new@example.com'})
+
+    assert response.status_code == 200
+    assert list(Subscription.objects.values_list('email', 'status')) == [('new@example.com', 'P')]
+    assert list(OutgoingEmail.objects.values_list('to', 'subject')) == [
+        ('new@example.com', "Welcome to Our Mailing List")]
+    assert fake_mailchimp.requests == []
+
+
+@pytest.mark.django_db
+def test_sync_subscriptions_command(fake_mailchimp, settings):
+    """Test that sync_subscriptions sends pending subscriptions in batches and tracks rejected ones."""
+    settings.MAILCHIMP_MAX_ATTEMPTS = 2
+    for i in range(5):
+        Subscription.objects.create(email=f"user{i}@example.com")
+    fake_mailchimp.rejected = {"user3@example.com"}
+
+    call_command('sync_subscriptions', '--batch-size', '2')
+
+    paths = {path for path, _ in fake_mailchimp.requests}
+    assert paths == {"/3.0/lists/list123"}
+    sent = [member['email_address'] for _, body in fake_mailchimp.requests for member in body['members']]
+    assert sent == [f"user{i}@example.com" for i in range(5)]
+    assert Subscription.objects.filter(status="S").count() == 4
+    rejected = Subscription.objects.get(email="user3@example.com")
+    assert (rejected.status, rejected.attempts, rejected.last_error) == ("P", 1, "Invalid address")
+
+    Subscription.objects.filter(id=rejected.id).update(next_attempt=rejected.added)
+    call_command('sync_subscriptions')
+    rejected.refresh_from_db()
+    assert (rejected.status, rejected.attempts) == ("F", 2)
+
+
 @pytest.mark.django_db
 def test_notification_view_get(client, user):
     """ Test the GET request to the NotificationView. """
@@ -276,3 +973,743 @@ def test_notification_view_post(client, user):
 
     assert response.status_code == 302
     assert Notification.objects.filter(id=notification_id).exists() is False
+
+
+@pytest.mark.django_db
+def test_notification_views_ignore_other_users_notifications(client, user):
+    """ Test that notifications of another user cannot be marked as read or deleted. """
+    other = User.objects.create(username='user2')
+    notification = notify(other, "text")
+
+    client.post(reverse('user_page', args=[user.id]), {'notification_id': notification.id})
+    client.post(reverse('notifications', args=[user.id]), {'notification_id': notification.id})
+    client.post(reverse('notifications_delete_selected', args=[user.id]), {'notification_ids': [notification.id]})
+    client.post(reverse('notifications_delete_read', args=[user.id]))
+
+    notification.refresh_from_db()
+    assert notification.status is False
+
+
+@pytest.mark.django_db
+def test_unread_count_follows_notification_changes(client, user, django_capture_on_commit_callbacks):
+    """ Test that the unread counter in the navigation is cached and kept in sync on create, read and delete,
+    dropped only once the change commits. """
+    def committed(action, *args, **kwargs):
+        with django_capture_on_commit_callbacks(execute=True):
+            return action(*args, **kwargs)
+
+    notifications = committed(notify_many, [(user.id, f"text {i}") for i in range(3)])
+    assert unread_count(user.id) == 3
+    with CaptureQueriesContext(connection) as context:
+        assert unread_count(user.id) == 3
+    assert len(context.captured_queries) == 0
+    assert "User Page (3)" in client.get(reverse('main')).content.decode()
+
+    committed(client.post, reverse('user_page', args=[user.id]), {'notification_id': notifications[0].id})
+    assert unread_count(user.id) == 2
+    committed(client.post, reverse('notifications', args=[user.id]), {'notification_id': notifications[1].id})
+    assert unread_count(user.id) == 1
+    with django_capture_on_commit_callbacks(execute=True):
+        notify(user, "text")
+        # a count read before the commit is dropped by it
+        unread_count(user.id)
+    assert unread_count(user.id) == 2
+    committed(client.post, reverse('notifications_read_all', args=[user.id]))
+    assert unread_count(user.id) == 0
+    assert 'data-unread="0">User Page</a>' in client.get(reverse('main')).content.decode()
+
+
+@pytest.mark.django_db
+def test_bulk_notification_operations_run_one_statement(client, user):
+    """ Test that mark all read, delete all read and delete selected each run a single write. """
+    notifications = notify_many([(user.id, f"text {i}") for i in range(10)])
+    other = notify(User.objects.create(username='user2'), "text")
+
+    def writes(url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            assert client.post(url, data or {}).status_code == 302
+        return [query['sql'] for query in context.captured_queries
+                if query['sql'].startswith(('UPDATE "gameapp_notification"', 'DELETE FROM "gameapp_notification"'))]
+
+    ids = [notification.id for notification in notifications[:3]] + [other.id]
+    assert len(writes(reverse('notifications_delete_selected', args=[user.id]), {'notification_ids': ids})) == 1
+    assert Notification.objects.filter(user=user).count() == 7
+    assert len(writes(reverse('notifications_read_all', args=[user.id]))) == 1
+    assert not Notification.objects.filter(user=user, status=False).exists()
+    assert len(writes(reverse('notifications_delete_read', args=[user.id]))) == 1
+    assert not Notification.objects.filter(user=user).exists()
+    assert Notification.objects.filter(id=other.id).exists()
+
+
+@pytest.mark.django_db
+def test_notification_view_pagination(client, user):
+    """ Test that the notifications page lists 20 notifications per page, newest first. """
+    notifications = notify_many([(user.id, f"Notification {i}") for i in range(45)])
+    url = reverse('notifications', args=[user.id])
+
+    response = client.get(url)
+    assert [n.id for n in response.context['notifications']] == [n.id for n in notifications[::-1][:20]]
+    response = client.get(f"{url}?{response.context['next_query']}")
+    response = client.get(f"{url}?{response.context['next_query']}")
+    assert [n.id for n in response.context['notifications']] == [n.id for n in notifications[4::-1]]
+    assert response.context['next_query'] is None
+    assert client.get(f"{url}?after=invalid").status_code == 404
+
+
+def test_in_process_hub_delivers_events_from_other_threads():
+    """ Test that events published from a worker thread reach only the subscribed user's queues. """
+    hub = InProcessHub()
+
+    async def listen():
+        async with hub.subscribe(1) as first, hub.subscribe(1) as second, hub.subscribe(2) as other:
+            assert hub.subscriber_count() == 3
+            publisher = threading.Thread(target=hub.publish, args=(1, {'id': 7}))
+            publisher.start()
+            events = await asyncio.wait_for(asyncio.gather(first.get(), second.get()), 5)
+            publisher.join()
+            return events, other.empty()
+
+    assert asyncio.run(listen()) == ([{'id': 7}, {'id': 7}], True)
+    assert hub.subscriber_count() == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_notification_stream_pushes_new_notifications(user):
+    """ Test that the stream replays notifications missed since Last-Event-ID, then pushes new ones. """
+    seen = notify(user, "seen")
+    missed = notify(user, "missed")
+    request = AsyncRequestFactory().get(reverse('notification_stream'), headers={'Last-Event-ID': str(seen.id)})
+    request.user = user
+
+    async def read():
+        response = await NotificationStreamView.as_view()(request)
+        assert response['Content-Type'] == 'text/event-stream'
+        events = response.streaming_content
+        replayed = await asyncio.wait_for(anext(events), 5)
+        await sync_to_async(notify)(user, "pushed")
+        pushed = await asyncio.wait_for(anext(events), 5)
+        return replayed.decode(), pushed.decode()
+
+    replayed, pushed = asyncio.run(read())
+    assert replayed.startswith(f"id: {missed.id}\nevent: notification\n") and '"missed"' in replayed
+    assert '"pushed"' in pushed
+    assert get_hub().subscriber_count() == 0
+
+
+def test_notification_stream_ends_after_max_age(settings):
+    """ Test that an idle stream sends keep-alives and ends after NOTIFICATION_STREAM_MAX_AGE, unsubscribing. """
+    settings.NOTIFICATION_STREAM_KEEPALIVE = 0.05
+    settings.NOTIFICATION_STREAM_MAX_AGE = 0.3
+
+    async def read():
+        return [chunk async for chunk in NotificationStreamView().events(user_id=1, last_id=0)]
+
+    chunks = asyncio.run(asyncio.wait_for(read(), 5))
+    assert chunks and set(chunks) == {": keep-alive\n\n"}
+    assert get_hub().subscriber_count() == 0
+
+
+@pytest.mark.django_db
+def test_notification_stream_requires_asgi_and_login(client, user):
+    """ Test that the stream is declined for anonymous users and, to stop browser retries, under WSGI. """
+    assert client.get(reverse('notification_stream')).status_code == 204
+    client.logout()
+    assert client.get(reverse('notification_stream')).status_code == 401
+
+
+def test_broker_hub_fans_events_out_to_every_worker():
+    """ Test that an event published by one worker reaches the streams held by another one. """
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        address = probe.getsockname()
+    broker = BrokerCommand()
+    threading.Thread(target=asyncio.run, args=(broker.serve(*address),), daemon=True).start()
+    publisher, listener = BrokerHub(address), BrokerHub(address)
+
+    async def listen():
+        async with listener.subscribe(5) as queue:
+            assert listener._connected.wait(5) and publisher._connected.wait(5)
+            # the broker may still be registering the listener's connection, events sent before are lost
+            for _ in range(50):
+                publisher.publish(5, {'id': 1})
+                try:
+                    return await asyncio.wait_for(queue.get(), 0.1)
+                except asyncio.TimeoutError:
+                    pass
+
+    assert asyncio.run(listen()) == {'id': 1}
+
+
+def test_broker_hub_publish_never_waits_for_the_broker(caplog):
+    """ Test that publishing while the broker is unreachable returns at once and drops the events beyond the
+    outbox. """
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        address = probe.getsockname()
+    with mock.patch.object(BrokerHub, 'outbox_size', 3):
+        hub = BrokerHub(address)
+    started = time.perf_counter()
+    for i in range(10):
+        hub.publish(5, {'id': i})
+    assert time.perf_counter() - started < 0.5
+    # the outbox holds 3 events and the sender thread may hold one more, waiting for the connection
+    assert caplog.text.count("outbox full") in (6, 7)
+
+
+@pytest.mark.django_db
+def test_offer_api_lists_filtered_offers_by_cursor(client, user):
+    """ Test that the offers API returns compact pages of the active offers, filtered like the market. """
+    games = [Game.objects.create(name=f"Game {i}", description="text") for i in range(2)]
+    offers = [ExchangeOffer.objects.create(owner=user, offer_type="S", game=games[i % 2], price=i,
+                                           description=f"Offer {i}") for i in range(60)]
+    ExchangeOffer.objects.filter(id=offers[-1].id).update(status=False)
+
+    response = client.get(reverse('api_offers'))
+    assert b'", "' not in response.content
+    page = response.json()
+    assert [offer['id'] for offer in page['results']] == [offer.id for offer in offers[-2::-1][:50]]
+    assert page['results'][0] == {
+        'id': offers[-2].id, 'offer_type': "S", 'price': "58.00", 'description': "Offer 58",
+        'added': page['results'][0]['added'], 'game_name': "Game 0", 'owner_name': "testuser"}
+    page = client.get(reverse('api_offers'), {'after': page['next']}).json()
+    assert [offer['id'] for offer in page['results']] == [offer.id for offer in offers[8::-1]]
+    assert page['next'] is None
+
+    page = client.get(reverse('api_offers'), {'game': "Game 1"}).json()
+    assert {offer['game_name'] for offer in page['results']} == {"Game 1"}
+    assert len(page['results']) == 29
+    assert client.get(reverse('api_offers'), {'after': "invalid"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_api_conditional_get(client, user, exchange_offer):
+    """ Test that unchanged API polls get an empty 304, with the same ETag whatever the cache of the worker
+    holds, that offers and prices answer it before reading their records, and that any change of the listed
+    data changes the ETag. """
+    urls = [reverse(name) for name in ('api_offers', 'api_games', 'api_articles')]
+    urls.append(reverse('api_game_prices', args=[exchange_offer.game_id]))
+    for url in urls:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response['ETag'].startswith('"') and not response.has_header('Last-Modified')
+
+        caches['default'].clear()
+        unchanged = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert unchanged.status_code == 304 and unchanged.content == b""
+
+    # offers and prices answer a 304 from their version stamps, without reading the listed records
+    prices_url = reverse('api_game_prices', args=[exchange_offer.game_id])
+    for url in (reverse('api_offers'), prices_url):
+        etag = client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as context:
+            assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+        assert not any('"description"' in query['sql'] or '"prices"' in query['sql']
+                       for query in context.captured_queries), url
+    GamePriceStats.record(exchange_offer.game_id, "S", "L", 12)
+    assert client.get(prices_url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+    assert client.get(reverse('api_game_prices', args=[exchange_offer.game_id + 1])).status_code == 404
+
+    etag = client.get(reverse('api_offers'))['ETag']
+    exchange_offer.description = "Edited"
+    exchange_offer.save()
+    edited = client.get(reverse('api_offers'), HTTP_IF_NONE_MATCH=etag)
+    assert edited.status_code == 200 and edited.json()['results'][0]['description'] == "Edited"
+    etag = edited['ETag']
+    assert client.get(reverse('api_offers'), {'game': "Game 2"})['ETag'] != etag
+    games_etag = client.get(reverse('api_games'))['ETag']
+    Game.objects.filter(id=exchange_offer.game_id).update(name="Renamed")
+    assert client.get(reverse('api_games'), HTTP_IF_NONE_MATCH=games_etag).status_code == 200
+
+    customer_offer = CustomerOffer.objects.create(exchange_offer=exchange_offer, customer=user,
+                                                  game_name=exchange_offer.game, description="text")
+    accept_offer(exchange_offer.id, user.id, customer_offer.id)
+    changed = client.get(reverse('api_offers'), HTTP_IF_NONE_MATCH=etag)
+    assert changed.status_code == 200
+    assert changed.json()['results'] == []
+
+
+@pytest.mark.django_db
+def test_import_catalogue_upserts_games_from_csv(tmp_path):
+    """ Test that games are upserted on name in chunks, skipping rows that fail the form validation. """
+    Game.objects.create(name="Game 1", description="old")
+    dump = tmp_path / "games.csv"
+    rows = ["name,description", "Game 1,new", ",no name", "Game 2,second"] + [f"Game {i},text" for i in range(3, 30)]
+    dump.write_text("\n".join(rows) + "\n")
+
+    out, err = StringIO(), StringIO()
+    with CaptureQueriesContext(connection) as context:
+        call_command('import_catalogue', 'games', str(dump), '--chunk-size', '10', stdout=out, stderr=err)
+
+    assert "Imported 29 games, skipped 1 invalid rows" in out.getvalue() and "rows/s" in out.getvalue()
+    assert err.getvalue().startswith("Line 3: name:")
+    assert Game.objects.count() == 29
+    assert Game.objects.get(name="Game 1").description == "new"
+    assert [obj.name for _, _, obj in search("second")] == ["Game 2"]
+    # a fixed number of queries per chunk
+    assert len(context.captured_queries) < 20 * 3
+
+
+@pytest.mark.django_db
+def test_import_catalogue_assigns_unique_article_slugs(tmp_path):
+    """ Test that imported articles get the same unique slugs as articles saved one by one. """
+    game = Game.objects.create(name="Game 1", description="text")
+    Article.objects.create(game=game, title="Patch Notes", summary="text", content="text")
+    Article.objects.create(slug="patch-notes-2", game=game, title="Hand made", summary="text", content="text")
+    dump = tmp_path / "articles.jsonl"
+    rows = [json.dumps({'game': "Game 1", 'title': "Patch Notes", 'summary': "text", 'content': f"text {i}"})
+            for i in range(5)]
+    rows += ['{"broken', json.dumps({'game': "Unknown", 'title': "T", 'summary': "s", 'content': "c"})]
+    dump.write_text("\n".join(rows) + "\n")
+
+    err = StringIO()
+    call_command('import_catalogue', 'articles', str(dump), '--chunk-size', '3', stdout=StringIO(), stderr=err)
+
+    slugs = set(Article.objects.filter(title="Patch Notes").values_list('slug', flat=True))
+    assert slugs == {"patch-notes", "patch-notes-1", "patch-notes-3", "patch-notes-4", "patch-notes-5",
+                     "patch-notes-6"}
+    assert Article.objects.create(game=game, title="Patch Notes", summary="text", content="text").slug == \
+        "patch-notes-7"
+    assert "Line 6: invalid row" in err.getvalue() and "Line 7: game: unknown game 'Unknown'" in err.getvalue()
+    assert len(search("text", kinds=["article"])) == Article.objects.count() == 8
+
+
+@pytest.fixture
+def metrics():
+    """ Starts with empty performance histograms and counters. """
+    for metric in HISTOGRAMS + COUNTERS:
+        metric.clear()
+    yield
+    for metric in HISTOGRAMS + COUNTERS:
+        metric.clear()
+
+
+@pytest.mark.django_db
+def test_performance_middleware_records_sampled_requests(client, user, exchange_offer, settings, metrics):
+    """ Test that sampled requests get a Server-Timing header and are exported per URL name at /metrics. """
+    settings.PERF_SAMPLE_RATE = 1
+    # the query log is reset when a request starts, so it has to start empty for the capture to be complete
+    reset_queries()
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(reverse('market'))
+    queries = len(context.captured_queries)
+    assert queries
+    timing = response['Server-Timing']
+    assert f'desc="{queries} queries"' in timing
+    assert re.search(r'template;dur=[\d.]+, external;dur=0\.0, total;dur=[\d.]+, fragments;desc="0/1 cached"$', timing)
+
+    client.get(reverse('offer_details', args=[exchange_offer.id]))
+    exported = client.get(reverse('metrics')).content.decode()
+    assert 'gameconnect_request_duration_seconds_count{view="market"} 1' in exported
+    assert 'gameconnect_request_duration_seconds_count{view="offer_details"} 1' in exported
+    assert f'gameconnect_db_queries_sum{{view="market"}} {queries}' in exported
+    template_time = re.search(r'gameconnect_template_duration_seconds_sum\{view="market"\} ([\d.e-]+)', exported)
+    assert float(template_time.group(1)) > 0
+
+
+@pytest.mark.django_db
+def test_performance_middleware_sampling_and_metrics_access(client, settings, metrics):
+    """ Test that unsampled requests are not timed and that /metrics is only served to allowed addresses. """
+    settings.PERF_SAMPLE_RATE = 0
+    assert not client.get(reverse('main')).has_header('Server-Timing')
+    assert 'view="main"' not in client.get(reverse('metrics')).content.decode()
+    assert client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1').status_code == 404
+
+
+@pytest.mark.django_db
+def test_market_offer_cards_are_cached_until_changed(client, user, exchange_offer, metrics):
+    """ Test that market cards come from the cache until their offer, owner name or game name change. """
+    def market():
+        return client.get(reverse('market')).content.decode()
+
+    assert "Posted by: testuser" in market()
+    assert "Posted by: testuser" in market()
+    assert (FRAGMENT_HITS.value('offer_card'), FRAGMENT_MISSES.value('offer_card')) == (1, 1)
+    assert 'gameconnect_fragment_cache_hits_total{fragment="offer_card"} 1' in render_metrics()
+
+    # logins save the user without renaming it
+    client.login(username='testuser', password='validpassword123!@#')
+    market()
+    assert FRAGMENT_MISSES.value('offer_card') == 1
+
+    user.username = 'renamed'
+    user.save()
+    assert "Posted by: renamed" in market()
+    exchange_offer.game.name = "Game 2"
+    exchange_offer.game.save()
+    assert "Game 2" in market()
+    exchange_offer.refresh_from_db()
+    exchange_offer.description = "Updated description"
+    exchange_offer.save()
+    assert "Updated description" in market()
+    assert FRAGMENT_MISSES.value('offer_card') == 4
+
+
+@pytest.mark.django_db
+def test_external_calls_are_timed(settings, metrics):
+    """ Test that outbox deliveries are exported as email service calls. """
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+    for i in range(3):
+        queue_email("Subject", "Message", f"user{i}@example.com")
+    call_command('send_outbox')
+    assert 'gameconnect_service_call_duration_seconds_count{service="email"} 3' in render_metrics()
+
+
+@pytest.mark.django_db
+def test_views_benchmark_flags_regressions(tmp_path):
+    """ Test that the views benchmark covers every page and fails a comparison with a better baseline. """
+    baseline = tmp_path / "baseline.json"
+    call_command('benchmark', 'views', '--scale', '20', '--save', str(baseline), stdout=StringIO(), stderr=StringIO())
+    urls = json.loads(baseline.read_text())['views']['urls']
+    assert {'main', 'market', 'market?game', 'user_page', 'offer_details', 'api_offers', 'notifications'} <= set(urls)
+    assert {'logout', 'notification_stream', 'notifications_read_all'}.isdisjoint(urls)
+    assert {result['status'] for result in urls.values()} == {200}
+
+    current = {'views': {'urls': {'market': {'p50_ms': 11.0, 'p95_ms': 30.0, 'queries': 5}, 'main': {'p50_ms': 1.1}}}}
+    previous = {'views': {'urls': {'market': {'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 4}, 'main': {'p50_ms': 0.5}}}}
+    assert regressions(previous, current, 0.2) == [
+        "views.urls.market.p95_ms: 20.0 -> 30.0 ms (+50%)", "views.urls.market.queries: 4 -> 5 queries"]
+
+    results = json.loads(baseline.read_text())
+    results['views']['urls']['main']['queries'] = 0
+    baseline.write_text(json.dumps(results))
+    with pytest.raises(CommandError, match="regressions"):
+        call_command('benchmark', 'views', '--scale', '20', '--compare', str(baseline), stdout=StringIO(),
+                     stderr=StringIO())
+
+
+@pytest.mark.django_db
+def test_seed_command_is_reproducible():
+    """ Test that the seed command covers every offer type and bid status and repeats with the same seed. """
+    def seeded(random_seed):
+        call_command('seed', '--users', '20', '--games', '10', '--articles', '5', '--offers', '60',
+                     '--customer-offers', '300', '--notifications', '50', '--offer-types', 'S=2,B=1,E=1',
+                     '--seed', str(random_seed), '--batch-size', '25', stdout=StringIO(), stderr=StringIO())
+        rows = list(CustomerOffer.objects.order_by('id').values_list(
+            'exchange_offer__offer_type', 'exchange_offer__game__name', 'customer__username', 'status'))
+        for model in (Notification, CustomerOffer, ExchangeOffer, Article, Game, User):
+            model.objects.all().delete()
+        return rows
+
+    rows = seeded(1)
+    assert len(rows) == 300
+    assert {offer_type for offer_type, *_ in rows} == {'S', 'B', 'E'}
+    assert {status for *_, status in rows} == {'P', 'A', 'R'}
+    assert seeded(1) == rows
+    assert seeded(2) != rows
+
+    with pytest.raises(CommandError, match="offer-types"):
+        call_command('seed', '--offer-types', 'X=1', stdout=StringIO(), stderr=StringIO())
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('transport', ['wsgi', 'asgi'])
+def test_loadtest_replays_market_flows(transport):
+    """ Test that the load test completes every flow, passing the captcha, and reports every step. """
+    seeding.seed(users=6, games=3, articles=0, offers=20, customer_offers=0, notifications=0, inactive_share=0,
+                 index=False)
+    out = StringIO()
+    # a single virtual user, the shared in-memory test database locks whole tables on writes
+    call_command('loadtest', '--users', '1', '--iterations', '4', '--transport', transport, stdout=out,
+                 stderr=StringIO())
+    results = json.loads(out.getvalue())
+    assert (results['flows'], results['failed_flows']) == (4, 0)
+    assert {step['error_rate'] for step in results['steps'].values()} == {0.0}
+    assert results['steps']['accept_offer']['requests'] == 4
+    assert CustomerOffer.objects.filter(status="A", description="Load test offer").count() == 4
+    assert ExchangeOffer.objects.filter(status=False).count() == 4
+    assert OutgoingEmail.objects.count() == 8
+
+
+def sequential_scans(queries):
+    """ Runs EXPLAIN on every captured gameapp query and returns the plan lines that read a whole table. """
+    scans = []
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SET enable_seqscan = off")
+        for query in queries:
+            if 'gameapp_' not in query['sql']:
+                continue
+            if connection.vendor == 'postgresql':
+                cursor.execute("EXPLAIN " + query['sql'])
+                plan = [row[0] for row in cursor.fetchall()]
+                scans += [line for line in plan if re.search(r'Seq Scan on gameapp_', line)]
+            else:
+                cursor.execute("EXPLAIN QUERY PLAN " + query['sql'])
+                plan = [row[-1] for row in cursor.fetchall()]
+                scans += [line for line in plan if re.match(r'SCAN gameapp_\w+$', line)]
+    return scans
+
+
+def query_plans(queries):
+    """ Returns the SQLite query plan lines of the captured gameapp queries. """
+    with connection.cursor() as cursor:
+        return [row[-1] for query in queries if 'gameapp_' in query['sql']
+                for row in cursor.execute("EXPLAIN QUERY PLAN " + query['sql']).fetchall()]
+
+
+@pytest.mark.django_db
+def test_views_use_indexes(client, user):
+    """ Test that the market, user and offer pages are served from indexes on a seeded dataset. """
+    games = [Game.objects.create(name=f"Game {i}", description="text") for i in range(5)]
+    other = User.objects.create(username='user2')
+    offers = ExchangeOffer.objects.bulk_create(
+        ExchangeOffer(owner=user if i % 2 else other, offer_type="S", game=games[i % 5], price=1.0,
+                      description="text", status=bool(i % 3)) for i in range(200))
+    CustomerOffer.objects.bulk_create(
+        CustomerOffer(exchange_offer=offers[i % 200], customer=other, game_name=games[0], description="text")
+        for i in range(400))
+    Notification.objects.bulk_create(Notification(user=user, description="text") for _ in range(200))
+    Article.objects.create(slug="article-1", game=games[0], title="Article 1", content="text")
+    owned_offer = ExchangeOffer.objects.filter(owner=user).first()
+
+    urls = [
+        reverse('market'),
+        reverse('market') + '?game=Game+1',
+        reverse('user_page', args=[user.id]),
+        reverse('notifications', args=[user.id]),
+        reverse('offer_details', args=[owned_offer.id]),
+        reverse('article_detail', args=['article-1']),
+    ]
+    for url in urls:
+        with CaptureQueriesContext(connection) as context:
+            assert client.get(url).status_code == 200
+        assert sequential_scans(context.captured_queries) == [], url
+
+
+@pytest.mark.django_db
+def test_market_filters_use_indexes(client, user):
+    """ Test that every market filter and sort combination is read from an index without sorting the table
+    or counting the offers. """
+    games = [Game.objects.create(name=f"Game {i}", description="text") for i in range(5)]
+    ExchangeOffer.objects.bulk_create(
+        ExchangeOffer(owner=user, offer_type="SBE"[i % 3], game=games[i % 5], price=None if i % 3 == 2 else i % 50,
+                      description="text", status=bool(i % 4)) for i in range(300))
+
+    for game, offer_type, prices, sort in itertools.product(
+            ("", "Game 1"), ("", "S"),
+            ({}, {'min_price': 10}, {'max_price': 40}, {'min_price': 10, 'max_price': 40}),
+            ("newest", "price", "-price")):
+        params = {'game': game, 'offer_type': offer_type, 'sort': sort, **prices}
+        with CaptureQueriesContext(connection) as context:
+            assert client.get(reverse('market'), params).status_code == 200
+        assert sequential_scans(context.captured_queries) == [], params
+        assert not any('COUNT(' in query['sql'] and ExchangeOffer._meta.db_table in query['sql']
+                       for query in context.captured_queries), params
+        if connection.vendor == 'sqlite' and not (prices and sort == "newest"):
+            # only the offers of a price range, listed newest first, are sorted
+            assert not any('TEMP B-TREE' in line for line in query_plans(context.captured_queries)), params
+
+
+def count_queries(client, url):
+    """ Returns the number of queries a GET request to the url runs once the per-user caches are warm. """
+    assert client.get(url).status_code == 200
+    with CaptureQueriesContext(connection) as context:
+        assert client.get(url).status_code == 200
+    return len(context.captured_queries)
+
+
+def seed_offers(owner, customer, count):
+    """ Creates `count` active and closed offers of the owner, each on its own game with one customer offer. """
+    for i in range(count):
+        game = Game.objects.create(name=f"Seeded game {owner.id}-{i}-{Game.objects.count()}", description="text")
+        for status in (True, False):
+            offer = ExchangeOffer.objects.create(owner=owner, offer_type="S", game=game, price=1.0, description="text",
+                                                 status=status)
+            CustomerOffer.objects.create(exchange_offer=offer, customer=customer, game_name=game, description="text")
+
+
+@pytest.mark.django_db
+def test_market_list_view_query_budget(client, user):
+    """ Test that the MarketListView runs the same number of queries for one offer and for a full page. """
+    other = User.objects.create(username='user2')
+    seed_offers(other, user, 1)
+    baseline = count_queries(client, reverse('market'))
+    seed_offers(User.objects.create(username='user3'), user, 30)
+    assert count_queries(client, reverse('market')) == baseline
+
+
+@pytest.mark.django_db
+def test_offer_details_view_query_budget(client, user, exchange_offer):
+    """ Test that the OfferDetailsView runs the same number of queries regardless of the number of customer offers. """
+    def add_customer_offers(count):
+        for i in range(count):
+            customer = User.objects.create(username=f"customer{CustomerOffer.objects.count()}")
+            game = Game.objects.create(name=f"Customer game {CustomerOffer.objects.count()}", description="text")
+            CustomerOffer.objects.create(exchange_offer=exchange_offer, customer=customer, game_name=game,
+                                         description="text")
+
+    url = reverse('offer_details', args=[exchange_offer.id])
+    add_customer_offers(1)
+    baseline = count_queries(client, url)
+    add_customer_offers(30)
+    assert count_queries(client, url) == baseline
+
+
+@pytest.mark.django_db
+def test_user_page_view_query_budget(client, user):
+    """ Test that the UserPageView runs the same number of queries regardless of the number of offers. """
+    other = User.objects.create(username='user2')
+    url = reverse('user_page', args=[user.id])
+    seed_offers(user, other, 1)
+    baseline = count_queries(client, url)
+    seed_offers(user, other, 30)
+    assert count_queries(client, url) == baseline
+
+
+@pytest.mark.django_db
+def test_archive_offers_moves_old_closed_offers(client, user, django_capture_on_commit_callbacks):
+    """ Test that old closed offers move to the archive with their bids in resumable batches and stay visible. """
+    other = User.objects.create(username='user2')
+    seed_offers(user, other, 3)
+    old = timezone.now() - timedelta(days=100)
+    closed = list(ExchangeOffer.objects.filter(status=False).order_by('id'))
+    ExchangeOffer.objects.filter(id__in=[closed[0].id, closed[1].id]).update(modified=old)
+    ExchangeOffer.objects.filter(status=True).update(modified=old)
+    for offer in closed:
+        SearchDocument.objects.create(kind='offer', object_key=str(offer.id), length=1)
+    main_page = current_version('main_page')
+
+    # a failing batch is rolled back whole and the next run resumes with it
+    bulk_create = ArchivedCustomerOffer.objects.bulk_create
+    calls = []
+
+    def fail_second_batch(objs, *args, **kwargs):
+        calls.append(objs)
+        if len(calls) == 2:
+            raise OperationalError("disk I/O error")
+        return bulk_create(objs, *args, **kwargs)
+
+    with mock.patch.object(ArchivedCustomerOffer.objects, 'bulk_create', side_effect=fail_second_batch):
+        with pytest.raises(OperationalError):
+            call_command('archive_offers', '--days', '30', '--batch-size', '1', stdout=StringIO(), stderr=StringIO())
+    assert list(ArchivedExchangeOffer.objects.values_list('id', flat=True)) == [closed[0].id]
+
+    out = StringIO()
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command('archive_offers', '--days', '30', '--batch-size', '1', stdout=out, stderr=StringIO())
+    assert "Archived 1 offers and 1 customer offers" in out.getvalue()
+    archived = {closed[0].id, closed[1].id}
+    assert set(ArchivedExchangeOffer.objects.values_list('id', flat=True)) == archived
+    assert set(ArchivedCustomerOffer.objects.values_list('exchange_offer_id', flat=True)) == archived
+    assert set(ExchangeOffer.objects.filter(status=False).values_list('id', flat=True)) == {closed[2].id}
+    assert ExchangeOffer.objects.filter(status=True).count() == 3
+    assert CustomerOffer.objects.count() == 4
+
+    # the search documents of the archived offers and the cached main page are dropped
+    remaining = {str(offer_id) for offer_id in ExchangeOffer.objects.values_list('id', flat=True)}
+    assert set(SearchDocument.objects.filter(kind='offer').values_list('object_key', flat=True)) == remaining
+    assert current_version('main_page') != main_page
+
+    # the user page and the offer details read the archive too
+    response = client.get(reverse('user_page', args=[user.id]))
+    assert [offer.id for offer in response.context['inactive_offers']] == [closed[2].id, closed[1].id, closed[0].id]
+    with mock.patch.object(UserPageView, 'closed_offers', 2):
+        response = client.get(reverse('user_page', args=[user.id]))
+    assert [offer.id for offer in response.context['inactive_offers']] == [closed[2].id, closed[1].id]
+    response = client.get(reverse('offer_details', args=[closed[0].id]))
+    assert response.status_code == 200
+    assert [bid.customer for bid in response.context['customers']] == [other]
+
+
+@pytest.mark.django_db
+def test_archive_batch_runs_fixed_queries(user):
+    """ Test that archiving a batch takes the same queries for one offer and for many. """
+    other = User.objects.create(username='user2')
+    seed_offers(user, other, 6)
+    ExchangeOffer.objects.filter(status=False).update(modified=timezone.now() - timedelta(days=100))
+
+    def archive(batch_size):
+        with CaptureQueriesContext(connection) as context:
+            assert archive_batch(timezone.now(), batch_size)[0] == batch_size
+        return len(context.captured_queries)
+
+    assert archive(1) == archive(5)
+
+
+@pytest.mark.django_db
+def test_purge_notifications_applies_retention(user, django_capture_on_commit_callbacks):
+    """ Test that old read notifications expire and every user keeps only their newest ones, in batches. """
+    other = User.objects.create(username='user2')
+    notify_many([(user.id, f"Old {i}") for i in range(5)] + [(other.id, f"Other {i}") for i in range(6)])
+    Notification.objects.filter(description__in=["Old 0", "Old 1", "Old 2"]).update(status=True)
+    Notification.objects.filter(description__startswith="Old").update(created=timezone.now() - timedelta(days=40))
+    notify_many([(user.id, "New read")])
+    Notification.objects.filter(description="New read").update(status=True)
+    assert unread_count(other.id) == 6
+
+    out = StringIO()
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command('purge_notifications', '--days', '30', '--max-per-user', '4', '--batch-size', '2', stdout=out)
+    assert "Deleted 5 notifications (3 expired, 2 over the per-user cap)" in out.getvalue()
+    assert sorted(Notification.objects.filter(user=user).values_list('description', flat=True)) == [
+        "New read", "Old 3", "Old 4"]
+    assert sorted(Notification.objects.filter(user=other).values_list('description', flat=True)) == [
+        "Other 2", "Other 3", "Other 4", "Other 5"]
+    assert unread_count(other.id) == 4
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert purge_notifications(30, 0, batch_size=2) == (0, 7)
+    assert not Notification.objects.exists()
+    assert unread_count(other.id) == 0
+    with pytest.raises(CommandError):
+        call_command('purge_notifications', '--max-per-user', '-1', stdout=StringIO())
+
+
+class CountingEmailBackend(EmailBackend):
+    """ A locmem backend counting the connections it opens, reusing an open one like the SMTP backend. """
+    opened = 0
+    is_open = False
+
+    def open(self):
+        if self.is_open:
+            return False
+        self.is_open = True
+        CountingEmailBackend.opened += 1
+        return True
+
+    def close(self):
+        self.is_open = False
+
+
+class FailingEmailBackend(EmailBackend):
+    """ A locmem backend whose every delivery fails. """
+
+    def send_messages(self, messages):
+        raise ConnectionError("SMTP server unavailable")
+
+
+@pytest.mark.django_db
+def test_send_outbox_delivers_each_email_once(settings):
+    """ Test that send_outbox delivers queued emails in batches over one connection, and only once. """
+    settings.EMAIL_BACKEND = 'gameapp.tests.CountingEmailBackend'
+    CountingEmailBackend.opened = 0
+    for i in range(250):
+        queue_email("Subject", f"Message {i}", f"user{i}@example.com")
+
+    call_command('send_outbox', '--batch-size', '100')
+    call_command('send_outbox', '--batch-size', '100')
+
+    assert len(mail.outbox) == 250
+    assert sorted(message.to[0] for message in mail.outbox) == sorted(f"user{i}@example.com" for i in range(250))
+    assert CountingEmailBackend.opened == 3
+    assert not OutgoingEmail.objects.filter(sent__isnull=True).exists()
+
+
+@pytest.mark.django_db
+def test_send_outbox_retries_with_backoff(settings):
+    """ Test that send_outbox reschedules failed emails with growing delays and gives up after the last attempt. """
+    settings.EMAIL_BACKEND = 'gameapp.tests.FailingEmailBackend'
+    settings.OUTBOX_MAX_ATTEMPTS = 2
+    email = queue_email("Subject", "Message", "user@example.com")
+
+    call_command('send_outbox')
+    email.refresh_from_db()
+    assert (email.attempts, email.failed, email.sent) == (1, False, None)
+    assert email.last_error == "SMTP server unavailable"
+    first_retry = email.next_attempt - email.added
+
+    OutgoingEmail.objects.filter(id=email.id).update(next_attempt=email.added)
+    call_command('send_outbox')
+    email.refresh_from_db()
+    assert (email.attempts, email.failed) == (2, True)
+    assert email.next_attempt - email.added > first_retry
@@ -1,25 +1,34 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib.auth.views import LoginView
-from django.core.mail import EmailMultiAlternatives
-from django.http import Http404
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
 from django.urls import reverse_lazy
 from django.views import View
 from django.views.generic import FormView, ListView, CreateView, TemplateView
-from mailchimp_marketing import Client
-from mailchimp_marketing.api_client import ApiClientError
-from gameapp.forms import AddOfferForm, MakeOfferForm, AcceptForm, NotificationForm, NewGameForm, NewArticleForm, \
-    CustomUserCreationForm
-from gameapp.models import Game, Article, ExchangeOffer, CustomerOffer, Notification
-from gameconnect import local_settings
-
-# Mailchimp Settings
-api_key = local_settings.MAILCHIMP_API_KEY
-server = local_settings.MAILCHIMP_DATA_CENTER
-list_id = local_settings.MAILCHIMP_EMAIL_LIST_ID
+from gameapp.forms import AddOfferForm, MakeOfferForm, AcceptForm, NotificationForm, NotificationSelectionForm, \
+    NewGameForm, NewArticleForm, CustomUserCreationForm, MarketFilterForm
+from gameapp.cache import get_or_build, get_or_render_many
+from gameapp.mail import queue_email
+from gameapp.matching import match_offer
+from gameapp.metrics import render_metrics
+from gameapp.notifications import notify, invalidate_unread
+from gameapp.offers import accept_offer
+from gameapp.models import Game, Article, ExchangeOffer, CustomerOffer, Notification, GameMarketStats, \
+    GamePriceStats, ArchivedExchangeOffer, ArchivedCustomerOffer, SEARCH_KIND_CHOICES, OFFER_TYPE_CHOICES
+from gameapp.realtime import get_hub, notification_event, format_event, QUEUE_SIZE
+from gameapp.pagination import KeysetPaginator, InvalidCursor, cursor_query
+from gameapp.search import search
+from gameapp.subscriptions import normalize_email, subscribe
 
 
 class CustomLoginView(LoginView):
@@ -35,13 +44,20 @@ class RegisterView(CreateView):
 
 
 class MainView(View):
-    """ A class-based view for the main page. """
+    """ A class-based view for the main page. The latest objects are cached until one of them changes. """
+    cache_name = 'main_page'
 
     def get(self, request):
-        game = Game.objects.latest('added')
-        article = Article.objects.latest('added')
-        offer = ExchangeOffer.objects.latest('added')
-        return render(request, 'main.html', {"article": article, "game": game, "offer": offer})
+        return render(request, 'main.html', get_or_build(self.cache_name, self.latest))
+
+    @staticmethod
+    def latest():
+        """ Loads the latest game, article and offer, any of which may be missing on an empty site. """
+        return {
+            "game": Game.objects.order_by('-added').first(),
+            "article": Article.objects.order_by('-added').first(),
+            "offer": ExchangeOffer.objects.select_related('game').order_by('-added').first(),
+        }
 
 
 class GamesListView(ListView):
@@ -68,40 +84,110 @@ class ArticleDetailsView(LoginRequiredMixin, View):
         return render(request, 'article.html', {"article": article, "user": user})
 
 
-class MarketListView(ListView):
-    """ A class-based view for listing all active exchange offers ordered by the added date,
-    optionally filtered by game name. """
+class MarketFilterMixin:
+    """ Selects the active exchange offers matching the market filters of the query string, in the requested
+    order. Shared by the market page and the JSON API; invalid filter values are ignored. """
+    orderings = {'newest': ('-added', '-id'), 'price': ('price', 'id'), '-price': ('-price', '-id')}
+
+    def market_filters(self):
+        if not hasattr(self, '_market_filters'):
+            form = MarketFilterForm(self.request.GET)
+            form.is_valid()
+            self._market_filters = form.cleaned_data
+        return self._market_filters
+
+    def market_ordering(self):
+        return self.orderings[self.market_filters().get('sort') or 'newest']
+
+    def filter_offers(self, offers):
+        filters = self.market_filters()
+        offers = offers.filter(status=True)
+        if filters.get('game'):
+            offers = offers.filter(game__name=filters['game'])
+        if filters.get('offer_type'):
+            offers = offers.filter(offer_type=filters['offer_type'])
+        bounds = {lookup: filters[name] for name, lookup in (('min_price', 'gte'), ('max_price', 'lte'))
+                  if filters.get(name) is not None}
+        if not bounds and self.market_ordering()[0] == '-added':
+            return offers
+        # Exchange offers have no price, price filters and sorts list the priced offers from the price indexes
+        return offers.filter(price__isnull=False, **{f'price__{lookup}': value for lookup, value in bounds.items()})
+
+
+class MarketListView(MarketFilterMixin, ListView):
+    """ A class-based view for listing the active exchange offers, newest or by price, optionally filtered by
+    game name, offer type and price range. Paginated with cursors on the sort key instead of page numbers. """
     template_name = "market.html"
     model = ExchangeOffer
+    paginate_by = 20
 
     def get_context_data(self, **kwargs):
-        """ Adds game list without duplicates to context. """
+        """ Adds the games with active offers, their offer counts and the neighbouring page links to context. """
         context = super().get_context_data(**kwargs)
-        context['games'] = ExchangeOffer.objects.filter(status=True).values_list('game__name', flat=True).distinct()
+        games = GameMarketStats.objects.filter(active_offers__gt=0).select_related('game').order_by('game__name')
+        context['games'] = games
+        context['offer_types'] = OFFER_TYPE_CHOICES
+        context['sort_choices'] = MarketFilterForm.SORT_CHOICES
+        game_filter = self.request.GET.get('game')
+        context['game_stats'] = next((stats for stats in games if stats.game.name == game_filter), None)
 
+        # a card is cached until its offer, owner name or game name changes, see ExchangeOffer.modified
+        context['offer_cards'] = get_or_render_many('offer_card', [
+            (f"{offer.id}:{offer.modified.timestamp()}", offer) for offer in context['object_list']],
+            lambda offer: render_to_string('offer_card.html', {'offer': offer}))
+
+        page = context['page_obj']
+        context['next_query'] = cursor_query(self.request.GET, 'after', page.next_cursor)
+        context['previous_query'] = cursor_query(self.request.GET, 'before', page.previous_cursor)
         return context
 
+    def paginate_queryset(self, queryset, page_size):
+        """ Fetches a single page after/before the cursor given in the query string. """
+        paginator = KeysetPaginator(queryset, page_size, ordering=self.market_ordering())
+        try:
+            page = paginator.page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return paginator, page, page.object_list, page.has_other_pages()
+
     def get_queryset(self):
-        """ Retrieves the queryset of active exchange offers, optionally filtered by the selected game. """
-        game_filter = self.request.GET.get('game')
-        if game_filter:
-            active_offers = ExchangeOffer.objects.filter(status=True, game__name=game_filter).order_by('-added')
-        else:
-            active_offers = ExchangeOffer.objects.filter(status=True).order_by('-added')
-        return active_offers
+        """ Retrieves the queryset of active exchange offers matching the filters. """
+        return self.filter_offers(ExchangeOffer.objects.select_related('game', 'owner', 'wanted_game'))
+
+
+class SearchView(View):
+    """ A class-based view for ranked full-text search over articles, games and active offers. """
+    template_name = 'search.html'
+
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        kind = request.GET.get('kind', '')
+        kinds = [kind] if kind in dict(SEARCH_KIND_CHOICES) else None
+        results = search(query, kinds=kinds) if query else []
+        return render(request, self.template_name, {
+            "query": query, "kind": kind, "kinds": SEARCH_KIND_CHOICES, "results": results})
 
 
 class UserPageView(LoginRequiredMixin, View):
     """ A class-based view for displaying a user's page, with login requirement. """
     login_url = reverse_lazy('login')
+    # the newest closed offers shown
+    closed_offers = 20
 
     def get(self, request, user_id):
         if user_id != request.user.id:
             raise Http404
 
-        notifications = Notification.objects.filter(user=user_id).order_by('-id')
-        active_offers = ExchangeOffer.objects.filter(owner=user_id, status=True)
-        inactive_offers = ExchangeOffer.objects.filter(owner=user_id, status=False)
+        notifications = Notification.objects.filter(user=user_id).order_by('-id')[:5]
+        offers = ExchangeOffer.objects.select_related('game', 'owner')
+        active_offers = offers.filter(owner=user_id, status=True)
+        # offers closed long ago have been moved to the archive, see gameapp.archive: the newest of both tables
+        # are merged
+        closed = offers.filter(owner=user_id, status=False).order_by('-added', '-id')[:self.closed_offers]
+        archived = (ArchivedExchangeOffer.objects.select_related('game', 'owner').filter(owner=user_id)
+                    .order_by('-added', '-id')[:self.closed_offers])
+        inactive_offers = sorted([*closed, *archived], key=lambda offer: (offer.added, offer.id),
+                                 reverse=True)[:self.closed_offers]
         return render(request, 'user_page.html', {
             "active_offers": active_offers, "inactive_offers": inactive_offers, "notifications": notifications})
 
@@ -110,9 +196,8 @@ class UserPageView(LoginRequiredMixin, View):
         form = NotificationForm(request.POST)
         if form.is_valid():
             notification_id = form.cleaned_data['notification_id']
-            notification = Notification.objects.get(id=notification_id)
-            notification.status = True
-            notification.save()
+            Notification.objects.filter(id=notification_id, user=request.user.id).update(status=True)
+            invalidate_unread(request.user.id)
 
         return redirect('user_page', user_id=request.user.id)
 
@@ -131,6 +216,7 @@ class ChangePasswordView(View):
     def post(self, request, user_id):
         form = PasswordChangeForm(request.user, request.POST)
         if form.is_valid():
+            # saving the user drops it from the authentication cache, logging out its other sessions
             form.save()
             update_session_auth_hash(request, request.user)
             return redirect('user_page', user_id)
@@ -150,9 +236,13 @@ class AddOfferView(LoginRequiredMixin, FormView):
     def form_valid(self, form):
         user_id = self.request.user.id
 
-        new_offer = form.save(commit=False)
-        new_offer.owner_id = user_id
-        new_offer.save()
+        with transaction.atomic():
+            new_offer = form.save(commit=False)
+            new_offer.owner_id = user_id
+            new_offer.save()
+            GameMarketStats.offer_opened(new_offer)
+            GamePriceStats.offer_listed(new_offer)
+            match_offer(new_offer)
         return redirect('market')
 
 
@@ -176,36 +266,34 @@ class MakeOfferView(LoginRequiredMixin, FormView):
         offer_id = self.kwargs.get('offer_id')
         context['offer_id'] = offer_id
         context['offer'] = ExchangeOffer.objects.get(id=offer_id)
+        context['price_stats'] = GamePriceStats.summaries(context['offer'].game_id, context['offer'].offer_type)
         return context
 
     def form_valid(self, form):
         offer_id = self.kwargs.get('offer_id')
         customer = self.request.user.id
 
-        # save new offer to CustomerOffer
-        new_offer = form.save(commit=False)
-        new_offer.exchange_offer_id = offer_id
-        new_offer.customer_id = customer
-        new_offer.save()
-
-        # send email notification to offer owner
-        owner = ExchangeOffer.objects.get(id=offer_id)
-        text_content = (f"New offer was made to Your listing {owner.get_offer_type_display()} - {owner.game}, please "
-                        f"go to Your User Page - My active offers - Details to review it.")
-        self.send_notification_email(owner.owner.email, text_content)
-
-        # create notification for offer's owner
-        notification = f"New offer was made to Your listing {owner.get_offer_type_display()} - {owner.game}"
-        Notification.objects.create(user=owner.owner, description=notification)
+        with transaction.atomic():
+            # save new offer to CustomerOffer
+            new_offer = form.save(commit=False)
+            new_offer.exchange_offer_id = offer_id
+            new_offer.customer_id = customer
+            new_offer.save()
+
+            # queue email notification to offer owner
+            owner = ExchangeOffer.objects.select_related('owner', 'game').get(id=offer_id)
+            text_content = (f"New offer was made to Your listing {owner.get_offer_type_display()} - {owner.game}, "
+                            f"please go to Your User Page - My active offers - Details to review it.")
+            self.send_notification_email(owner.owner.email, text_content)
+
+            # create notification for offer's owner
+            notification = f"New offer was made to Your listing {owner.get_offer_type_display()} - {owner.game}"
+            notify(owner.owner, notification)
         return redirect('market')
 
     def send_notification_email(self, email, text_content):
-        """ Send an email when offer is made by customer. """
-        subject, from_email, to = "New offer made by customer", "emistrij@gmail.com", email
-        html_content = f"<p>{text_content}</p>"
-        msg = EmailMultiAlternatives(subject, text_content, from_email, [to])
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
+        """ Queue an email when offer is made by customer. """
+        queue_email("New offer made by customer", text_content, email)
 
 
 class OfferDetailsView(LoginRequiredMixin, View):
@@ -213,50 +301,23 @@ class OfferDetailsView(LoginRequiredMixin, View):
     login_url = reverse_lazy('login')
 
     def get(self, request, offer_id):
-        try:
-            offer = ExchangeOffer.objects.get(id=offer_id)
-        except ExchangeOffer.DoesNotExist:
-            raise Http404
+        offer = ExchangeOffer.objects.select_related('game').filter(id=offer_id).first()
+        customer_offers = CustomerOffer.objects
+        if offer is None:
+            offer = ArchivedExchangeOffer.objects.select_related('game').filter(id=offer_id).first()
+            customer_offers = ArchivedCustomerOffer.objects
 
-        if offer.owner != request.user:
+        if offer is None or offer.owner_id != request.user.id:
             raise Http404
         # get all customer's offers
-        customers = CustomerOffer.objects.filter(exchange_offer_id=offer_id)
+        customers = customer_offers.filter(exchange_offer_id=offer_id).select_related('customer', 'game_name')
         return render(request, 'offer_details.html', {"offer": offer, "customers": customers})
 
     def post(self, request, offer_id):
         form = AcceptForm(request.POST)
         if form.is_valid():
-            offer = ExchangeOffer.objects.get(id=offer_id)
-            customer_offer_id = form.cleaned_data.get('customer_offer_id')
-            customers = CustomerOffer.objects.filter(exchange_offer_id=offer_id)
-
-            if offer.status:
-                for customer in customers:
-                    if customer.id == customer_offer_id:
-                        customer.status = "A"
-                        offer_details = offer.get_offer_type_display() + "-" + str(offer.game)
-                        notification = (
-                            f"User {offer.owner.username} has accepted your offer for {offer_details}. Please "
-                            f"reach out ot them via email {offer.owner.email}")
-                        Notification.objects.create(user=customer.customer, description=notification)
-                        self.send_notification_email(customer.customer.email, notification)
-
-                    else:
-                        customer.status = "R"
-                    customer.save()
-
-                offer.status = False
-                offer.save()
-            return redirect('offer_details', offer_id=offer_id)
-
-    def send_notification_email(self, email, text_content):
-        """ Send an email when offer is accepted by owner. """
-        subject, from_email, to = "You offer was accepted", "emistrij@gmail.com", email
-        html_content = f"<p>{text_content}</p>"
-        msg = EmailMultiAlternatives(subject, text_content, from_email, [to])
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
+            accept_offer(offer_id, request.user.id, form.cleaned_data['customer_offer_id'])
+        return redirect('offer_details', offer_id=offer_id)
 
 
 class SubscribeView(View):
@@ -267,39 +328,23 @@ class SubscribeView(View):
         return render(request, self.template_name)
 
     def post(self, request):
-        email = request.POST['email']
-        self.subscribe(email)
-        self.send_welcome_email(email)
+        # the welcome email goes to the address as it is stored and synced
+        email = normalize_email(request.POST['email'])
+        with transaction.atomic():
+            if self.subscribe(email):
+                self.send_welcome_email(email)
         messages.success(request, "Email received. Thank You!")
         return render(request, self.template_name)
 
     def subscribe(self, email):
-        """ A method for subscribing an email to a mailing list using the Mailchimp API. """
-
-        mailchimp = Client()
-        mailchimp.set_config({
-            "api_key": api_key,
-            "server": server,
-        })
-
-        member_info = {
-            "email_address": email,
-            "status": "subscribed",
-        }
-
-        try:
-            mailchimp.lists.add_list_member(list_id, member_info)
-        except ApiClientError as error:
-            print("An exception occurred: {}".format(error.text))
+        """ Queues an email for the mailing list, it is added to Mailchimp by the sync_subscriptions command.
+        Returns False for an email that is already subscribed. """
+        return subscribe(email)
 
     def send_welcome_email(self, email):
-        """ Send a welcome email to the new subscribed user. """
-        subject, from_email, to = "Welcome to Our Mailing List", "emistrij@gmail.com", email
+        """ Queue a welcome email to the new subscribed user. """
         text_content = "Thank you for subscribing to our mailing list. We are excited to have you on board!"
-        html_content = "<p>Thank you for subscribing to our mailing list. We are excited to have you on board!</p>"
-        msg = EmailMultiAlternatives(subject, text_content, from_email, [to])
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
+        queue_email("Welcome to Our Mailing List", text_content, email)
 
 
 class GameCreateView(PermissionRequiredMixin, CreateView):
@@ -327,23 +372,125 @@ class ArticleCreateView(PermissionRequiredMixin, CreateView):
 
 
 class NotificationView(LoginRequiredMixin, View):
-    """ A class-based view for displaying all user notifications, with login requirement. """
+    """ A class-based view for displaying user notifications newest first, paginated by id cursors,
+    with login requirement. """
     login_url = reverse_lazy('login')
+    paginate_by = 20
 
     def get(self, request, user_id):
         if user_id != request.user.id:
             raise Http404
 
-        notifications = Notification.objects.filter(user=user_id).order_by('-id')
-        return render(request, 'notifications.html', {"notifications": notifications})
+        paginator = KeysetPaginator(Notification.objects.filter(user=user_id), self.paginate_by, ordering=('-id',))
+        try:
+            page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return render(request, 'notifications.html', {
+            "notifications": page.object_list, "page_obj": page,
+            "next_query": cursor_query(request.GET, 'after', page.next_cursor),
+            "previous_query": cursor_query(request.GET, 'before', page.previous_cursor)})
 
     def post(self, request, user_id):
         """ Handles POST requests to delete notifications. """
         form = NotificationForm(request.POST)
         if form.is_valid():
             notification_id = form.cleaned_data['notification_id']
-            notification = Notification.objects.get(id=notification_id)
-            notification.delete()
+            Notification.objects.filter(id=notification_id, user=request.user.id).delete()
+            invalidate_unread(request.user.id)
 
         return redirect('notifications', user_id=request.user.id)
 
+
+class NotificationBulkView(LoginRequiredMixin, View):
+    """ A class-based view for changing many notifications of the user with one statement, with login requirement.
+    Subclasses implement apply() for the notifications of the user. """
+    login_url = reverse_lazy('login')
+
+    def post(self, request, user_id):
+        if user_id != request.user.id:
+            raise Http404
+
+        self.apply(request, Notification.objects.filter(user=request.user.id))
+        invalidate_unread(request.user.id)
+        return redirect('notifications', user_id=request.user.id)
+
+    def apply(self, request, notifications):
+        raise NotImplementedError
+
+
+class MarkAllReadView(NotificationBulkView):
+    """ Marks every unread notification of the user as read. """
+
+    def apply(self, request, notifications):
+        notifications.filter(status=False).update(status=True)
+
+
+class DeleteReadView(NotificationBulkView):
+    """ Deletes every read notification of the user. """
+
+    def apply(self, request, notifications):
+        notifications.filter(status=True).delete()
+
+
+class DeleteSelectedView(NotificationBulkView):
+    """ Deletes the notifications of the user selected on the notifications page. """
+
+    def apply(self, request, notifications):
+        form = NotificationSelectionForm(request.POST)
+        if form.is_valid():
+            notifications.filter(id__in=form.cleaned_data['notification_ids']).delete()
+
+
+class NotificationStreamView(View):
+    """ An async class-based view pushing the new notifications of the user as server-sent events.
+    Waiting streams hold no thread under ASGI; under WSGI the stream is declined so the browser stops retrying. """
+
+    async def get(self, request):
+        user_id = await sync_to_async(lambda: request.user.id if request.user.is_authenticated else None)()
+        if user_id is None:
+            return HttpResponse(status=401)
+        if not isinstance(request, ASGIRequest):
+            return HttpResponse(status=204)
+
+        try:
+            last_id = int(request.headers.get('Last-Event-ID', 0))
+        except ValueError:
+            last_id = 0
+        response = StreamingHttpResponse(self.events(user_id, last_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def events(self, user_id, last_id):
+        """ Yields the notifications missed since last_id, then every new one, with periodic keep-alives.
+        Django does not notice a closed connection while streaming, so the stream ends after
+        NOTIFICATION_STREAM_MAX_AGE and the browser reconnects with Last-Event-ID. """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.NOTIFICATION_STREAM_MAX_AGE
+        async with get_hub().subscribe(user_id) as queue:
+            # subscribed before reading the missed notifications, so none can slip in between
+            if last_id:
+                missed = Notification.objects.filter(user=user_id, id__gt=last_id).order_by('id')[:QUEUE_SIZE]
+                async for notification in missed:
+                    last_id = notification.id
+                    yield format_event(notification_event(notification))
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    event = await asyncio.wait_for(queue.get(), min(settings.NOTIFICATION_STREAM_KEEPALIVE, remaining))
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event['id'] > last_id:
+                    last_id = event['id']
+                    yield format_event(event)
+
+
+class MetricsView(View):
+    """ A class-based view exporting the performance metrics in the Prometheus text format,
+    to the addresses listed in METRICS_ALLOWED_IPS only. """
+
+    def get(self, request):
+        if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+            raise Http404
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -30,11 +30,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'gameapp.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'gameapp.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -43,7 +44,7 @@ ROOT_URLCONF = 'gameconnect.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'gameapp.templates.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -52,6 +53,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'gameapp.context_processors.notifications',
             ],
         },
     },
@@ -103,6 +105,68 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = 'main'
 LOGOUT_REDIRECT_URL = 'login'
 
+# Cache for computed page payloads; with several processes use a shared backend (e.g. Redis), which every
+# invalidation reaches, otherwise each worker serves payloads up to LOCAL_CACHE_VERSION_TIMEOUT old
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # sessions and logged-in users of the authentication fast path (gameapp.auth), which is only on when every worker
+    # shares this cache, e.g. {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    # 'LOCATION': 'redis://127.0.0.1:6379/1'} (needs the redis package); with the process-local default the sessions
+    # stay in the database
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+SESSION_ENGINE = 'gameapp.sessions'
+SESSION_CACHE_ALIAS = 'auth'
+AUTH_USER_CACHE_TIMEOUT = 5 * 60  # cached users are dropped on every save and on logout, the timeout bounds their age
+PAYLOAD_CACHE_TIMEOUT = 60 * 60  # payloads are invalidated on writes, the timeout only bounds their age
+LOCAL_CACHE_VERSION_TIMEOUT = 30  # seconds payload versions live in a process-local cache, see gameapp.cache
+FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60  # fragments are keyed on version stamps, the timeout evicts old ones
+NOTIFICATION_COUNT_TIMEOUT = 60 * 60  # unread counters are dropped on every notification write
+
+# Performance metrics of a sample of the requests, exported at /metrics and in a Server-Timing header
+PERF_SAMPLE_RATE = 0.1  # share of the requests that are timed
+PERF_SERVER_TIMING = True
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']  # addresses allowed to scrape /metrics
+
+# Accepts "PASSED" as the answer of every captcha; only for a server driven by `loadtest --base-url`
+CAPTCHA_TEST_MODE = False
+
+# Real-time notifications, streamed when served by an ASGI server (e.g. `uvicorn gameconnect.asgi:application`).
+# Use 'gameapp.realtime.BrokerHub' with the notification_broker command when running several workers.
+NOTIFICATION_HUB = 'gameapp.realtime.InProcessHub'
+NOTIFICATION_BROKER_ADDRESS = ('127.0.0.1', 8765)
+NOTIFICATION_STREAM_KEEPALIVE = 15  # seconds between keep-alive comments on an idle stream
+NOTIFICATION_STREAM_MAX_AGE = 5 * 60  # seconds before a stream ends, the browser reconnects with Last-Event-ID
+
+# Notification retention, enforced by the purge_notifications management command
+NOTIFICATION_READ_RETENTION_DAYS = 30  # read notifications are deleted this many days after their creation
+NOTIFICATION_MAX_PER_USER = 500  # only the newest notifications of a user are kept beyond this
+NOTIFICATION_PURGE_BATCH_SIZE = 1000  # rows deleted per statement, each in its own short transaction
+
+# Email outbox, delivered by the send_outbox management command
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60  # seconds before the first retry, doubled after every failed attempt
+
+# Matching of new offers with the open offers (see gameapp/matching.py)
+MATCHES_PER_OFFER = 5  # price matches and exchange cycles notified per new offer, each
+
+# Closed offers moved to the archive tables by the archive_offers management command
+ARCHIVE_AFTER_DAYS = 90  # days after an offer was closed
+ARCHIVE_BATCH_SIZE = 1000  # offers moved per transaction
+
+# Newsletter subscriptions, synced to Mailchimp by the sync_subscriptions management command
+MAILCHIMP_BATCH_SIZE = 500  # Mailchimp accepts up to 500 members per batch request
+MAILCHIMP_MAX_ATTEMPTS = 5
+MAILCHIMP_RETRY_DELAY = 300  # seconds before the first retry, doubled after every failed attempt
+MAILCHIMP_TIMEOUT = 30
+MAILCHIMP_HOST = None  # overrides the Mailchimp API host, e.g. "http://127.0.0.1:8025/3.0" for a local fake
+
 try:
     from gameconnect.local_settings import DATABASES, MAILCHIMP_API_KEY, MAILCHIMP_EMAIL_LIST_ID, MAILCHIMP_DATA_CENTER, EMAIL_HOST_USER, EMAIL_HOST_PASSWORD, MAILCHIMP_TRANSACTIONAL_API_KEY, EMAIL_BACKEND, EMAIL_HOST, EMAIL_PORT, EMAIL_USE_TLS
 except ModuleNotFoundError:
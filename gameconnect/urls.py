@@ -2,10 +2,12 @@ from django.contrib import admin
 from django.contrib.auth.views import LogoutView
 from django.urls import path, include
 from captcha import urls as captcha_urls
+from gameapp.api import OfferApiView, GameApiView, ArticleApiView, GamePriceApiView
 from gameapp.views import (CustomLoginView, RegisterView, UserPageView, MainView, GamesListView,
                            ArticlesListView, ArticleDetailsView, MarketListView, AddOfferView,
                            MakeOfferView, OfferDetailsView, SubscribeView, ChangePasswordView, GameCreateView,
-                           ArticleCreateView, NotificationView)
+                           ArticleCreateView, NotificationView, SearchView, MarkAllReadView, DeleteReadView,
+                           DeleteSelectedView, NotificationStreamView, MetricsView)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -16,14 +18,25 @@ urlpatterns = [
     path('subscribe/', SubscribeView.as_view(), name='subscribe'),
     path('user/<int:user_id>/', UserPageView.as_view(), name='user_page'),
     path('user/<int:user_id>/notifications/', NotificationView.as_view(), name='notifications'),
+    path('user/<int:user_id>/notifications/read/', MarkAllReadView.as_view(), name='notifications_read_all'),
+    path('user/<int:user_id>/notifications/delete_read/', DeleteReadView.as_view(), name='notifications_delete_read'),
+    path('user/<int:user_id>/notifications/delete_selected/', DeleteSelectedView.as_view(),
+         name='notifications_delete_selected'),
     path('user/<int:user_id>/password/', ChangePasswordView.as_view(), name='password_change'),
+    path('notifications/stream/', NotificationStreamView.as_view(), name='notification_stream'),
     path('games/', GamesListView.as_view(), name='games'),
     path('articles/', ArticlesListView.as_view(), name='articles'),
     path('articles/<slug:slug>/', ArticleDetailsView.as_view(), name='article_detail'),
     path('market/', MarketListView.as_view(), name='market'),
+    path('search/', SearchView.as_view(), name='search'),
     path('market/add_offer/', AddOfferView.as_view(), name='add_offer'),
     path('market/make_offer/<int:offer_id>/', MakeOfferView.as_view(), name='make_offer'),
     path('market/offer_details/<int:offer_id>/', OfferDetailsView.as_view(), name='offer_details'),
+    path('api/offers/', OfferApiView.as_view(), name='api_offers'),
+    path('api/games/', GameApiView.as_view(), name='api_games'),
+    path('api/games/<int:game_id>/prices/', GamePriceApiView.as_view(), name='api_game_prices'),
+    path('api/articles/', ArticleApiView.as_view(), name='api_articles'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('captcha/', include(captcha_urls)),
     path('add/game/', GameCreateView.as_view(), name='add_game'),
     path('add/article/', ArticleCreateView.as_view(), name='add_article'),